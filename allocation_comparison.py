@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+"""
+Compare the cabling required by each way of allocating boards to slots. Usage::
+
+	python allocation_comparison.py [params_file ...]
+
+For each parameter file (by default every shipped params_spin*.py), the
+folded torus is cabinetised using every allocation in
+model.topology.ALLOCATIONS, and by partitioning the graph of wires (see
+model/partition.py), and the number of wires leaving their rack, the
+number leaving their cabinet, the most wires crossing any boundary between
+cabinets and the maximum and total wire length are listed (computed as in
+model/symmetry.py or, for the partition, by visiting every wire).
+"""
+
+import os
+import sys
+
+from model import board
+from model import topology
+from model import transforms
+from model import metrics
+from model import symmetry
+from model import partition
+
+from fold_comparison import load_params, build_system
+
+
+def partitioned_torus(p, system):
+	"""
+	Build the torus described by a dict of parameters (as in wiring_guide.py) and
+	place it in the given cabinet.System using partition.partition.
+	"""
+	boards = board.create_torus(p["width"], p["height"])
+	boards = transforms.hex_to_cartesian(boards)
+	boards = transforms.rhombus_to_rect(boards)
+	boards = transforms.compress( boards
+	                            , 1 if p["compress_rows"] else 2
+	                            , 2 if p["compress_rows"] else 1
+	                            )
+	boards = transforms.fold(boards, (p["num_folds_x"], p["num_folds_y"]))
+	return partition.partition( boards, p["num_cabinets"], p["num_racks_per_cabinet"]
+	                          , p["num_slots_per_rack"]
+	                          )
+
+
+def summarise(matrices, histograms):
+	"""
+	Get a tuple (inter_rack, inter_cabinet, max_crossings, max_length,
+	total_length) given wire count matrices and wire length histograms (see
+	metrics.wire_count_matrices and metrics.wire_length_histogram).
+	"""
+	inter_rack    = 0
+	inter_cabinet = 0
+	max_crossings = 0
+	for cabinet_matrix, rack_matrix, crossings in matrices.itervalues():
+		inter_rack    += sum(count for (a, row) in enumerate(rack_matrix)
+		                           for (b, count) in enumerate(row) if a != b)
+		inter_cabinet += sum(count for (a, row) in enumerate(cabinet_matrix)
+		                           for (b, count) in enumerate(row) if a != b)
+		max_crossings = max([max_crossings] + crossings)
+	
+	lengths = {}
+	for histogram in histograms.itervalues():
+		for length, count in histogram.iteritems():
+			lengths[length] = lengths.get(length, 0) + count
+	
+	return ( inter_rack, inter_cabinet, max_crossings
+	       , max(lengths)
+	       , sum(l * count for (l, count) in lengths.iteritems())
+	       )
+
+
+def compare_allocations(p):
+	"""
+	Get a list [(allocation, (inter_rack, inter_cabinet, max_crossings,
+	max_length, total_length)),...] for every allocation (and "partition") given
+	a dict of parameters.
+	"""
+	system = build_system(p)
+	folds  = (p["num_folds_x"], p["num_folds_y"])
+	wire_offsets = system.cabinet.rack.slot.wire_position
+	
+	results = []
+	for allocation in topology.ALLOCATIONS:
+		matrices = symmetry.wire_count_matrices( p["width"], p["height"], folds
+		                                       , p["num_cabinets"], p["num_racks_per_cabinet"]
+		                                       , p["compress_rows"]
+		                                       , allocation = allocation
+		                                       )
+		histograms = symmetry.wire_length_histogram( p["width"], p["height"], folds
+		                                           , system, wire_offsets
+		                                           , p["compress_rows"]
+		                                           , allocation = allocation
+		                                           )
+		results.append((allocation, summarise(matrices, histograms)))
+	
+	cabinet_torus = partitioned_torus(p, system)
+	results.append(("partition", summarise(
+		metrics.wire_count_matrices(cabinet_torus),
+		metrics.wire_length_histogram( transforms.cabinet_to_physical(cabinet_torus, system)
+		                             , wire_offsets = wire_offsets
+		                             ))))
+	
+	return results
+
+
+if __name__=="__main__":
+	params_directory = os.path.dirname(os.path.abspath(__file__))
+	params_filenames = sys.argv[1:] or [
+		os.path.join(params_directory, "params_spin%d.py"%n) for n in range(103, 107)
+	]
+	
+	for params_filename in params_filenames:
+		p = load_params(params_filename)
+		print "%s (%dx%d threeboards, %d cabinets of %d racks)"%(
+			os.path.basename(params_filename), p["width"], p["height"],
+			p["num_cabinets"], p["num_racks_per_cabinet"])
+		print "  %-10s  %10s  %13s  %13s  %10s  %12s"%(
+			"Allocation", "Inter-rack", "Inter-cabinet", "Max crossings",
+			"Max length", "Total length")
+		
+		for allocation, stats in compare_allocations(p):
+			print "  %-10s  %10d  %13d  %13d  %9.2fm  %11.2fm"%((allocation,) + stats)
+		print
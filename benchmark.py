@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+
+"""
+Quick and dirty benchmarks of the performance-sensitive parts of SpiNNer.
+Usage:
+
+python benchmark.py [name ...]
+
+Runs every benchmark if none are named.
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+
+from StringIO import StringIO
+
+from model import board
+from model import transforms
+from model import topology
+from model import plan
+from model import metrics
+from model import symmetry
+from model import partition
+from model import table
+from model import validation
+from model import faults
+
+import diagram
+import tiling
+
+
+def timed(f, *args, **kwargs):
+	"""
+	Returns a tuple (seconds, result) giving the time taken to call f.
+	"""
+	start = time.time()
+	result = f(*args, **kwargs)
+	return (time.time() - start, result)
+
+
+def build_cabinet_torus( width = 20, height = 20, folds = (4,2)
+                       , num_cabinets = 10, num_racks = 5, num_slots = 24
+                       ):
+	"""
+	Build a cabinetised torus following the same steps as wiring_guide.py. The
+	defaults produce the 10^6 machine.
+	"""
+	boards = board.create_torus(width, height)
+	boards = transforms.hex_to_cartesian(boards)
+	boards = transforms.rhombus_to_rect(boards)
+	boards = transforms.compress(boards, 1, 2)
+	boards = transforms.fold(boards, folds)
+	return transforms.cabinetise(boards, num_cabinets, num_racks, num_slots)
+
+
+################################################################################
+# Benchmarks
+################################################################################
+
+def bench_plan():
+	"""
+	Startup and query latency of the memory-mapped wiring plan.
+	"""
+	boards = build_cabinet_torus()
+	
+	fd, filename = tempfile.mkstemp()
+	os.close(fd)
+	try:
+		write_time, _ = timed(plan.write_plan, boards, filename)
+		open_time, p = timed(plan.WiringPlan, filename)
+		
+		queries = [tuple(c) + (random.randint(0,5),) for (b,c) in boards]
+		query_time, _ = timed(lambda: [p.lookup(*q) for q in queries])
+		
+		print "Boards:          %d"%len(boards)
+		print "Write:           %.3f ms"%(write_time * 1000.0)
+		print "Open:            %.3f ms"%(open_time * 1000.0)
+		print "Lookup (mean):   %.3f ms"%((query_time * 1000.0) / len(queries))
+		
+		p.close()
+	finally:
+		os.remove(filename)
+
+
+def bench_diagram():
+	"""
+	Time taken to generate diagrams of increasing size. The time per board
+	should remain (roughly) constant.
+	"""
+	print "%8s %12s %12s %14s"%("Boards", "Build (ms)", "Write (ms)", "Per board (us)")
+	for width in [5, 10, 20, 40]:
+		boards = transforms.hex_to_cartesian(board.create_torus(width))
+		
+		def build():
+			d = diagram.Diagram()
+			for b, coord in boards:
+				d.add_board_hexagon(b, coord)
+				d.add_label(b, r"\tiny %d,%d"%coord)
+				for direction in [topology.NORTH, topology.EAST, topology.SOUTH_WEST]:
+					d.add_wire(b, direction, ["thick"])
+			return d
+		
+		build_time, d = timed(build)
+		write_time, _ = timed(d.write, StringIO())
+		
+		print "%8d %12.1f %12.1f %14.1f"%(
+			len(boards),
+			build_time * 1000.0,
+			write_time * 1000.0,
+			((build_time + write_time) * 1000000.0) / len(boards),
+		)
+
+
+def bench_tiling():
+	"""
+	Time taken to generate a tiled diagram of a large folded torus using
+	increasing numbers of worker processes.
+	"""
+	boards = board.create_torus(40, 40)
+	boards = transforms.hex_to_cartesian(boards)
+	boards = transforms.rhombus_to_rect(boards)
+	boards = transforms.compress(boards, 1, 2)
+	boards = transforms.fold(boards, (4,2))
+	
+	wires = [ (topology.NORTH, ["thick","red"])
+	        , (topology.EAST, ["thick","green"])
+	        , (topology.SOUTH_WEST, ["thick","blue"])
+	        ]
+	
+	print "Boards: %d"%len(boards)
+	print "%10s %8s %10s"%("Processes", "Tiles", "Time (ms)")
+	for processes in [1, 2, 4]:
+		t, tiles = timed(tiling.generate_tiles, boards, (20, 15)
+		                , diagram.Diagram.add_board_square, wires
+		                , processes = processes
+		                )
+		print "%10d %8d %10.1f"%(processes, len(tiles), t * 1000.0)
+
+
+def bench_symmetry():
+	"""
+	Time taken to count the wires between cabinets and racks by building the
+	torus and visiting every wire versus using the symmetry of the layout.
+	"""
+	print "%10s %16s %16s"%("Boards", "Brute (ms)", "Symmetric (ms)")
+	for width, num_cabinets in [(10, 5), (20, 10), (40, 20), (200, 100)]:
+		if width <= 40:
+			brute_time, _ = timed(lambda: metrics.wire_count_matrices(
+				build_cabinet_torus(width, width, (4,2), num_cabinets, 5, None)))
+			brute_time = "%16.1f"%(brute_time * 1000.0)
+		else:
+			brute_time = "%16s"%"-"
+		
+		symmetric_time, _ = timed(symmetry.wire_count_matrices,
+		                          width, width, (4,2), num_cabinets, 5)
+		
+		print "%10d %s %16.1f"%(width * width * 3, brute_time, symmetric_time * 1000.0)
+
+
+def bench_fold():
+	"""
+	Time taken to fold the coordinates of a large torus repeatedly (as in a
+	search over layouts) using the scalar fold function per coordinate versus
+	the cached fold maps, and the time taken by transforms.fold as a whole.
+	"""
+	boards = board.create_torus(40, 40)
+	boards = transforms.hex_to_cartesian(boards)
+	boards = transforms.rhombus_to_rect(boards)
+	boards = transforms.compress(boards, 1, 2)
+	columns = zip(*(c for (b,c) in boards))
+	sizes = [max(column)+1 for column in columns]
+	
+	fold_options = [(fx, fy) for fx in range(1, 9) for fy in range(1, 9)]
+	
+	def scalar_fold(folds):
+		return [ [topology.fold_interleave_dimension(v, w, f) for v in column]
+		         for (column, w, f) in zip(columns, sizes, folds)
+		       ]
+	
+	def column_fold(folds):
+		return [ topology.fold_interleave_column(column, w, f)
+		         for (column, w, f) in zip(columns, sizes, folds)
+		       ]
+	
+	scalar_time, _    = timed(lambda: [scalar_fold(folds) for folds in fold_options])
+	column_time, _    = timed(lambda: [column_fold(folds) for folds in fold_options])
+	transform_time, _ = timed(lambda: [transforms.fold(boards, folds) for folds in fold_options])
+	
+	print "Boards:           %d"%len(boards)
+	print "Folds tried:      %d"%len(fold_options)
+	print "Scalar:           %.1f ms"%(scalar_time * 1000.0)
+	print "Fold map:         %.1f ms"%(column_time * 1000.0)
+	print "transforms.fold:  %.1f ms"%(transform_time * 1000.0)
+
+
+def bench_partition():
+	"""
+	Time taken to allocate increasingly large folded tori to 10 cabinets of 5
+	racks by graph partitioning and the resulting number of wires between racks
+	compared with the interleaved allocation.
+	"""
+	print "%10s %14s %18s %18s"%("Boards", "Time (ms)", "Interleaved cut", "Partitioned cut")
+	for width in [20, 40, 80, 180]:
+		boards = board.create_torus(width, width)
+		boards = transforms.hex_to_cartesian(boards)
+		boards = transforms.rhombus_to_rect(boards)
+		boards = transforms.compress(boards, 1, 2)
+		boards = transforms.fold(boards, (4,2))
+		
+		partition_time, allocated = timed(partition.partition, boards, 10, 5)
+		interleaved = transforms.cabinetise(boards, 10, 5)
+		
+		adj = partition.wire_graph(boards)
+		rack_cut = (lambda boards: partition.cut_wires(adj, [(c.cabinet, c.rack)
+		                                                     for (b, c) in boards]))
+		
+		print "%10d %14.1f %18d %18d"%(len(boards), partition_time * 1000.0,
+		                               rack_cut(interleaved), rack_cut(allocated))
+
+
+def bench_validation():
+	"""
+	Time taken to check increasingly large tori for consistent wiring and for
+	the lengths of their rings (see model/validation.py), given their neighbour
+	tables.
+	"""
+	print "%10s %14s %14s"%("Boards", "Links (ms)", "All (ms)")
+	for width in [20, 40, 80, 183]:
+		neighbours = table.neighbour_table(board.create_torus(width, width))
+		
+		links_time, problems = timed(validation.check_neighbours, neighbours)
+		assert(problems == [])
+		all_time, problems = timed(validation.check_neighbours, neighbours, width, width)
+		assert(problems == [])
+		
+		print "%10d %14.1f %14.1f"%(len(neighbours[topology.NORTH]),
+		                            links_time * 1000.0, all_time * 1000.0)
+
+
+def bench_faults():
+	"""
+	Time taken to find the connectivity after each of a sequence of random
+	board and wire faults in a torus of 10^5 boards.
+	"""
+	boards = board.create_torus(183, 183)
+	rng = random.Random(0)
+	
+	print "%10s %14s %12s %12s"%("Faults", "Time (ms)", "Components", "Largest")
+	for num_faults in [100, 1000, 10000]:
+		events = []
+		for _ in range(num_faults):
+			if rng.random() < 0.3:
+				events.append(("board", rng.randrange(len(boards))))
+			else:
+				events.append(("wire", rng.randrange(len(boards)), rng.choice(table.DIRECTIONS)))
+		
+		timeline_time, timeline = timed(faults.fault_timeline, boards, events)
+		
+		print "%10d %14.1f %12d %12d"%((num_faults, timeline_time * 1000.0) + timeline[-1])
+
+
+# List of (name, function) of all benchmarks.
+BENCHMARKS = [
+	("plan", bench_plan),
+	("diagram", bench_diagram),
+	("tiling", bench_tiling),
+	("symmetry", bench_symmetry),
+	("fold", bench_fold),
+	("partition", bench_partition),
+	("validation", bench_validation),
+	("faults", bench_faults),
+]
+
+
+if __name__=="__main__":
+	names = sys.argv[1:] or [name for (name, f) in BENCHMARKS]
+	for name, f in BENCHMARKS:
+		if name in names:
+			print "== %s =="%name
+			f()
+			print
@@ -138,6 +138,17 @@ class Diagram(object):
 	""".strip()
 	
 	
+	# Levels of detail with which boards in cabinets can be drawn (see
+	# set_level_of_detail).
+	LOD_BOARD   = "board"
+	LOD_RACK    = "rack"
+	LOD_CABINET = "cabinet"
+	
+	# Half the angle (in degrees) between adjacent bundles of wires drawn between
+	# the same pair of aggregates (see set_level_of_detail).
+	BUNDLE_BEND = 10
+	
+	
 	# Mapping of directions to names for which tikz references exist.
 	DIRECTION_POSTFIX = {
 		topology.NORTH      : "north",
@@ -152,103 +163,320 @@ class Diagram(object):
 	def __init__(self):
 		self.preamble = Diagram.PREAMBLE
 		
+		# Each of the following are lists of strings which are concatenated to
+		# produce the diagram. (Lists are used since repeatedly appending to a
+		# string is quadratic in the size of the diagram.)
+		
 		# Cabinet definitions. Drawing of each of the cabinets.
-		self.cabinet_definitions = ""
+		self.cabinet_definitions = []
 		
 		# Boards definitions. All boards have a coordinates of the form:
 		# board [unique id] {,north,north east,east,south,south west,west}
-		self.board_definitions = ""
+		self.board_definitions = []
 		
 		# Definitions of paths to be drawn
-		self.path_definitions = ""
+		self.path_definitions = []
 		
 		# Definitions of labels added to boards
-		self.label_definitions = ""
+		self.label_definitions = []
 		
 		# The cabinet system the boards are placed in or None if no cabinets used
 		self.cabinet_system = None
 		self.cabinet_scale = 0.01
+		self.cabinet_background = None
+		
+		self.set_level_of_detail(Diagram.LOD_BOARD)
 	
 	
-	def get_tikz(self):
-		return "\n\n".join((
-			self.preamble,
+	def _get_sections(self):
+		"""
+		Used internally. Get the lists of strings which make up each section of the
+		diagram.
+		"""
+		aggregate_definitions, bundle_definitions = self._get_aggregate_definitions()
+		
+		return [
+			[self.preamble],
 			self.cabinet_definitions,
-			self.board_definitions,
-			self.path_definitions,
+			self.board_definitions + aggregate_definitions,
+			self.path_definitions + bundle_definitions,
 			self.label_definitions,
-		))
+		]
 	
 	
-	def set_cabinet_system(self, system, scale = 0.01):
-		self.cabinet_system = system
-		self.cabinet_definitions = ""
-		self.cabinet_scale = scale
-		
-		if self.cabinet_system is None:
-			return
+	def write(self, f):
+		"""
+		Write the TikZ for the diagram to the file-like object f.
+		"""
+		for num, section in enumerate(self._get_sections()):
+			if num > 0:
+				f.write("\n\n")
+			f.writelines(section)
+	
+	
+	def get_tikz(self):
+		return "\n\n".join("".join(section) for section in self._get_sections())
+	
+	
+	@staticmethod
+	def _get_cabinet_macros(system, scale):
+		"""
+		Used internally. Get the list of macro definitions used by the \cabinet
+		command for the given cabinet system.
+		"""
+		slot = system.cabinet.rack.slot
 		
-		cabinet = system.cabinet
-		rack    = cabinet.rack
-		slot    = rack.slot
+		macros = []
 		
-		self.cabinet_definitions += r"\newcommand{\cabscale}{%f}"%scale
+		macros.append(r"\newcommand{\cabscale}{%f}"%scale)
 		
 		for direction, name in Diagram.DIRECTION_POSTFIX.iteritems():
 			position = slot.get_position(direction)
-			self.cabinet_definitions += r"\newcommand{\cab%s}{%f,%f}"%(
+			macros.append(r"\newcommand{\cab%s}{%f,%f}"%(
 				"".join(name.split(" ")),
 				position[0],
 				position[1],
-			) + "\n"
+			) + "\n")
 		
 		
-		self.cabinet_definitions += r"\newcommand{\slotwidth}{%f}"%slot.width
-		self.cabinet_definitions += r"\newcommand{\slotheight}{%f}"%slot.height
+		macros.append(r"\newcommand{\slotwidth}{%f}"%slot.width)
+		macros.append(r"\newcommand{\slotheight}{%f}"%slot.height)
 		
-		self.cabinet_definitions += r"\begin{scope}[scale=\cabscale]"
+		return macros
+	
+	
+	@staticmethod
+	def _get_cabinet_geometry(system, scale, show_slots = True):
+		"""
+		Used internally. Get the list of paths which draw the cabinets, racks and
+		(optionally) slots of the given cabinet system.
+		"""
+		cabinet = system.cabinet
+		rack    = cabinet.rack
+		slot    = rack.slot
+		
+		geometry = []
+		
+		geometry.append(r"\begin{scope}[scale=\cabscale]")
 		
 		for cabinet_num in range(system.num_cabinets):
-			cabinet_x = cabinet_num * (cabinet.width + system.cabinet_spacing)
-			cabinet_y = 0.0
+			cabinet_x, cabinet_y = system.cabinet_elevation_positions[cabinet_num]
 			# Only bother drawing the cabinet if we have more than one rack
 			if cabinet.num_racks > 1:
-				self.cabinet_definitions += r"\path [cabinet] (%f,%f) rectangle ++(%f,%f);"%(
+				geometry.append(r"\path [cabinet] (%f,%f) rectangle ++(%f,%f);"%(
 					cabinet_x, cabinet_y,
 					cabinet.width, cabinet.height
-				) + "\n"
+				) + "\n")
 			for rack_num in range(cabinet.num_racks):
 				rack_x = cabinet_x + cabinet.offset.x
 				rack_y = cabinet_y + cabinet.offset.y \
 				         + (rack.height + cabinet.rack_spacing) * rack_num
 				
-				self.cabinet_definitions += r"\path [rack] (%f,%f) rectangle ++(%f,%f);"%(
+				geometry.append(r"\path [rack] (%f,%f) rectangle ++(%f,%f);"%(
 					rack_x, rack_y,
 					rack.width, rack.height
-				) + "\n"
+				) + "\n")
+				if not show_slots:
+					continue
 				for slot_num in range(rack.num_slots):
 					slot_x = rack_x + rack.offset.x \
 					         + (slot.width + rack.slot_spacing) * slot_num
 					slot_y = rack_y + rack.offset.y
 					
-					self.cabinet_definitions += r"\path [slot] (%f,%f) rectangle ++(%f,%f);"%(
+					geometry.append(r"\path [slot] (%f,%f) rectangle ++(%f,%f);"%(
 						slot_x, slot_y,
 						slot.width, slot.height
-					) + "\n"
+					) + "\n")
+		
+		geometry.append(r"\end{scope}[scale=%f]"%scale)
 		
-		self.cabinet_definitions += r"\end{scope}[scale=%f]"%scale
+		return geometry
+	
+	
+	@staticmethod
+	def get_cabinet_background( system, scale = 0.01, name = "cabinetbackground"
+	                          , show_slots = True
+	                          ):
+		"""
+		Get LaTeX which, when placed once in a document (after \begin{document}),
+		typesets the cabinets, racks and (optionally) slots of the given system into
+		a saved box with the given name and defines the macros used to draw boards
+		in them.
+		
+		Diagrams using the background (see set_cabinet_system) need only emit their
+		boards, reducing both the size of the document and the time taken to
+		compile it. Every such diagram must use the same system and scale, and
+		diagrams of cabinet systems which don't use the background cannot appear in
+		the same document. Slots should not be shown if any diagram using the
+		background is drawn at a reduced level of detail (see set_level_of_detail).
+		"""
+		return "\n".join([
+			"".join(Diagram._get_cabinet_macros(system, scale)),
+			r"\newsavebox{\%s}"%name,
+			r"\sbox{\%s}{\begin{tikzpicture}"%name,
+			Diagram.PREAMBLE,
+			# Ensure the box's origin is that of the cabinet system
+			r"\path (0,0);",
+			"".join(Diagram._get_cabinet_geometry(system, scale, show_slots)),
+			r"\end{tikzpicture}}",
+		]) + "\n"
+	
+	
+	def set_cabinet_system(self, system, scale = 0.01, background = None):
+		"""
+		Set the cabinet system which boards added by add_board_cabinet() are placed
+		in.
+		
+		background is optionally the name of a saved box containing the cabinets
+		(see get_cabinet_background) which is drawn instead of emitting the
+		cabinets as part of this diagram.
+		"""
+		self.cabinet_system = system
+		self.cabinet_definitions = []
+		self.cabinet_scale = scale
+		self.cabinet_background = background
+		
+		if self.cabinet_system is None:
+			return
+		
+		if background is not None:
+			self.cabinet_definitions.append(
+				r"\node [anchor=south west,inner sep=0pt,outer sep=0pt] at (0,0) {\usebox{\%s}};"%(
+					background) + "\n")
+			return
+		
+		self.cabinet_definitions.extend(Diagram._get_cabinet_macros(system, scale))
+		
+		# Individual slots are only shown when boards are
+		self.cabinet_definitions.extend(Diagram._get_cabinet_geometry(
+			system, scale, self.level_of_detail == Diagram.LOD_BOARD))
+	
+	
+	def set_level_of_detail(self, level):
+		"""
+		Set the level of detail with which boards added by add_board_cabinet() are
+		drawn. This should be set before any boards are added.
+		
+		LOD_BOARD draws every board and wire individually.
+		
+		LOD_RACK and LOD_CABINET draw a single box for each rack (or cabinet)
+		containing boards, labelled with the number of boards it contains. Wires
+		between these aggregates are bundled into a single line labelled with the
+		number of wires it represents. Wires within an aggregate, board labels and
+		packet paths are not drawn. The number of primitives drawn thus depends
+		only on the number of racks (or cabinets) rather than boards.
+		"""
+		assert(level in (Diagram.LOD_BOARD, Diagram.LOD_RACK, Diagram.LOD_CABINET))
+		
+		self.level_of_detail = level
+		
+		# The number of boards in each aggregate {key: num_boards,...} where key is
+		# (cabinet,) or (cabinet, rack).
+		self.aggregates = {}
+		
+		# The aggregate each board is drawn as {board_id: key,...}
+		self.board_aggregates = {}
+		
+		# Wires whose drawing is deferred until the aggregate at each end is known
+		# [(board_id, target_board_id, source_ref, target_ref, styles),...].
+		self.deferred_wires = []
+		
+		# Redraw the cabinets at the new level of detail
+		if self.cabinet_system is not None:
+			self.set_cabinet_system( self.cabinet_system, self.cabinet_scale
+			                       , self.cabinet_background
+			                       )
+	
+	
+	def _get_aggregate_definitions(self):
+		"""
+		Used internally. Get lists of strings defining the drawing of every
+		aggregate and every bundle of wires between them.
+		"""
+		aggregate_definitions = []
+		bundle_definitions = []
+		
+		if not self.aggregates and not self.deferred_wires:
+			return aggregate_definitions, bundle_definitions
+		
+		if self.aggregates:
+			cabinet = self.cabinet_system.cabinet
+			rack    = cabinet.rack
+			
+			aggregate_definitions.append(r"\begin{scope}[scale=\cabscale]" + "\n")
+			for key in sorted(self.aggregates):
+				cabinet_x, cabinet_y = self.cabinet_system.cabinet_elevation_positions[key[0]]
+				if len(key) == 1:
+					x, y, width, height = cabinet_x, cabinet_y, cabinet.width, cabinet.height
+				else:
+					x = cabinet_x + cabinet.offset.x
+					y = cabinet_y + cabinet.offset.y + (rack.height + cabinet.rack_spacing) * key[1]
+					width, height = rack.width, rack.height
+				
+				aggregate_definitions.append(
+					(r"\path [occupied slot] (%f,%f) rectangle ++(%f,%f);"
+					 r"\coordinate (%s) at (%f,%f);")%(
+						x, y, width, height,
+						self._get_aggregate_ref(key), x + (width/2.0), y + (height/2.0),
+					) + "\n")
+			aggregate_definitions.append(r"\end{scope}" + "\n")
+			
+			for key, num_boards in sorted(self.aggregates.iteritems()):
+				aggregate_definitions.append(r"\node [font=\tiny] at (%s) {%d};"%(
+					self._get_aggregate_ref(key), num_boards) + "\n")
+		
+		# Count the wires between each pair of aggregates with the same style
+		bundles = {}
+		for board_id, target_id, source_ref, target_ref, styles in self.deferred_wires:
+			source = self.board_aggregates.get(board_id)
+			target = self.board_aggregates.get(target_id)
+			
+			if source is None or target is None:
+				# Not aggregated, draw as usual
+				bundle_definitions.append(r"\draw [%s] (%s) -- (%s);"%(
+					",".join(styles), source_ref, target_ref) + "\n")
+			elif source != target:
+				key = (min(source, target), max(source, target), styles)
+				bundles[key] = bundles.get(key, 0) + 1
+		
+		# Bundles of different styles between the same pair of aggregates are bent
+		# apart, symmetrically about the straight line between them, so that each
+		# bundle and its label remain visible.
+		pair_styles = {}
+		for source, target, styles in sorted(bundles):
+			pair_styles.setdefault((source, target), []).append(styles)
+		
+		max_count = max(bundles.itervalues()) if bundles else 1
+		for (source, target, styles), count in sorted(bundles.iteritems()):
+			siblings = pair_styles[(source, target)]
+			bend = Diagram.BUNDLE_BEND * ((2 * siblings.index(styles)) - (len(siblings) - 1))
+			bundle_definitions.append(
+				(r"\draw [%s,line width=%fpt] (%s) to [bend left=%d] "
+				 r"node [fill=white,inner sep=1pt,font=\tiny] {%d} (%s);")%(
+					",".join(styles), 0.4 + ((3.6 * count) / max_count),
+					self._get_aggregate_ref(source), bend, count, self._get_aggregate_ref(target),
+				) + "\n")
+		
+		return aggregate_definitions, bundle_definitions
+	
+	
+	def _get_aggregate_ref(self, key):
+		"""
+		Used internally. Get the TikZ reference to the centre of an aggregate.
+		"""
+		return " ".join(["cabinet", "rack"][:len(key)] + map(str, key))
 	
 	
 	def _add_board(self, board, position_str, macro, styles):
 		"""
 		Used internally. The general form of adding a board.
 		"""
-		self.board_definitions += r"\%s{board %d}{%s}{%s};"%(
+		self.board_definitions.append(r"\%s{board %d}{%s}{%s};"%(
 			macro,
 			board.id,
 			position_str,
 			",".join(styles),
-		) + "\n"
+		) + "\n")
 	
 	
 	def add_board_hexagon(self, board, position, styles = None):
@@ -341,7 +569,16 @@ class Diagram(object):
 		
 		styles = styles or []
 		
-		self._add_board(board, "%f,%f"%(self.cabinet_system.get_position(position)[:2]),
+		if self.level_of_detail != Diagram.LOD_BOARD:
+			if self.level_of_detail == Diagram.LOD_RACK:
+				key = tuple(position[:2])
+			else:
+				key = tuple(position[:1])
+			self.board_aggregates[board.id] = key
+			self.aggregates[key] = self.aggregates.get(key, 0) + 1
+			return
+		
+		self._add_board(board, "%f,%f"%(self.cabinet_system.get_elevation_position(position)),
 			"cabinet", styles)
 	
 	
@@ -353,11 +590,15 @@ class Diagram(object):
 		"""
 		styles = styles or []
 		
-		self.label_definitions += r"\node [%s] at (board %d) {%s};"%(
+		# Labels aren't drawn for aggregated boards
+		if board.id in self.board_aggregates:
+			return
+		
+		self.label_definitions.append(r"\node [%s] at (board %d) {%s};"%(
 			",".join(styles),
 			board.id,
 			latex
-		) + "\n"
+		) + "\n")
 	
 	
 	def get_tikz_ref(self, board, direction = None):
@@ -384,13 +625,35 @@ class Diagram(object):
 		
 		styles = styles or []
 		
-		self.path_definitions += r"\draw [%s] %s;"%(
+		self.path_definitions.append(r"\draw [%s] %s;"%(
 			",".join(styles),
 			" -- ".join("(%s)"%l for l in locations),
-		) + "\n"
+		) + "\n")
+	
+	
+	def _defer_wire(self, board, direction, styles):
+		"""
+		Used internally. When drawing at a reduced level of detail, defer drawing
+		the wire until it is known which aggregates it connects. Returns True if
+		deferred.
+		"""
+		if self.level_of_detail == Diagram.LOD_BOARD:
+			return False
+		
+		self.deferred_wires.append((
+			board.id,
+			board.follow_wire(direction).id,
+			self.get_tikz_ref(board, direction),
+			self.get_tikz_ref(board.follow_wire(direction), topology.opposite(direction)),
+			tuple(styles or []),
+		))
+		return True
 	
 	
 	def add_wire(self, board, direction, styles = None):
+		if self._defer_wire(board, direction, styles):
+			return
+		
 		self._add_path(
 			[ "board %d %s"%(board.id, Diagram.DIRECTION_POSTFIX[direction])
 			, "board %d %s"%(board.follow_wire(direction).id
@@ -410,7 +673,11 @@ class Diagram(object):
 			topology.EAST       : ( 1,  0,  0),
 			topology.WEST       : (-1,  0,  0),
 		}[direction]
-		self.path_definitions += r"""
+		
+		if self._defer_wire(board, direction, styles):
+			return
+		
+		self.path_definitions.append(r"""
 			\draw [%s] [hexagon coords]
 				(%s) ..
 				  controls +(%d,%d,%d)
@@ -425,10 +692,40 @@ class Diagram(object):
 			"board %d %s"%(board.follow_wire(direction).id
 			              , Diagram.DIRECTION_POSTFIX[topology.opposite(direction)]
 			              )
-		) + "\n"
+		) + "\n")
+	
+	
+	def add_wire_stub(self, board, direction, latex, styles = None):
+		"""
+		Add a short wire leaving the given board in the given direction, labelled
+		with the given LaTeX, in place of a wire whose far end is not drawn (e.g.
+		because it lies in another tile).
+		
+		styles is an array of tikz styles to apply to the stub
+		"""
+		styles = styles or []
+		
+		# Stubs aren't drawn for aggregated boards
+		if board.id in self.board_aggregates:
+			return
+		
+		ref = "board %d %s"%(board.id, Diagram.DIRECTION_POSTFIX[direction])
+		
+		# The stub continues the line from the centre of the board through the
+		# wire's socket.
+		self.path_definitions.append(
+			(r"\path (board %d) -- (%s) coordinate [pos=1.5] (%s stub);"
+			 r"\draw [%s] (%s) -- (%s stub) node [fill=white,inner sep=1pt] {%s};")%(
+				board.id, ref, ref,
+				",".join(styles), ref, ref, latex,
+			) + "\n")
 	
 	
 	def add_packet_path(self, board, in_direction, out_direction, styles = None):
+		# Packet paths aren't drawn for aggregated boards
+		if board.id in self.board_aggregates:
+			return
+		
 		self._add_path(
 			[ "board %d %s"%(board.id, Diagram.DIRECTION_POSTFIX[in_direction])
 			, "board %d %s"%(board.id, Diagram.DIRECTION_POSTFIX[out_direction])
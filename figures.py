@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+
+"""
+Externalised compilation of TikZ figures. Usage::
+
+	python figures.py cache_directory
+
+Rather than being typeset as part of the (very large) main document, each
+figure is written out as a standalone document named by a hash of its contents
+and compiled separately, with many figures being compiled in parallel. The main
+document then simply includes the resulting PDFs.
+
+Since figures are named by their contents, a figure is only recompiled when it
+(or the preamble it depends on) changes: a figure whose PDF is already in the
+cache directory is never recompiled.
+"""
+
+import os
+import hashlib
+import subprocess
+import multiprocessing
+
+from multiprocessing.pool import ThreadPool
+
+
+# The standalone document into which each figure is placed
+DOCUMENT = r"""
+\documentclass{standalone}
+\usepackage{tikz}
+%(preamble)s
+\begin{document}
+%(prelude)s
+%(figure)s
+\end{document}
+""".lstrip()
+
+
+def figure_hash(document):
+	"""
+	Get the name under which a figure's (complete) standalone document is
+	cached.
+	"""
+	return hashlib.sha1(document).hexdigest()
+
+
+class FigureCache(object):
+	"""
+	A directory of figures compiled separately from the main document.
+	"""
+	
+	def __init__(self, directory, preamble = "", latex = "pdflatex", processes = None):
+		"""
+		directory is the directory in which figures are compiled and cached. It is
+		created if it does not exist.
+		
+		preamble is any additional LaTeX to place in the preamble of every figure
+		(e.g. \usepackage commands).
+		
+		latex is the LaTeX command used to compile figures.
+		
+		processes is the number of LaTeX processes to run at once. If None, one
+		per CPU is used.
+		"""
+		self.directory = directory
+		self.preamble  = preamble
+		self.latex     = latex
+		self.processes = processes or multiprocessing.cpu_count()
+		
+		# The names of figures which have been added but are not yet compiled
+		self.pending = set()
+		
+		if not os.path.isdir(self.directory):
+			os.makedirs(self.directory)
+	
+	
+	def _get_path(self, name, extension = ""):
+		"""
+		Used internally. Get the path of a file in the cache.
+		"""
+		return os.path.join(self.directory, name + extension)
+	
+	
+	def add(self, figure, prelude = ""):
+		"""
+		Add a figure (e.g. a complete tikzpicture environment) to the cache.
+		
+		prelude is any LaTeX which must appear in the body of the figure's document
+		before the figure (e.g. the definition of a saved box it uses).
+		
+		Returns the LaTeX which includes the compiled figure in the main document.
+		The figure is compiled by compile().
+		"""
+		document = DOCUMENT%{
+			"preamble" : self.preamble,
+			"prelude"  : prelude,
+			"figure"   : figure,
+		}
+		name = figure_hash(document)
+		
+		if not os.path.exists(self._get_path(name, ".pdf")):
+			f = open(self._get_path(name, ".tex"), "w")
+			try:
+				f.write(document)
+			finally:
+				f.close()
+			self.pending.add(name)
+		
+		return r"\includegraphics{%s}"%self._get_path(name)
+	
+	
+	def _compile(self, name):
+		"""
+		Used internally. Compile a single figure, returning True on success.
+		"""
+		try:
+			p = subprocess.Popen( [ self.latex
+			                      , "-interaction=batchmode"
+			                      , "-halt-on-error"
+			                      , name + ".tex"
+			                      ]
+			                    , cwd = self.directory
+			                    , stdout = subprocess.PIPE
+			                    , stderr = subprocess.STDOUT
+			                    )
+		except OSError:
+			# LaTeX isn't installed
+			return False
+		p.communicate()
+		
+		if p.returncode == 0:
+			os.remove(self._get_path(name, ".aux"))
+			os.remove(self._get_path(name, ".log"))
+			return True
+		else:
+			# Don't cache (partial) output of a failed compilation
+			if os.path.exists(self._get_path(name, ".pdf")):
+				os.remove(self._get_path(name, ".pdf"))
+			return False
+	
+	
+	def compile(self):
+		"""
+		Compile, in parallel, all figures added which are not already in the cache.
+		
+		Returns a list of the names of figures which failed to compile. Their
+		LaTeX and log files are left in the cache directory.
+		"""
+		names = sorted(self.pending)
+		if not names:
+			return []
+		
+		# The work is done by the LaTeX subprocesses so threads suffice to keep
+		# several of them running.
+		pool = ThreadPool(min(self.processes, len(names)))
+		try:
+			results = pool.map(self._compile, names)
+		finally:
+			pool.close()
+			pool.join()
+		
+		self.pending = set(name for (name, ok) in zip(names, results) if not ok)
+		
+		return sorted(self.pending)
+
+
+if __name__=="__main__":
+	import sys
+	
+	if len(sys.argv) != 2:
+		sys.stderr.write("Usage: %s cache_directory\n"%sys.argv[0])
+		sys.exit(1)
+	
+	# Compile any figures left uncompiled in the cache (e.g. by an interrupted
+	# run)
+	cache = FigureCache(sys.argv[1])
+	for filename in os.listdir(cache.directory):
+		name, extension = os.path.splitext(filename)
+		if extension == ".tex" and not os.path.exists(cache._get_path(name, ".pdf")):
+			cache.pending.add(name)
+	
+	failed = cache.compile()
+	for name in failed:
+		print "Failed to compile %s"%cache._get_path(name, ".tex")
+	
+	sys.exit(1 if failed else 0)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+
+"""
+Compare the wire lengths of single-level and hierarchical folds. Usage::
+
+	python fold_comparison.py [params_file ...]
+
+For each parameter file (by default every shipped params_spin*.py), every way
+of splitting each axis' number of folds into a hierarchical fold (see
+model/topology.py) is tried and the maximum and total length of wire in each
+direction is listed (computed as in model/symmetry.py).
+
+Splits are first estimated (see symmetry.estimate_wire_length_histogram) and
+only those which could have a shorter longest wire than the best split found so
+far are measured exactly. The remainder are listed with the lower bound on
+their longest wire given by their estimate.
+"""
+
+import os
+import sys
+
+from itertools import product
+
+from model.topology import NORTH, EAST, SOUTH_WEST
+from model import topology
+from model import cabinet
+from model import symmetry
+
+
+DIRECTIONS = [NORTH, EAST, SOUTH_WEST]
+
+DIRECTION_NAMES = {NORTH : "N", EAST : "E", SOUTH_WEST : "SW"}
+
+
+def load_params(params_filename):
+	"""
+	Get a dict of the parameters defined by params_physical.py and the given
+	parameter file.
+	"""
+	params = {}
+	execfile(os.path.join(os.path.dirname(os.path.abspath(__file__)), "params_physical.py"), params)
+	execfile(params_filename, params)
+	return params
+
+
+def build_system(p):
+	"""
+	Get the cabinet.System described by a dict of parameters.
+	"""
+	return cabinet.System(
+		cabinet = cabinet.Cabinet(
+			rack = cabinet.Rack(
+				slot = cabinet.Slot(
+					dimensions    = (p["slot_width"], p["slot_height"], p["slot_depth"]),
+					wire_position = p["wire_positions"],
+				),
+				dimensions   = (p["rack_width"], p["rack_height"], p["rack_depth"]),
+				num_slots    = p["num_slots_per_rack"],
+				slot_spacing = p["slot_spacing"],
+				slot_offset  = p["slot_offset"],
+			),
+			dimensions   = (p["cabinet_width"], p["cabinet_height"], p["cabinet_depth"]),
+			num_racks    = p["num_racks_per_cabinet"],
+			rack_spacing = p["rack_spacing"],
+			rack_offset  = p["rack_offset"],
+		),
+		num_cabinets    = p["num_cabinets"],
+		cabinet_spacing = p["cabinet_spacing"],
+		num_rows        = p["num_cabinet_rows"],
+		row_spacing     = p["cabinet_row_spacing"],
+	)
+
+
+def factorisations(n):
+	"""
+	Get every hierarchical fold specification with n pieces in total, i.e. every
+	ordered factorisation of n into factors greater than one. The single-level
+	specification (n,) comes first.
+	"""
+	if n == 1:
+		return [(1,)]
+	
+	specs = [(n,)]
+	for f in range(2, n):
+		if n % f == 0:
+			specs.extend((f,) + rest for rest in factorisations(n / f))
+	return specs
+
+
+def longest_wire_bound(histogram, error_bound):
+	"""
+	Get a lower bound on the length of the longest wire given an estimated
+	histogram {length: count,...} in which at most error_bound wires are
+	misplaced (see symmetry.estimate_error_bound): at least one wire is no
+	shorter than the (error_bound + 1)th longest estimated wire.
+	"""
+	remaining = error_bound + 1
+	for length in sorted(histogram, reverse = True):
+		remaining -= histogram[length]
+		if remaining <= 0:
+			return length
+	return 0.0
+
+
+def measure_folds(p, system, folds):
+	"""
+	Get a dict {direction: (max_length, total_length),...} for the given folds.
+	"""
+	histograms = symmetry.wire_length_histogram( p["width"], p["height"], folds
+	                                           , system
+	                                           , system.cabinet.rack.slot.wire_position
+	                                           , p["compress_rows"]
+	                                           , DIRECTIONS
+	                                           )
+	return dict(
+		(direction, ( max(histograms[direction])
+		            , sum(l * count for (l, count) in histograms[direction].iteritems())
+		            ))
+		for direction in DIRECTIONS
+	)
+
+
+def compare_folds(p):
+	"""
+	Get a list [(folds, lengths, bound),...] for every hierarchical split of the
+	folds given in a dict of parameters, the single-level folds first. lengths
+	is a dict {direction: (max_length, total_length),...} or None if the split
+	was not measured and bound is a lower bound on the length of its longest
+	wire.
+	
+	The single-level folds are always measured. The other splits are measured in
+	order of their bound, skipping any whose bound shows that they cannot have a
+	shorter longest wire than the best split measured so far.
+	"""
+	system = build_system(p)
+	
+	error_bounds = symmetry.estimate_error_bound( p["width"], p["height"]
+	                                            , p["compress_rows"], DIRECTIONS
+	                                            )
+	
+	candidates = []
+	for folds in product( factorisations(topology.fold_count(p["num_folds_x"]))
+	                    , factorisations(topology.fold_count(p["num_folds_y"]))
+	                    ):
+		estimate = symmetry.estimate_wire_length_histogram( p["width"], p["height"], folds
+		                                                  , system
+		                                                  , system.cabinet.rack.slot.wire_position
+		                                                  , p["compress_rows"]
+		                                                  , DIRECTIONS
+		                                                  )
+		candidates.append((folds, max( longest_wire_bound(estimate[direction], error_bounds[direction])
+		                               for direction in DIRECTIONS
+		                             )))
+	
+	# The single-level folds first, then the most promising
+	order = [0] + sorted(range(1, len(candidates)), key = (lambda i: candidates[i][1]))
+	
+	measured = {}
+	best = None
+	for i in order:
+		folds, bound = candidates[i]
+		# Allow for rounding in the estimate
+		if best is not None and bound - 1e-9 >= best:
+			continue
+		
+		measured[i] = measure_folds(p, system, folds)
+		longest = max(max_length for (max_length, total_length) in measured[i].itervalues())
+		best = longest if best is None else min(best, longest)
+	
+	return [ (folds, measured.get(i), bound)
+	         for (i, (folds, bound)) in enumerate(candidates)
+	       ]
+
+
+def describe_folds(folds):
+	"""
+	Get a short description of a (possibly hierarchical) fold specification.
+	"""
+	return "x".join(map(str, topology.fold_levels(folds)))
+
+
+if __name__=="__main__":
+	params_directory = os.path.dirname(os.path.abspath(__file__))
+	params_filenames = sys.argv[1:] or [
+		os.path.join(params_directory, "params_spin%d.py"%n) for n in range(103, 107)
+	]
+	
+	for params_filename in params_filenames:
+		p = load_params(params_filename)
+		print "%s (%dx%d threeboards, %d cabinets of %d racks)"%(
+			os.path.basename(params_filename), p["width"], p["height"],
+			p["num_cabinets"], p["num_racks_per_cabinet"])
+		print "  %-11s %s"%("Folds (X,Y)", "  ".join("%9s  %13s"%( DIRECTION_NAMES[d] + " max"
+		                                                            , DIRECTION_NAMES[d] + " total")
+		                                          for d in DIRECTIONS))
+		
+		for folds, lengths, bound in compare_folds(p):
+			if lengths is not None:
+				print "  %-11s %s"%(
+					"%s,%s"%tuple(map(describe_folds, folds)),
+					"  ".join("%8.2fm  %12.2fm"%lengths[d] for d in DIRECTIONS))
+			else:
+				print "  %-11s not measured: longest wire at least %.2fm"%(
+					"%s,%s"%tuple(map(describe_folds, folds)), bound)
+		print
@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+
+"""
+Incremental computation of a report made up of model stages and sections.
+
+A stage is a (potentially expensive) intermediate value such as a model of the
+machine. A section is a final, picklable result such as a table or diagram.
+Each declares the parameters and stages it depends on and is identified by a
+key which is a hash of the values of those parameters, the keys of those stages
+and the source code of the program (so that results computed by older code are
+never reused). A stage or section need only be recomputed when its key changes:
+
+* Stages are kept in memory for as long as the Build exists.
+* Sections are also kept in memory and, if a cache directory is given, are
+  persisted there so that they may be reused by later runs.
+
+Stages are computed only when a section which must be recomputed requires
+them. Sections which must be recomputed are then computed concurrently (see
+scheduler.py). A large section may be split into several jobs (see
+add_split_section) which are run concurrently alongside those of every other
+section.
+"""
+
+import os
+import hashlib
+import cPickle as pickle
+
+import scheduler
+
+
+def _freeze(value):
+	"""
+	Used internally. Get a canonical string representation of a parameter value
+	(dicts are otherwise represented in an arbitrary order).
+	"""
+	if isinstance(value, dict):
+		return "{%s}"%(", ".join("%s: %s"%(_freeze(k), _freeze(v))
+		                         for (k, v) in sorted(value.iteritems())))
+	elif isinstance(value, (list, tuple)):
+		return "(%s)"%(", ".join(map(_freeze, value)))
+	else:
+		return repr(value)
+
+
+class Build(object):
+	"""
+	A set of stages and sections whose values are recomputed only when the
+	parameters they depend on change.
+	"""
+	
+	def __init__(self, cache_directory = None, source_files = []):
+		"""
+		cache_directory is the directory in which section results are persisted
+		or None to keep them only in memory.
+		
+		source_files is a list of the files containing the code which computes the
+		stages and sections. A hash of their contents is part of every key so
+		that persisted results are not reused once the code has changed.
+		"""
+		self.cache_directory = cache_directory
+		if self.cache_directory is not None and not os.path.isdir(self.cache_directory):
+			os.makedirs(self.cache_directory)
+		
+		h = hashlib.sha1()
+		for filename in source_files:
+			f = open(filename, "rb")
+			try:
+				h.update(f.read())
+			finally:
+				f.close()
+		self.source_hash = h.hexdigest()
+		
+		# The current value of every parameter
+		self.params = {}
+		
+		# The definitions {name: (f, params, stages),...} of every stage and section
+		self.stages   = {}
+		self.sections = {}
+		
+		# The names of the sections which are split into several jobs
+		self.split_sections = set()
+		
+		# The most recently computed value of every stage and section {name: (key,
+		# value),...}
+		self.values = {}
+		
+		# The names of the stages and sections reused or computed since the last
+		# call to set_params().
+		self.reused   = []
+		self.computed = []
+	
+	
+	def add_stage(self, name, f, params = [], stages = []):
+		"""
+		Define a stage. Its value is f(*stage_values) where stage_values are the
+		values of the named stages. params is a list of the names of the
+		parameters it depends on.
+		"""
+		self.stages[name] = (f, params, stages)
+	
+	
+	def add_section(self, name, f, params = [], stages = []):
+		"""
+		Define a section. As for add_stage but the value must be picklable.
+		"""
+		self.sections[name] = (f, params, stages)
+		self.split_sections.discard(name)
+	
+	
+	def add_split_section(self, name, f, params = [], stages = []):
+		"""
+		Define a section which is computed by several jobs. f(*stage_values)
+		returns a dict {key: job,...} of functions of no arguments, each returning
+		a picklable value. The section's value is the dict {key: job(),...}. The
+		jobs are run concurrently with those of every other section.
+		"""
+		self.sections[name] = (f, params, stages)
+		self.split_sections.add(name)
+	
+	
+	def set_params(self, params):
+		"""
+		Set the values of the parameters from the given dict (e.g. globals()). Only
+		the parameters which stages and sections depend on are used.
+		"""
+		self.params = {}
+		for f, params_used, stages in self.stages.values() + self.sections.values():
+			for name in params_used:
+				self.params[name] = params[name]
+		
+		self.reused   = []
+		self.computed = []
+	
+	
+	def _get_definition(self, name):
+		"""
+		Used internally. Get the (f, params, stages) of a stage or section.
+		"""
+		return self.stages.get(name) or self.sections[name]
+	
+	
+	def get_key(self, name):
+		"""
+		Get the key of a stage or section: a hash of everything it depends on.
+		"""
+		f, params, stages = self._get_definition(name)
+		
+		h = hashlib.sha1(name)
+		h.update(self.source_hash)
+		for param in params:
+			h.update("%s=%s;"%(param, _freeze(self.params[param])))
+		for stage in stages:
+			h.update("%s=%s;"%(stage, self.get_key(stage)))
+		
+		return h.hexdigest()
+	
+	
+	def get_stage(self, name):
+		"""
+		Get the value of a stage, (re)computing it and its dependencies if
+		required.
+		"""
+		key = self.get_key(name)
+		
+		if name in self.values and self.values[name][0] == key:
+			if name not in self.reused and name not in self.computed:
+				self.reused.append(name)
+		else:
+			f, params, stages = self.stages[name]
+			self.values[name] = (key, f(*map(self.get_stage, stages)))
+			self.computed.append(name)
+		
+		return self.values[name][1]
+	
+	
+	def _get_cache_filename(self, name, key):
+		"""
+		Used internally. Get the file a section's result is persisted in.
+		"""
+		return os.path.join(self.cache_directory, "%s-%s.pickle"%(name, key))
+	
+	
+	def _load_section(self, name, key):
+		"""
+		Used internally. Get the value of a section from memory or the cache
+		directory. Returns a tuple (found, value).
+		"""
+		if name in self.values and self.values[name][0] == key:
+			return (True, self.values[name][1])
+		
+		if self.cache_directory is not None:
+			filename = self._get_cache_filename(name, key)
+			if os.path.exists(filename):
+				f = open(filename, "rb")
+				try:
+					return (True, pickle.load(f))
+				finally:
+					f.close()
+		
+		return (False, None)
+	
+	
+	def _store_section(self, name, key, value):
+		"""
+		Used internally. Record the value of a section in memory and the cache
+		directory.
+		"""
+		self.values[name] = (key, value)
+		
+		if self.cache_directory is not None:
+			# Write to a temporary file first so that an interrupted run never leaves
+			# a partial result in the cache.
+			filename = self._get_cache_filename(name, key)
+			f = open(filename + ".tmp", "wb")
+			try:
+				pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+			finally:
+				f.close()
+			os.rename(filename + ".tmp", filename)
+	
+	
+	def get_sections(self, names, processes = None):
+		"""
+		Get the values of the named sections as a dict {name: value,...}.
+		
+		Sections whose key is unchanged are reused. The remainder are computed
+		concurrently using the given number of processes (see
+		scheduler.run_jobs).
+		"""
+		values = {}
+		outdated = []
+		for name in names:
+			key = self.get_key(name)
+			found, value = self._load_section(name, key)
+			if found:
+				values[name] = value
+				self.reused.append(name)
+			else:
+				outdated.append((name, key))
+		
+		# Compute the stages required (and split the split sections into their
+		# jobs) in this process so that they are shared by the workers. The keys of
+		# the jobs of each section are listed in the order they appear in jobs.
+		jobs = []
+		job_keys = []
+		for name, key in outdated:
+			f, params, stages = self.sections[name]
+			stage_values = map(self.get_stage, stages)
+			if name in self.split_sections:
+				section_jobs = f(*stage_values)
+				job_keys.append(sorted(section_jobs))
+				jobs.extend(section_jobs[k] for k in job_keys[-1])
+			else:
+				job_keys.append(None)
+				jobs.append((lambda f=f, stage_values=stage_values: f(*stage_values)))
+		
+		results = iter(scheduler.run_jobs(jobs, processes))
+		for (name, key), keys in zip(outdated, job_keys):
+			if keys is None:
+				value = results.next()
+			else:
+				value = dict((k, results.next()) for k in keys)
+			
+			self._store_section(name, key, value)
+			values[name] = value
+			self.computed.append(name)
+		
+		return values
+	
+	
+	def get_summary(self):
+		"""
+		Get a human readable summary of what was reused and what was computed.
+		"""
+		return "Reused: %s\nComputed: %s\n"%(
+			", ".join(self.reused) or "nothing",
+			", ".join(self.computed) or "nothing",
+		)
@@ -9,6 +9,27 @@ import topology
 import coordinates
 
 
+# Mapping of {(in_wire_side, packet_direction) : out_wire_side,...} giving the
+# side on which a packet travelling in a given direction leaves a board given
+# the side it entered on (see Board.follow_packet).
+PACKET_OUT_SIDES = {
+	(topology.SOUTH_WEST, topology.EAST)       : topology.EAST,
+	(topology.WEST,       topology.EAST)       : topology.NORTH_EAST,
+	
+	(topology.SOUTH_WEST, topology.NORTH_EAST) : topology.NORTH,
+	(topology.SOUTH,      topology.NORTH_EAST) : topology.NORTH_EAST,
+	
+	(topology.SOUTH,      topology.NORTH)      : topology.WEST,
+	(topology.EAST,       topology.NORTH)      : topology.NORTH,
+}
+# Opposite cases are simply inverted versions of the above...
+PACKET_OUT_SIDES.update(dict( ( (topology.opposite(iws), topology.opposite(pd))
+                              , topology.opposite(ows)
+                              )
+                              for ((iws, pd), ows) in PACKET_OUT_SIDES.items()
+                            ))
+
+
 class Board(object):
 	"""
 	Represents a SpiNNaker board in a complete system.
@@ -67,24 +88,7 @@ class Board(object):
 		when travelling in a fixed direction.
 		"""
 		
-		# Mapping of {(in_wire_side, packet_direction) : out_wire_side,...}
-		out_sides = {
-			(topology.SOUTH_WEST, topology.EAST)       : topology.EAST,
-			(topology.WEST,       topology.EAST)       : topology.NORTH_EAST,
-			
-			(topology.SOUTH_WEST, topology.NORTH_EAST) : topology.NORTH,
-			(topology.SOUTH,      topology.NORTH_EAST) : topology.NORTH_EAST,
-			
-			(topology.SOUTH,      topology.NORTH)      : topology.WEST,
-			(topology.EAST,       topology.NORTH)      : topology.NORTH,
-		}
-		# Opposite cases are simply inverted versions of the above...
-		for (iws, pd), ows in out_sides.items():
-			out_sides[( topology.opposite(iws)
-			          , topology.opposite(pd)
-			          )] = topology.opposite(ows)
-		
-		out_wire_side = out_sides[(in_wire_side, packet_direction)]
+		out_wire_side = PACKET_OUT_SIDES[(in_wire_side, packet_direction)]
 		
 		return (topology.opposite(out_wire_side), self.follow_wire(out_wire_side))
 		
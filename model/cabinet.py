@@ -259,13 +259,20 @@ class Cabinet(_Container):
 
 class System(object):
 	"""
-	A system which contains a row of Cabinets horizontally along the x-axis.
+	A system which contains rows of Cabinets horizontally along the x-axis. Rows
+	are placed one behind the other along the z-axis, separated by aisles.
+	
+	Cabinets are numbered along the first row and then back along the next (and
+	so on) so that consecutively numbered cabinets are always adjacent, either
+	side by side or facing each other across an aisle at the end of a row.
 	"""
 	
 	def __init__( self
 	            , cabinet = None
 	            , num_cabinets = 5
 	            , cabinet_spacing = 1
+	            , num_rows = 1
+	            , row_spacing = 1
 	            ):
 		"""
 		num_cabinets is the number of cabinets in the system
@@ -273,10 +280,57 @@ class System(object):
 		cabinet_spacing is the additional (horizontal) space between each cabinet
 		
 		cabinet is a Cabinet definition.
+		
+		num_rows is the number of rows the cabinets are split between. Every row
+		but the last is full.
+		
+		row_spacing is the additional space (i.e. the width of the aisle) between
+		each row or a list giving the width of each of the num_rows-1 aisles.
 		"""
 		self.num_cabinets    = num_cabinets
 		self.cabinet_spacing = cabinet_spacing
 		self.cabinet         = cabinet or Cabinet()
+		self.num_rows        = num_rows
+		
+		if isinstance(row_spacing, (list, tuple)):
+			assert(len(row_spacing) == num_rows - 1)
+			self.row_spacing = list(row_spacing)
+		else:
+			self.row_spacing = [row_spacing] * (num_rows - 1)
+		
+		self.cabinets_per_row = (num_cabinets + num_rows - 1) / num_rows
+		
+		# The (column, row) of each cabinet
+		self.cabinet_grid_positions = []
+		for cabinet_num in range(num_cabinets):
+			row, col = divmod(cabinet_num, self.cabinets_per_row)
+			if row % 2:
+				col = self.cabinets_per_row - 1 - col
+			self.cabinet_grid_positions.append((col, row))
+		
+		# The distance of each row from the front of the first
+		row_z = [0.0]
+		for spacing in self.row_spacing:
+			row_z.append(row_z[-1] + self.cabinet.depth + spacing)
+		
+		# The position of every cabinet, precomputed as this is required for every
+		# wire measured.
+		self.cabinet_positions = [
+			coordinates.Cartesian3D( (self.cabinet.width + self.cabinet_spacing) * col
+			                       , 0.0
+			                       , row_z[row]
+			                       )
+			for (col, row) in self.cabinet_grid_positions
+		]
+		
+		# The position of every cabinet in a front elevation of the system with each
+		# row drawn above the previous (see get_elevation_position)
+		self.cabinet_elevation_positions = [
+			coordinates.Cartesian2D( col * (self.cabinet.width + self.cabinet_spacing)
+			                       , row * (self.cabinet.height + self.cabinet_spacing)
+			                       )
+			for (col, row) in self.cabinet_grid_positions
+		]
 	
 	
 	def get_position(self, coord, direction = None):
@@ -286,9 +340,27 @@ class System(object):
 		"""
 		
 		wire_position = self.cabinet.get_position(coord[1], coord[2], direction)
+		cabinet_position = self.cabinet_positions[coord[0]]
 		
 		return coordinates.Cartesian3D(
-			wire_position.x + (self.cabinet.width + self.cabinet_spacing) * coord[0],
+			wire_position.x + cabinet_position.x,
 			wire_position.y,
-			wire_position.z,
+			wire_position.z + cabinet_position.z,
+		)
+	
+	
+	def get_elevation_position(self, coord, direction = None):
+		"""
+		Get the (x, y) position of the given slot (and optionally wire) in a front
+		elevation of the system in which each row of cabinets is drawn above the
+		previous one. With a single row, this is simply the x and y of
+		get_position().
+		"""
+		
+		wire_position = self.cabinet.get_position(coord[1], coord[2], direction)
+		cabinet_position = self.cabinet_elevation_positions[coord[0]]
+		
+		return coordinates.Cartesian2D(
+			wire_position.x + cabinet_position.x,
+			wire_position.y + cabinet_position.y,
 		)
@@ -0,0 +1,424 @@
+#!/usr/bin/env python
+
+"""
+Connectivity of systems in which some boards or wires have failed.
+
+Boards are identified by their index in the list of boards (see the table
+module) and wires by the index of a board and a direction. Removing a board
+also removes every wire connected to it.
+
+A FaultModel is updated as each fault occurs and can report the connected
+components of the surviving boards, the largest of these, the boards which
+have lost all of their links and the increase in the number of hops between
+boards. The number of live links of each board and a component label for each
+board are maintained incrementally. When a link is lost, a pair of searches
+from either end, run in lock-step, either meet (usually after a few hops) or
+one exhausts the smaller of the two parts, which alone is relabelled. The
+number and largest of the components are then available without searching the
+whole system.
+
+When the whole sequence of faults is known in advance, fault_timeline reports
+the connectivity after each fault more cheaply still: it applies every fault
+first and then repairs them in reverse order, merging components with a
+union-find structure as boards and wires are restored.
+"""
+
+import random
+
+from array import array
+from collections import deque
+
+import topology
+import table
+
+
+# The directions of the wires whose key is their source (see wire_key)
+_KEY_DIRECTIONS = set([topology.NORTH, topology.EAST, topology.SOUTH_WEST])
+
+
+class _DisjointSets(object):
+	"""
+	Used internally. A union-find structure over the integers 0 to n-1 which
+	tracks the number of sets (of members which have been added) and the size of
+	the largest.
+	"""
+	
+	def __init__(self, n):
+		self.parent = array("l", xrange(n))
+		self.size   = array("l", [1]) * n
+		
+		self.num_sets = 0
+		self.largest  = 0
+	
+	
+	def add(self, i):
+		"""
+		Add a member in a set of its own.
+		"""
+		self.num_sets += 1
+		self.largest = max(self.largest, 1)
+	
+	
+	def find(self, i):
+		"""
+		Get the representative of the set containing i.
+		"""
+		parent = self.parent
+		while parent[i] != i:
+			# Path halving
+			parent[i] = parent[parent[i]]
+			i = parent[i]
+		return i
+	
+	
+	def union(self, i, j):
+		"""
+		Merge the sets containing i and j.
+		"""
+		i = self.find(i)
+		j = self.find(j)
+		if i == j:
+			return
+		
+		# Union by size
+		if self.size[i] < self.size[j]:
+			i, j = j, i
+		self.parent[j] = i
+		self.size[i] += self.size[j]
+		
+		self.num_sets -= 1
+		self.largest = max(self.largest, self.size[i])
+
+
+def wire_key(neighbours, board, direction):
+	"""
+	Get the key (board, direction) which identifies the wire leaving the given
+	board in the given direction regardless of which end it is named from.
+	"""
+	if direction in _KEY_DIRECTIONS:
+		return (board, direction)
+	else:
+		return (neighbours[direction][board], topology.opposite(direction))
+
+
+class FaultModel(object):
+	"""
+	A system of boards from which boards and wires may be removed.
+	"""
+	
+	def __init__(self, boards):
+		"""
+		boards is a list [(board, coord),...] (e.g. from board.create_torus).
+		"""
+		self.neighbours = table.neighbour_table(boards)
+		n = self.num_boards = len(boards)
+		
+		self.alive = array("b", [1]) * n
+		
+		# Keys of the removed wires (see wire_key)
+		self.dead_wires = set()
+		
+		# The number of live links (live wires to live boards) of each board
+		self.degree = array("l", [0]) * n
+		for direction in table.DIRECTIONS:
+			for i, j in enumerate(self.neighbours[direction]):
+				if j != -1:
+					self.degree[i] += 1
+		
+		# The live boards without any live links
+		self.isolated = set(i for i in xrange(n) if self.degree[i] == 0)
+		
+		# The component label of each board (-1 once removed) and the number of
+		# boards with each label {label: size,...}.
+		sets = _DisjointSets(n)
+		for direction in _KEY_DIRECTIONS:
+			for i, j in enumerate(self.neighbours[direction]):
+				if j != -1:
+					sets.union(i, j)
+		self.labels = array("l", map(sets.find, xrange(n)))
+		self.label_sizes = dict((i, sets.size[i]) for i in xrange(n)
+		                        if sets.parent[i] == i)
+		self._next_label = n
+		
+		# The numbered components of the live boards, found when next required
+		self._components = None
+	
+	
+	def _is_link(self, board, direction):
+		"""
+		Used internally. Test whether the wire leaving a live board in the given
+		direction is live and leads to a live board.
+		"""
+		other = self.neighbours[direction][board]
+		return ( other != -1
+		         and self.alive[other]
+		         and wire_key(self.neighbours, board, direction) not in self.dead_wires
+		       )
+	
+	
+	def _unlink(self, board):
+		"""
+		Used internally. Remove a link from a live board.
+		"""
+		self.degree[board] -= 1
+		if self.degree[board] == 0:
+			self.isolated.add(board)
+	
+	
+	def _separate(self, a, b):
+		"""
+		Used internally. Called when a path between the live boards a and b in the
+		same component may have been broken. Searches from both boards in lock-step
+		until either the searches meet or one runs out of boards, in which case the
+		boards it found are given a new label.
+		"""
+		if a == b or self.labels[a] != self.labels[b]:
+			return
+		
+		neighbours = self.neighbours
+		searches = [(deque([a]), set([a])), (deque([b]), set([b]))]
+		while True:
+			for (queue, seen), (_, other_seen) in (searches, searches[::-1]):
+				if not queue:
+					# A whole part has been found: give it a new label
+					label = self._next_label
+					self._next_label += 1
+					self.label_sizes[self.labels[a]] -= len(seen)
+					self.label_sizes[label] = len(seen)
+					for board in seen:
+						self.labels[board] = label
+					return
+				
+				board = queue.popleft()
+				for direction in table.DIRECTIONS:
+					if self._is_link(board, direction):
+						other = neighbours[direction][board]
+						if other in other_seen:
+							return
+						if other not in seen:
+							seen.add(other)
+							queue.append(other)
+	
+	
+	def remove_board(self, board):
+		"""
+		Remove the board with the given index (and so all of its wires).
+		"""
+		if not self.alive[board]:
+			return
+		
+		linked = []
+		for direction in table.DIRECTIONS:
+			if self._is_link(board, direction):
+				other = self.neighbours[direction][board]
+				self._unlink(other)
+				if other not in linked:
+					linked.append(other)
+		
+		self.alive[board] = 0
+		self.degree[board] = 0
+		self.isolated.discard(board)
+		
+		label = self.labels[board]
+		self.labels[board] = -1
+		self.label_sizes[label] -= 1
+		if self.label_sizes[label] == 0:
+			del self.label_sizes[label]
+		
+		# Any boards which remain connected must be connected to one of the
+		# former neighbours so only these need be separated.
+		for i, a in enumerate(linked):
+			for b in linked[i+1:]:
+				self._separate(a, b)
+		
+		self._components = None
+	
+	
+	def remove_wire(self, board, direction):
+		"""
+		Remove the wire leaving the board with the given index in the given
+		direction.
+		"""
+		if self.neighbours[direction][board] == -1:
+			return
+		
+		live = self.alive[board] and self._is_link(board, direction)
+		
+		self.dead_wires.add(wire_key(self.neighbours, board, direction))
+		
+		if live:
+			self._unlink(board)
+			self._unlink(self.neighbours[direction][board])
+			self._separate(board, self.neighbours[direction][board])
+			self._components = None
+	
+	
+	def components(self):
+		"""
+		Get a tuple (component_ids, sizes) where component_ids[i] is the number of
+		the component containing board i (or -1 if the board has been removed) and
+		sizes[c] is the number of boards in component c. Components are numbered in
+		order of their lowest-indexed board.
+		"""
+		if self._components is None:
+			component_ids = array("l", [-1]) * self.num_boards
+			sizes = []
+			numbers = {}
+			for i, label in enumerate(self.labels):
+				if label != -1:
+					if label not in numbers:
+						numbers[label] = len(sizes)
+						sizes.append(0)
+					component_ids[i] = numbers[label]
+					sizes[numbers[label]] += 1
+			
+			self._components = (component_ids, sizes)
+		
+		return self._components
+	
+	
+	def num_components(self):
+		"""
+		Get the number of connected components of the live boards.
+		"""
+		return len(self.label_sizes)
+	
+	
+	def largest_component(self):
+		"""
+		Get the number of boards in the largest connected component.
+		"""
+		return max(self.label_sizes.itervalues()) if self.label_sizes else 0
+	
+	
+	def isolated_boards(self):
+		"""
+		Get a sorted list of the live boards which have lost all of their links.
+		"""
+		return sorted(self.isolated)
+	
+	
+	def _hops(self, source, faulty):
+		"""
+		Used internally. Get an array giving the number of hops from the given
+		board to every other (or -1 if unreachable), either in the system as it
+		is or, if faulty is False, as it was before any faults.
+		"""
+		hops = array("l", [-1]) * self.num_boards
+		hops[source] = 0
+		
+		queue = deque([source])
+		while queue:
+			board = queue.popleft()
+			for direction in table.DIRECTIONS:
+				other = self.neighbours[direction][board]
+				if other == -1 or hops[other] != -1:
+					continue
+				if faulty and not self._is_link(board, direction):
+					continue
+				hops[other] = hops[board] + 1
+				queue.append(other)
+		
+		return hops
+	
+	
+	def hop_stretch(self, num_sources = 16, seed = 0):
+		"""
+		Measure how much longer the shortest paths between boards have become due
+		to faults. Paths are measured in board-to-board hops from num_sources live
+		boards chosen at random to every live board reachable from them.
+		
+		Returns a tuple (mean, max) of the ratio between the number of hops in the
+		system as it is and the number of hops before any faults, or (1.0, 1.0) if
+		no pair of boards remains connected.
+		"""
+		live = [i for i in xrange(self.num_boards) if self.alive[i]]
+		sources = random.Random(seed).sample(live, min(num_sources, len(live)))
+		
+		total = 0.0
+		count = 0
+		worst = 1.0
+		for source in sources:
+			before = self._hops(source, False)
+			after  = self._hops(source, True)
+			for target in live:
+				if target != source and after[target] != -1:
+					stretch = float(after[target]) / before[target]
+					total += stretch
+					count += 1
+					worst = max(worst, stretch)
+		
+		return (total / count, worst) if count else (1.0, 1.0)
+
+
+def fault_timeline(boards, faults):
+	"""
+	Get the connectivity of a system after each of a sequence of faults.
+	
+	faults is a list of faults, each either ("board", board) or ("wire", board,
+	direction) where board is the index of a board in the list given.
+	
+	Returns a list [(num_components, largest_component),...] giving the
+	connectivity after each fault.
+	"""
+	neighbours = table.neighbour_table(boards)
+	n = len(boards)
+	
+	alive = array("b", [1]) * n
+	dead_wires = set()
+	
+	# Apply every fault, noting which actually removed something so that only
+	# those are repaired. Only the final state is required so no FaultModel is
+	# needed.
+	effective = []
+	for fault in faults:
+		if fault[0] == "board":
+			effective.append(bool(alive[fault[1]]))
+			alive[fault[1]] = 0
+		else:
+			board, direction = fault[1:]
+			if neighbours[direction][board] == -1:
+				effective.append(False)
+			else:
+				key = wire_key(neighbours, board, direction)
+				effective.append(key not in dead_wires)
+				dead_wires.add(key)
+	
+	def restore_links(sets, board):
+		for direction in table.DIRECTIONS:
+			other = neighbours[direction][board]
+			if ( other != -1 and alive[other]
+			     and wire_key(neighbours, board, direction) not in dead_wires):
+				sets.union(board, other)
+	
+	# The components of the system after every fault
+	sets = _DisjointSets(n)
+	for i in xrange(n):
+		if alive[i]:
+			sets.add(i)
+	for direction in _KEY_DIRECTIONS:
+		for i, j in enumerate(neighbours[direction]):
+			if ( j != -1 and alive[i] and alive[j]
+			     and (i, direction) not in dead_wires):
+				sets.union(i, j)
+	
+	# Repair the faults in reverse
+	out = []
+	for fault, effect in reversed(zip(faults, effective)):
+		out.append((sets.num_sets, sets.largest))
+		if not effect:
+			continue
+		
+		if fault[0] == "board":
+			alive[fault[1]] = 1
+			sets.add(fault[1])
+			restore_links(sets, fault[1])
+		else:
+			board, direction = fault[1:]
+			dead_wires.discard(wire_key(neighbours, board, direction))
+			other = neighbours[direction][board]
+			if alive[board] and alive[other]:
+				sets.union(board, other)
+	
+	out.reverse()
+	return out
@@ -8,6 +8,17 @@ and their wiring.
 import topology
 import coordinates
 import cabinet
+import table
+
+
+def _assert_cabinet(boards):
+	"""
+	Used Internally.
+	
+	Assert that the coordinates are Cabinet coordinates (or that the set of
+	boards is empty).
+	"""
+	assert(len(boards) == 0 or isinstance(boards[0][1], coordinates.Cabinet))
 
 
 def wire_length(boards, board, direction, wire_offsets={}):
@@ -35,3 +46,134 @@ def wire_length(boards, board, direction, wire_offsets={}):
 	
 	return (source - target).magnitude()
 
+
+
+def wire_count_matrices(boards, directions = [ topology.NORTH
+                                             , topology.EAST
+                                             , topology.SOUTH_WEST
+                                             ]):
+	"""
+	Count the wires running between each pair of cabinets and each pair of racks
+	in a single pass over all wires.
+	
+	boards is a list [(board, coord),...] where coords are Cabinet coordinates.
+	
+	directions are the wire directions to count. The default counts every wire
+	in a fully connected system exactly once.
+	
+	Returns a dict {direction: (cabinet_matrix, rack_matrix, crossings),...}
+	where:
+	
+	* cabinet_matrix[a][b] is the number of wires leaving cabinet a for cabinet b
+	* rack_matrix[a][b] is the number of wires leaving rack a for rack b where
+	  racks are numbered (cabinet * num_racks) + rack.
+	* crossings[i] is the number of wires crossing the boundary between cabinet i
+	  and cabinet i+1.
+	"""
+	_assert_cabinet(boards)
+	
+	if len(boards) == 0:
+		return dict((direction, ([], [], [])) for direction in directions)
+	
+	neighbours = table.neighbour_table(boards, directions)
+	cabinets, racks, slots = table.coordinate_columns(boards)
+	
+	num_cabinets = max(cabinets) + 1
+	num_racks    = max(racks) + 1
+	
+	# The global index of the rack each board is in
+	rack_ids = [(c * num_racks) + r for (c, r) in zip(cabinets, racks)]
+	
+	out = {}
+	for direction in directions:
+		cabinet_matrix = [[0] * num_cabinets for _ in range(num_cabinets)]
+		rack_matrix    = [[0] * (num_cabinets * num_racks)
+		                  for _ in range(num_cabinets * num_racks)]
+		
+		# Differences in the number of wires crossing consecutive boundaries
+		crossing_deltas = [0] * num_cabinets
+		
+		for source, target in enumerate(neighbours[direction]):
+			source_cabinet = cabinets[source]
+			target_cabinet = cabinets[target]
+			
+			cabinet_matrix[source_cabinet][target_cabinet] += 1
+			rack_matrix[rack_ids[source]][rack_ids[target]] += 1
+			
+			crossing_deltas[min(source_cabinet, target_cabinet)] += 1
+			crossing_deltas[max(source_cabinet, target_cabinet)] -= 1
+		
+		# Accumulate the differences to get the number crossing each boundary
+		crossings = []
+		for delta in crossing_deltas[:-1]:
+			crossings.append((crossings[-1] if crossings else 0) + delta)
+		
+		out[direction] = (cabinet_matrix, rack_matrix, crossings)
+	
+	return out
+
+
+def wire_length_histogram(boards, directions = [ topology.NORTH
+                                               , topology.EAST
+                                               , topology.SOUTH_WEST
+                                               ]
+                         , wire_offsets = {}
+                         ):
+	"""
+	Measure every wire in a single pass (as wire_length does for one wire).
+	
+	boards is a list [(board, coord),...] where all coords support subtraction
+	and magnitude() and every board has a wire connected in each direction.
+	
+	Returns a dict {direction: {length: count,...},...}.
+	"""
+	neighbours = table.neighbour_table(boards, directions)
+	coords = [coord for (board, coord) in boards]
+	
+	out = {}
+	for direction in directions:
+		histogram = out[direction] = {}
+		
+		source_offset = wire_offsets.get(direction)
+		target_offset = wire_offsets.get(topology.opposite(direction))
+		
+		for source, target in zip(coords, (coords[i] for i in neighbours[direction])):
+			if source_offset is not None:
+				source += source_offset
+			if target_offset is not None:
+				target += target_offset
+			
+			length = (source - target).magnitude()
+			histogram[length] = histogram.get(length, 0) + 1
+	
+	return out
+
+
+def routed_wire_length_histogram(boards, routing, directions = [ topology.NORTH
+                                                                , topology.EAST
+                                                                , topology.SOUTH_WEST
+                                                                ]):
+	"""
+	As wire_length_histogram but measuring the length of each cable along its
+	route (see the routing module).
+	
+	boards is a list [(board, coord),...] where coords are Cabinet coordinates.
+	
+	routing is a routing.TrayRouting for the system the boards are in.
+	"""
+	_assert_cabinet(boards)
+	
+	neighbours = table.neighbour_table(boards, directions)
+	coords = [coord for (board, coord) in boards]
+	
+	out = {}
+	for direction in directions:
+		histogram = out[direction] = {}
+		
+		opposite = topology.opposite(direction)
+		
+		for source, target in zip(coords, (coords[i] for i in neighbours[direction])):
+			length = routing.wire_length(source, direction, target, opposite)
+			histogram[length] = histogram.get(length, 0) + 1
+	
+	return out
@@ -0,0 +1,443 @@
+#!/usr/bin/env python
+
+"""
+Allocation of boards to cabinets, racks and slots by partitioning the graph of
+wires between boards so that as few wires as possible run between racks (and
+so between cabinets).
+
+The partitioner is multilevel, in the style of METIS:
+
+* Coarsening: each vertex is repeatedly merged with the unmerged neighbour it
+  shares the most wires with (heavy-edge matching) until the graph is small.
+* Initial partitioning: the coarsest graph is recursively bisected by growing a
+  region from a vertex on its periphery. Ranges of racks are split along cabinet
+  boundaries first so that parts which are numbered close together are also
+  close together in the torus.
+* Uncoarsening: the partition is projected back onto each finer graph in turn
+  and refined by moving vertices between parts (or, where parts are full,
+  swapping pairs of vertices) whenever this reduces the number of cut wires.
+
+Graphs are held as lists of dicts {neighbour: wires,...} indexed by the
+position of each board in the list of boards (see the table module) and
+vertices have a weight, the number of boards they represent.
+"""
+
+import random
+
+from heapq import heappush, heappop
+
+import table
+import coordinates
+
+
+# Coarsening stops once the graph has no more than this many vertices per part
+COARSEST_VERTICES_PER_PART = 15
+
+# The maximum number of refinement passes made at each level
+REFINEMENT_PASSES = 8
+
+
+def wire_graph(boards):
+	"""
+	Get the graph of the wires between boards as a list of dicts {neighbour:
+	wires,...}, one per board in the list given, where wires is the number of
+	wires between the pair of boards.
+	"""
+	neighbours = table.neighbour_table(boards)
+	
+	adj = [{} for _ in boards]
+	for direction in table.DIRECTIONS:
+		for v, u in enumerate(neighbours[direction]):
+			# Wires which aren't connected or which loop back to the same board
+			# never need to be cut.
+			if u != -1 and u != v:
+				adj[v][u] = adj[v].get(u, 0) + 1
+	
+	return adj
+
+
+def _coarsen(adj, weights, max_weight, rng):
+	"""
+	Used internally. Merge vertices with the neighbour they share the heaviest
+	edge with, never creating a vertex heavier than max_weight. Returns a tuple
+	(coarse_adj, coarse_weights, mapping) where mapping[v] is the coarse vertex
+	the vertex v was merged into.
+	"""
+	order = range(len(adj))
+	rng.shuffle(order)
+	
+	mapping = [-1] * len(adj)
+	num_coarse = 0
+	for v in order:
+		if mapping[v] != -1:
+			continue
+		
+		best = -1
+		best_wires = 0
+		max_match_weight = max_weight - weights[v]
+		for u, wires in adj[v].iteritems():
+			if wires > best_wires and mapping[u] == -1 and weights[u] <= max_match_weight:
+				best = u
+				best_wires = wires
+		
+		mapping[v] = num_coarse
+		if best != -1:
+			mapping[best] = num_coarse
+		num_coarse += 1
+	
+	coarse_weights = [0] * num_coarse
+	coarse_adj = [{} for _ in xrange(num_coarse)]
+	for v, cv in enumerate(mapping):
+		coarse_weights[cv] += weights[v]
+		
+		edges = coarse_adj[cv]
+		for u, wires in adj[v].iteritems():
+			cu = mapping[u]
+			if cu != cv:
+				edges[cu] = edges.get(cu, 0) + wires
+	
+	return (coarse_adj, coarse_weights, mapping)
+
+
+def _split_parts(num_parts, racks_per_cabinet):
+	"""
+	Used internally. Get the number of parts to place in the first half of a
+	bisection of a range of num_parts parts (starting at a cabinet boundary):
+	whole cabinets are kept together where possible.
+	"""
+	if num_parts > racks_per_cabinet:
+		return max(1, (num_parts / racks_per_cabinet) / 2) * racks_per_cabinet
+	else:
+		return num_parts / 2
+
+
+def _peripheral_vertex(adj, vertices):
+	"""
+	Used internally. Get a vertex far from the centre of the subgraph containing
+	the given set of vertices by repeated breadth-first search.
+	"""
+	start = min(vertices)
+	for _ in range(2):
+		frontier = [start]
+		seen = set(frontier)
+		while frontier:
+			start = frontier[0]
+			next_frontier = []
+			for v in frontier:
+				for u in adj[v]:
+					if u in vertices and u not in seen:
+						seen.add(u)
+						next_frontier.append(u)
+			frontier = next_frontier
+	return start
+
+
+def _grow_region(adj, weights, vertices, target):
+	"""
+	Used internally. Grow a region from a peripheral vertex of the given set of
+	vertices, always adding the vertex with the most wires into the region, until
+	its weight reaches the target. Returns the set of vertices in the region.
+	"""
+	region = set()
+	weight = 0
+	
+	# Wires from each vertex into the region and a heap of (-wires, vertex) with
+	# stale entries skipped.
+	wires = {}
+	heap = []
+	
+	remaining = set(vertices)
+	while weight < target and remaining:
+		if not heap:
+			# Start (or, for disconnected subgraphs, restart) on the periphery
+			v = _peripheral_vertex(adj, remaining)
+			wires[v] = 0
+			heappush(heap, (0, v))
+		
+		negative_wires, v = heappop(heap)
+		if v in region or -negative_wires != wires[v]:
+			continue
+		
+		region.add(v)
+		remaining.discard(v)
+		weight += weights[v]
+		
+		for u, w in adj[v].iteritems():
+			if u in remaining:
+				wires[u] = wires.get(u, 0) + w
+				heappush(heap, (-wires[u], u))
+	
+	return region
+
+
+def _initial_partition( adj, weights, vertices, parts, targets, racks_per_cabinet
+                      , assignment
+                      ):
+	"""
+	Used internally. Recursively bisect the subgraph containing the given set of
+	vertices into the given list of parts (numbered consecutively from a cabinet
+	boundary), recording the part of each vertex in assignment.
+	"""
+	if len(parts) == 1:
+		for v in vertices:
+			assignment[v] = parts[0]
+		return
+	
+	split = _split_parts(len(parts), racks_per_cabinet)
+	
+	# Aim for the same proportion of the weight actually present
+	total = sum(weights[v] for v in vertices)
+	target = (total * sum(targets[:split])) / max(1, sum(targets))
+	
+	first = _grow_region(adj, weights, vertices, target)
+	_initial_partition( adj, weights, first, parts[:split], targets[:split]
+	                  , racks_per_cabinet, assignment)
+	_initial_partition( adj, weights, vertices - first, parts[split:], targets[split:]
+	                  , racks_per_cabinet, assignment)
+
+
+def _connectivity(adj, assignment, v):
+	"""
+	Used internally. Get a dict {part: wires,...} giving the number of wires from
+	v to each part it is connected to.
+	"""
+	conn = {}
+	for u, wires in adj[v].iteritems():
+		p = assignment[u]
+		conn[p] = conn.get(p, 0) + wires
+	return conn
+
+
+def _balance(adj, weights, assignment, part_weights, max_weights):
+	"""
+	Used internally. Move vertices out of parts heavier than their maximum
+	weight, preferring moves to neighbouring parts which cut the fewest wires.
+	"""
+	for neighbours_only in [True, False]:
+		for v in xrange(len(adj)):
+			own = assignment[v]
+			if part_weights[own] <= max_weights[own]:
+				continue
+			
+			conn = _connectivity(adj, assignment, v)
+			if neighbours_only:
+				candidates = [p for p in conn if p != own]
+			else:
+				candidates = range(len(part_weights))
+			
+			# The part with room which leaves the most wires uncut
+			best = None
+			for p in candidates:
+				if p != own and part_weights[p] + weights[v] <= max_weights[p]:
+					if best is None or conn.get(p, 0) > conn.get(best, 0):
+						best = p
+			
+			if best is not None:
+				assignment[v] = best
+				part_weights[own]  -= weights[v]
+				part_weights[best] += weights[v]
+
+
+def _find_swap(adj, weights, assignment, v, own, p, gain):
+	"""
+	Used internally. Find a vertex in part p near v of the same weight which may
+	be swapped with v (which would gain the given number of wires by moving to
+	p) to reduce the number of cut wires. Returns the vertex or None.
+	"""
+	best = None
+	best_gain = 0
+	
+	candidates = set(adj[v])
+	for u in adj[v]:
+		candidates.update(adj[u])
+	
+	for u in candidates:
+		if assignment[u] != p or weights[u] != weights[v]:
+			continue
+		conn = _connectivity(adj, assignment, u)
+		swap_gain = gain + conn.get(own, 0) - conn.get(p, 0) - (2 * adj[v].get(u, 0))
+		if swap_gain > best_gain:
+			best = u
+			best_gain = swap_gain
+	
+	return best
+
+
+def _refine(adj, weights, assignment, part_weights, max_weights, swaps):
+	"""
+	Used internally. Greedily move vertices on the boundary of their part to the
+	neighbouring part which most reduces the number of cut wires without
+	exceeding its maximum weight. If swaps is True, moves blocked because the
+	part is full are attempted as swaps instead.
+	"""
+	# After the first pass only vertices near those moved can have changed
+	candidates = xrange(len(adj))
+	
+	for _ in range(REFINEMENT_PASSES):
+		improved = False
+		moved = set()
+		for v in candidates:
+			own = assignment[v]
+			
+			# Skip vertices not on a boundary (cheaply)
+			for u in adj[v]:
+				if assignment[u] != own:
+					break
+			else:
+				continue
+			
+			conn = _connectivity(adj, assignment, v)
+			own_wires = conn.get(own, 0)
+			
+			best = None
+			best_gain = 0
+			blocked = None
+			blocked_gain = 0
+			for p, wires in conn.iteritems():
+				if p == own:
+					continue
+				gain = wires - own_wires
+				if part_weights[p] + weights[v] <= max_weights[p]:
+					# Moves which cut no more wires are made if they improve the balance
+					if gain > best_gain or (gain == best_gain == 0 and best is None and
+					                        part_weights[p] + weights[v] < part_weights[own]):
+						best = p
+						best_gain = gain
+				elif gain > blocked_gain:
+					blocked = p
+					blocked_gain = gain
+			
+			if best is not None:
+				assignment[v] = best
+				part_weights[own]  -= weights[v]
+				part_weights[best] += weights[v]
+				improved = improved or best_gain > 0
+				moved.add(v)
+			elif swaps and blocked is not None:
+				u = _find_swap(adj, weights, assignment, v, own, blocked, blocked_gain)
+				if u is not None:
+					assignment[v] = blocked
+					assignment[u] = own
+					improved = True
+					moved.add(v)
+					moved.add(u)
+		
+		if not improved:
+			break
+		
+		candidates = set(moved)
+		for v in moved:
+			candidates.update(adj[v])
+		candidates = sorted(candidates)
+
+
+def partition_graph( adj, num_parts, max_part_weight, racks_per_cabinet = 1
+                   , seed = 0
+                   ):
+	"""
+	Partition a graph (a list of dicts {neighbour: wires,...}, see wire_graph)
+	into num_parts parts of (as near as possible) equal size, none larger than
+	max_part_weight vertices, minimising the number of wires between parts.
+	
+	Parts are numbered such that each consecutive group of racks_per_cabinet
+	parts are close together in the graph.
+	
+	Returns a list giving the part of each vertex.
+	"""
+	n = len(adj)
+	assert(n <= num_parts * max_part_weight)
+	
+	rng = random.Random(seed)
+	
+	# The number of vertices each part should have
+	targets = [(n / num_parts) + (1 if p < n % num_parts else 0) for p in range(num_parts)]
+	
+	# Coarsen, never creating vertices too heavy to balance the parts with
+	max_vertex_weight = max(1, min(targets) / 4)
+	levels = [(adj, [1] * n, None)]
+	while len(levels[-1][0]) > COARSEST_VERTICES_PER_PART * num_parts:
+		coarse_adj, coarse_weights, mapping = _coarsen( levels[-1][0], levels[-1][1]
+		                                              , max_vertex_weight, rng)
+		
+		# Stop when matching no longer makes much progress
+		if len(coarse_adj) > 0.9 * len(levels[-1][0]):
+			break
+		levels.append((coarse_adj, coarse_weights, mapping))
+	
+	# Partition the coarsest graph
+	coarse_adj, coarse_weights, _ = levels[-1]
+	assignment = [0] * len(coarse_adj)
+	_initial_partition( coarse_adj, coarse_weights, set(xrange(len(coarse_adj)))
+	                  , range(num_parts), targets, racks_per_cabinet, assignment
+	                  )
+	
+	# Project back to the original graph, refining at each level
+	for level in range(len(levels) - 1, -1, -1):
+		level_adj, level_weights, mapping = levels[level]
+		
+		if level < len(levels) - 1:
+			coarse_mapping = levels[level + 1][2]
+			assignment = [assignment[cv] for cv in coarse_mapping]
+		
+		part_weights = [0] * num_parts
+		for v, p in enumerate(assignment):
+			part_weights[p] += level_weights[v]
+		
+		# Coarse levels are given some slack to allow vertices to move
+		if level > 0:
+			slack = max(level_weights)
+			max_weights = [t + slack for t in targets]
+		else:
+			max_weights = [max_part_weight] * num_parts
+		
+		_balance(level_adj, level_weights, assignment, part_weights, max_weights)
+		_refine( level_adj, level_weights, assignment, part_weights, max_weights
+		       , swaps = (level == 0)
+		       )
+	
+	return assignment
+
+
+def cut_wires(adj, assignment):
+	"""
+	Get the number of wires in a graph between vertices in different parts.
+	"""
+	return sum( wires
+	            for (v, edges) in enumerate(adj)
+	            for (u, wires) in edges.iteritems()
+	            if assignment[u] != assignment[v]
+	          ) / 2
+
+
+def partition(boards, num_cabinets, racks_per_cabinet, slots_per_rack = None, seed = 0):
+	"""
+	Allocate boards (a list [(board, coord),...] of any coordinates) to cabinets,
+	racks and slots such that each rack is filled as evenly as possible and the
+	number of wires between racks is minimised. Consecutive racks and cabinets
+	are placed close together in the torus.
+	
+	If slots_per_rack is given, no rack is given more boards than this.
+	
+	Returns a list [(board, Cabinet),...] in the same order as the input (see
+	transforms.cabinetise).
+	"""
+	if len(boards) == 0:
+		return []
+	
+	num_parts = num_cabinets * racks_per_cabinet
+	if slots_per_rack is None:
+		slots_per_rack = (len(boards) + num_parts - 1) / num_parts
+	
+	assignment = partition_graph( wire_graph(boards), num_parts, slots_per_rack
+	                            , racks_per_cabinet, seed
+	                            )
+	
+	# Number the slots of each rack in the order the boards were given
+	next_slot = [0] * num_parts
+	out = []
+	for (board, coord), p in zip(boards, assignment):
+		cabinet, rack = divmod(p, racks_per_cabinet)
+		out.append((board, coordinates.Cabinet(cabinet, rack, next_slot[p])))
+		next_slot[p] += 1
+	
+	return out
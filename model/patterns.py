@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+
+"""
+Discovery of repeated wiring patterns in a system. A wiring pattern is the set
+of relative offsets of the wires leaving a group of boards (e.g. a slot, rack
+or cabinet) in a given direction. Groups with the same pattern can be wired up
+using identical harnesses.
+
+Offsets are computed for every board and direction at once using the integer
+tables in the table module and each offset is packed into a single integer so
+that patterns can be compared and hashed cheaply.
+"""
+
+from collections import defaultdict
+
+import table
+
+
+def pack_offsets(offsets, bound):
+	"""
+	Pack a list of offset columns (as produced by relative_wires) into a list of
+	integers, one per row. All values must lie within +/- bound.
+	"""
+	base = (2 * bound) + 1
+	
+	packed = [0] * len(offsets[0]) if offsets else []
+	for column in offsets:
+		packed = [(p * base) + v + bound for (p, v) in zip(packed, column)]
+	
+	return packed
+
+
+def unpack_offset(packed, bound, num_fields):
+	"""
+	Unpack a single integer produced by pack_offsets() into a tuple of offsets.
+	"""
+	base = (2 * bound) + 1
+	
+	values = []
+	for _ in range(num_fields):
+		values.append((packed % base) - bound)
+		packed /= base
+	
+	return tuple(reversed(values))
+
+
+def relative_wires(boards, directions = table.DIRECTIONS):
+	"""
+	Calculate the relative offset of the board at the end of every wire in the
+	system.
+	
+	boards is a list [(board, coord),...] where all coords are integer tuples and
+	every board has a wire connected in each of the given directions.
+	
+	Returns a tuple (offsets, bound) where offsets is a dict {direction:
+	columns,...} where columns is a list with one list per coordinate field such
+	that columns[field][i] is the offset of that field for the wire leaving
+	boards[i] in the given direction. bound is the largest absolute offset
+	value.
+	"""
+	neighbours = table.neighbour_table(boards, directions)
+	columns    = table.coordinate_columns(boards)
+	
+	offsets = {}
+	bound = 0
+	for direction in directions:
+		n = neighbours[direction]
+		offsets[direction] = [ [column[j] - column[i] for (i, j) in enumerate(n)]
+		                       for column in columns
+		                     ]
+		for column in offsets[direction]:
+			bound = max([bound] + map(abs, column))
+	
+	return offsets, bound
+
+
+def mirror_offsets(packed, bound, num_fields, field):
+	"""
+	Returns a dict {packed: mirrored_packed,...} which maps each of the given
+	packed offsets to the packed offset with the given field negated.
+	"""
+	mirrored = {}
+	for p in set(packed):
+		offset = list(unpack_offset(p, bound, num_fields))
+		offset[field] = -offset[field]
+		mirrored[p] = pack_offsets([[v] for v in offset], bound)[0]
+	
+	return mirrored
+
+
+def canonical_pattern(wires, translate = False, mirror = None):
+	"""
+	Returns a canonical version of a pattern such that any two patterns which
+	differ only by the given symmetries have the same canonical pattern.
+	
+	wires is a collection of (elem, packed_offset) pairs. If either symmetry is
+	used, elems must be integers (e.g. slot numbers).
+	
+	If translate is True, patterns which differ only by a constant added to all
+	elems are equivalent.
+	
+	mirror is an optional dict {packed_offset: mirrored_packed_offset,...} (see
+	mirror_offsets). If given, patterns which differ by negating all elems and
+	mirroring all offsets are equivalent (for example, the patterns of racks
+	placed on reverse-facing folds).
+	
+	Runs in time linear in the number of wires: rather than sorting the wires
+	into a canonical order, the variant whose (order independent) frozenset hash
+	is smallest is selected.
+	"""
+	def normalise(wires):
+		if translate and wires:
+			offset = min(e for (e, p) in wires)
+			return frozenset((e - offset, p) for (e, p) in wires)
+		else:
+			return frozenset(wires)
+	
+	pattern = normalise(wires)
+	if mirror is None:
+		return pattern
+	
+	mirrored = normalise([(-e, mirror[p]) for (e, p) in wires])
+	
+	# Select the variant with the smallest hash. In the (unlikely) event of a tie
+	# between different variants, fall back on comparing their contents.
+	if hash(pattern) != hash(mirrored):
+		return min(pattern, mirrored, key = hash)
+	elif pattern == mirrored:
+		return pattern
+	else:
+		return min(pattern, mirrored, key = sorted)
+
+
+def find_patterns( boards, group_key, elem_key = (lambda coord: None)
+                 , wire_filter = None, directions = table.DIRECTIONS
+                 , translate = False, mirror_field = None
+                 ):
+	"""
+	Find the distinct wiring patterns in the system.
+	
+	boards is a list [(board, coord),...] where all coords are integer tuples.
+	
+	group_key(coord) gives the group (e.g. rack) a board belongs to and
+	elem_key(coord) identifies the board within the group (e.g. slot). For
+	example, to find the distinct wiring patterns of each rack::
+	
+		group_key = (lambda (c,r,s): (c,r))
+		elem_key  = (lambda (c,r,s): s)
+	
+	wire_filter(offset) optionally selects which wires are considered based on
+	their relative offset tuple.
+	
+	translate and mirror_field specify symmetries under which patterns are
+	considered equivalent (see canonical_pattern). If translate is True,
+	patterns which are translations of each other along the elems are
+	equivalent. If mirror_field is given, patterns which are mirror images, with
+	the elems and the given offset field negated, are equivalent. For example,
+	to treat rack patterns which differ by a shift or reversal along the slots
+	as the same::
+	
+		translate    = True
+		mirror_field = 2
+	
+	Returns a dict {direction: (group_patterns, pattern_counts),...} where
+	group_patterns is a dict {group: pattern_id,...} and pattern_counts is a list
+	giving the number of groups having each pattern_id. Groups containing no
+	(selected) wires are omitted.
+	"""
+	offsets, bound = relative_wires(boards, directions)
+	
+	groups = [group_key(coord) for (board, coord) in boards]
+	elems  = [elem_key(coord)  for (board, coord) in boards]
+	
+	out = {}
+	for direction in directions:
+		packed = pack_offsets(offsets[direction], bound)
+		num_fields = len(offsets[direction])
+		
+		# Apply the filter once per distinct offset
+		if wire_filter is not None:
+			selected = dict( (p, wire_filter(unpack_offset(p, bound, num_fields)))
+			                 for p in set(packed)
+			               )
+		else:
+			selected = defaultdict(lambda: True)
+		
+		if mirror_field is not None:
+			mirror = mirror_offsets(packed, bound, num_fields, mirror_field)
+		else:
+			mirror = None
+		
+		# Collect the wires of each group
+		group_wires = defaultdict(set)
+		for group, elem, p in zip(groups, elems, packed):
+			if selected[p]:
+				group_wires[group].add((elem, p))
+		
+		# Assign ids to each distinct pattern
+		pattern_ids = {}
+		pattern_counts = []
+		group_patterns = {}
+		for group, wires in group_wires.iteritems():
+			if translate or mirror is not None:
+				pattern = canonical_pattern(wires, translate, mirror)
+			else:
+				pattern = frozenset(wires)
+			if pattern not in pattern_ids:
+				pattern_ids[pattern] = len(pattern_counts)
+				pattern_counts.append(0)
+			pattern_counts[pattern_ids[pattern]] += 1
+			group_patterns[group] = pattern_ids[pattern]
+		
+		out[direction] = (group_patterns, pattern_counts)
+	
+	return out
@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+
+"""
+A compact on-disk binary representation of a computed wiring plan which can be
+memory-mapped and queried directly, without loading the model or recomputing
+the torus. Usage::
+
+	python plan.py wiring.plan cabinet rack slot socket
+
+The file consists of a fixed-size header followed by a table of fixed-width
+records, one per socket, sorted by (cabinet, rack, slot, direction)::
+
+	+--------+---------+----------+-------+-------+---------+--------------+
+	| magic  | version | cabinets | racks | slots | records | socket names |
+	+--------+---------+----------+-------+-------+---------+--------------+
+	| source (cabinet, rack, slot, direction) | target (...) |  x records
+	+-----------------------------------------+--------------+
+
+If every slot of every rack is occupied the record for a socket lies at a
+directly computable offset, otherwise it is found by binary search.
+"""
+
+import mmap
+import struct
+
+import topology
+import coordinates
+
+
+# Identifies a wiring plan file
+MAGIC = "SPNRPLAN"
+VERSION = 1
+
+# magic, version, num_cabinets, num_racks, num_slots, num_records
+HEADER = struct.Struct("<8sHHHHI")
+
+# One (fixed-width) human readable name per direction, e.g. "J5 (N)".
+SOCKET_NAME = struct.Struct("<16s")
+
+# (cabinet, rack, slot, direction) -> (cabinet, rack, slot, direction)
+RECORD = struct.Struct("<HHHBHHHB")
+
+# All wire directions in the order records are stored
+DIRECTIONS = range(6)
+
+# Offset of the first record in the file
+RECORDS_OFFSET = HEADER.size + (SOCKET_NAME.size * len(DIRECTIONS))
+
+
+def write_plan(boards, filename, socket_names = None):
+	"""
+	Write a wiring plan to the named file.
+	
+	boards is a list [(board, coord),...] where coords are Cabinet coordinates
+	(e.g. from transforms.cabinetise()).
+	
+	socket_names is an optional dict {direction: name,...} giving the
+	human-readable names of each socket which are stored alongside the plan.
+	"""
+	assert(len(boards) == 0 or isinstance(boards[0][1], coordinates.Cabinet))
+	
+	socket_names = socket_names or {}
+	
+	b2c = dict(boards)
+	
+	records = []
+	for board, coord in boards:
+		for direction in DIRECTIONS:
+			target = board.follow_wire(direction)
+			if target is None:
+				continue
+			records.append( tuple(coord) + (direction,)
+			              + tuple(b2c[target]) + (topology.opposite(direction),)
+			              )
+	records.sort()
+	
+	# Dimensions of the system the plan covers
+	if boards:
+		num_cabinets, num_racks, num_slots = [max(column)+1 for column in
+		                                      zip(*(c for (b,c) in boards))]
+	else:
+		num_cabinets, num_racks, num_slots = 0, 0, 0
+	
+	f = open(filename, "wb")
+	try:
+		f.write(HEADER.pack( MAGIC, VERSION
+		                   , num_cabinets, num_racks, num_slots
+		                   , len(records)
+		                   ))
+		for direction in DIRECTIONS:
+			f.write(SOCKET_NAME.pack(socket_names.get(direction, "")))
+		for record in records:
+			f.write(RECORD.pack(*record))
+	finally:
+		f.close()
+
+
+class WiringPlan(object):
+	"""
+	A read-only, memory-mapped wiring plan written by write_plan().
+	"""
+	
+	def __init__(self, filename):
+		f = open(filename, "rb")
+		try:
+			self.data = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+		finally:
+			f.close()
+		
+		( magic, version
+		, self.num_cabinets, self.num_racks, self.num_slots
+		, self.num_records
+		) = HEADER.unpack_from(self.data, 0)
+		
+		assert(magic == MAGIC)
+		assert(version == VERSION)
+		assert(len(self.data) == RECORDS_OFFSET + (RECORD.size * self.num_records))
+		
+		# Mapping {name: direction,...} of the socket names stored in the plan
+		self.socket_names = {}
+		for direction in DIRECTIONS:
+			name = SOCKET_NAME.unpack_from(
+				self.data, HEADER.size + (SOCKET_NAME.size * direction))[0]
+			name = name.rstrip("\0")
+			if name:
+				self.socket_names[direction] = name
+		
+		# Is every socket in the system present (i.e. can records be found by
+		# offset alone)?
+		self.dense = self.num_records == ( self.num_cabinets
+		                                 * self.num_racks
+		                                 * self.num_slots
+		                                 * len(DIRECTIONS)
+		                                 )
+	
+	
+	def close(self):
+		self.data.close()
+	
+	
+	def __len__(self):
+		return self.num_records
+	
+	
+	def _record(self, index):
+		"""
+		Used internally. Unpack the record with the given index.
+		"""
+		return RECORD.unpack_from(self.data, RECORDS_OFFSET + (RECORD.size * index))
+	
+	
+	def __iter__(self):
+		"""
+		Iterate over all wires in the plan as tuples (source, source_direction,
+		target, target_direction) where source and target are Cabinet
+		coordinates.
+		"""
+		for index in xrange(self.num_records):
+			record = self._record(index)
+			yield ( coordinates.Cabinet(*record[0:3]), record[3]
+			      , coordinates.Cabinet(*record[4:7]), record[7]
+			      )
+	
+	
+	def get_direction(self, socket):
+		"""
+		Get the direction of the socket given either as a direction or by (a
+		prefix of) the name it was given in the plan, e.g. "J5".
+		"""
+		if socket in DIRECTIONS:
+			return socket
+		
+		for direction, name in self.socket_names.iteritems():
+			if name == socket or name.split(" ")[0] == socket:
+				return direction
+		
+		raise KeyError(socket)
+	
+	
+	def _find(self, key):
+		"""
+		Used internally. Returns the index of the record with the given source key
+		or None if not present.
+		"""
+		cabinet, rack, slot, direction = key
+		
+		if self.dense:
+			if not ( 0 <= cabinet < self.num_cabinets
+			         and 0 <= rack < self.num_racks
+			         and 0 <= slot < self.num_slots
+			       ):
+				return None
+			return (((((cabinet * self.num_racks) + rack) * self.num_slots) + slot)
+			        * len(DIRECTIONS)) + direction
+		
+		# Binary search the sorted records
+		low, high = 0, self.num_records
+		while low < high:
+			mid = (low + high) / 2
+			if self._record(mid)[0:4] < key:
+				low = mid + 1
+			else:
+				high = mid
+		
+		if low < self.num_records and self._record(low)[0:4] == key:
+			return low
+		else:
+			return None
+	
+	
+	def lookup(self, cabinet, rack, slot, socket):
+		"""
+		Find what the given socket is connected to. The socket may be given as a
+		direction or as a socket name (see get_direction).
+		
+		Returns a tuple (Cabinet(cabinet, rack, slot), direction) or None if the
+		socket is not connected.
+		"""
+		key = (cabinet, rack, slot, self.get_direction(socket))
+		
+		index = self._find(key)
+		if index is None:
+			return None
+		
+		record = self._record(index)
+		return (coordinates.Cabinet(*record[4:7]), record[7])
+
+
+
+if __name__=="__main__":
+	import sys
+	
+	if len(sys.argv) != 6:
+		sys.stderr.write("Usage: %s plan_file cabinet rack slot socket\n"%sys.argv[0])
+		sys.exit(1)
+	
+	plan = WiringPlan(sys.argv[1])
+	
+	cabinet, rack, slot = map(int, sys.argv[2:5])
+	socket = sys.argv[5]
+	if socket.isdigit():
+		socket = int(socket)
+	
+	target = plan.lookup(cabinet, rack, slot, socket)
+	
+	if target is None:
+		print "Not connected."
+	else:
+		(cabinet, rack, slot), direction = target
+		print "Cabinet %d, Rack %d, Slot %d, Socket %s"%(
+			cabinet, rack, slot,
+			plan.socket_names.get(direction, direction),
+		)
@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+
+"""
+Lengths of cables routed as they would be in a real machine rather than
+stretched in a straight line between their sockets (see metrics.wire_length).
+
+Each cable leaves its socket and runs horizontally across the front of its
+rack to the cabinet's vertical cable riser. Cables between racks of the same
+cabinet run along the riser directly; all others climb the riser to the cable
+trays above the cabinets, follow the trays to the target cabinet and come back
+down its riser. Trays run along each row of cabinets and cross the aisles
+between rows at given columns. Cables between slots of the same rack run
+directly across the front of the rack. A bend allowance is added for every
+turn a cable makes.
+
+A cable's length is thus the length of a path between its source and target
+(cabinet, rack) plus the runs between each socket and the riser. The former
+are computed once per pair of racks and cached and the latter once per socket
+so measuring every wire remains a table lookup per wire.
+
+The number of cables along each tray segment is found from the number of
+cables between each pair of cabinets (see tray_congestion).
+"""
+
+
+class TrayRouting(object):
+	"""
+	The routes taken by cables in a cabinet.System.
+	"""
+	
+	def __init__( self
+	            , system
+	            , tray_height = None
+	            , riser_offset = 0.0
+	            , bend_allowance = 0.0
+	            , aisle_crossings = None
+	            ):
+		"""
+		system is the cabinet.System whose cables are routed.
+		
+		tray_height is the height of the cable trays above the floor. Defaults to
+		the top of the cabinets.
+		
+		riser_offset is the horizontal position of the cable riser relative to the
+		left-hand side of each cabinet.
+		
+		bend_allowance is the additional length of cable required for each bend.
+		
+		aisle_crossings is a list of the columns at which trays cross the aisle
+		between each pair of rows. Defaults to both ends of the rows.
+		"""
+		self.system          = system
+		self.tray_height     = tray_height if tray_height is not None \
+		                       else system.cabinet.height
+		self.riser_offset    = riser_offset
+		self.bend_allowance  = bend_allowance
+		self.aisle_crossings = aisle_crossings if aisle_crossings is not None \
+		                       else sorted(set([0, system.cabinets_per_row - 1]))
+		
+		cab  = system.cabinet
+		rack = cab.rack
+		
+		# Sockets must be below the trays
+		assert(self.tray_height >= cab.get_volume_position((0, cab.num_racks - 1)).y
+		                           + rack.height)
+		
+		# The height of the bottom of each rack within its cabinet
+		self.rack_heights = [cab.get_volume_position((0, r)).y
+		                     for r in range(cab.num_racks)]
+		
+		# The horizontal position of the racks within their cabinet (racks are
+		# stacked vertically so this is the same for all racks)
+		self._rack_x = cab.get_volume_position((0, 0)).x
+		
+		# The (x, y) position of every socket within its rack and the length of its
+		# run to the riser, by (slot, direction), filled in as sockets are
+		# encountered.
+		self._sockets = {}
+		
+		# The tray segments joining cabinets and the shortest paths along them
+		self._route_trays()
+		
+		# Cache of path lengths between racks (see rack_path)
+		self._rack_paths = {}
+	
+	
+	def _route_trays(self):
+		"""
+		Used internally. Find the shortest paths along the trays between every pair
+		of cabinets. Sets:
+		
+		* tray_segments: a list [(a, b),...] of the pairs of cabinets (a < b) joined
+		  directly by a tray segment, either along a row or across an aisle.
+		* tray_lengths: a matrix of the lengths of the shortest paths.
+		* _tray_next: a matrix giving the cabinet after a on the path from a to b.
+		"""
+		system = self.system
+		n = system.num_cabinets
+		inf = float("inf")
+		
+		grid = dict((position, cabinet_num)
+		            for (cabinet_num, position)
+		            in enumerate(system.cabinet_grid_positions))
+		
+		lengths = [[inf] * n for _ in range(n)]
+		next_hop = [[None] * n for _ in range(n)]
+		for cabinet_num in range(n):
+			lengths[cabinet_num][cabinet_num] = 0.0
+			next_hop[cabinet_num][cabinet_num] = cabinet_num
+		
+		segments = []
+		def connect(a, b, length):
+			segments.append((min(a, b), max(a, b)))
+			lengths[a][b] = lengths[b][a] = length
+			next_hop[a][b] = b
+			next_hop[b][a] = a
+		
+		for (col, row), cabinet_num in grid.iteritems():
+			position = system.cabinet_positions[cabinet_num]
+			
+			# Along the row
+			if (col + 1, row) in grid:
+				neighbour = grid[(col + 1, row)]
+				connect(cabinet_num, neighbour,
+				        system.cabinet_positions[neighbour].x - position.x)
+			
+			# Across the aisle (turning into and out of the crossing)
+			if col in self.aisle_crossings and (col, row + 1) in grid:
+				neighbour = grid[(col, row + 1)]
+				connect(cabinet_num, neighbour,
+				        system.cabinet_positions[neighbour].z - position.z
+				        + (2 * self.bend_allowance))
+		
+		# Floyd-Warshall: there are few cabinets
+		for k in range(n):
+			lengths_k = lengths[k]
+			for i in range(n):
+				lengths_i = lengths[i]
+				length_ik = lengths_i[k]
+				if length_ik == inf:
+					continue
+				for j in range(n):
+					if length_ik + lengths_k[j] < lengths_i[j]:
+						lengths_i[j] = length_ik + lengths_k[j]
+						next_hop[i][j] = next_hop[i][k]
+		
+		# Every cabinet must be reachable
+		assert(all(inf not in row for row in lengths))
+		
+		self.tray_segments = sorted(segments)
+		self.tray_lengths  = lengths
+		self._tray_next    = next_hop
+	
+	
+	def tray_route(self, source, target):
+		"""
+		Get the list of cabinets passed by the trays on the shortest path between
+		the given cabinets (inclusive).
+		"""
+		route = [source]
+		while route[-1] != target:
+			route.append(self._tray_next[route[-1]][target])
+		return route
+	
+	
+	def _socket(self, slot, direction):
+		"""
+		Used internally. Get a tuple (x, y, offset) for a socket (see
+		socket_position and socket_offset).
+		"""
+		key = (slot, direction)
+		if key not in self._sockets:
+			position = self.system.cabinet.rack.get_position(slot, direction)
+			self._sockets[key] = ( position.x, position.y
+			                     , abs(self._rack_x + position.x - self.riser_offset)
+			                     )
+		return self._sockets[key]
+	
+	
+	def socket_position(self, slot, direction):
+		"""
+		Get the (x, y) position of a socket relative to the bottom-left corner of
+		its rack.
+		"""
+		return self._socket(slot, direction)[:2]
+	
+	
+	def socket_offset(self, slot, direction):
+		"""
+		Get the length of the horizontal run from a socket to the cable riser.
+		"""
+		return self._socket(slot, direction)[2]
+	
+	
+	def rack_path(self, source, target):
+		"""
+		Get the length of the path between the risers of a pair of (cabinet, rack)s
+		as a tuple (length, source_sign, target_sign). The length of a cable
+		between sockets at heights source_y and target_y above the bottom of their
+		racks is length + (source_sign * source_y) + (target_sign * target_y) plus
+		the runs between each socket and the riser (see socket_offset).
+		
+		Not defined for cables within a single rack (see wire_length).
+		"""
+		key = (source, target)
+		if key not in self._rack_paths:
+			(source_cabinet, source_rack), (target_cabinet, target_rack) = source, target
+			source_height = self.rack_heights[source_rack]
+			target_height = self.rack_heights[target_rack]
+			
+			if source_cabinet == target_cabinet:
+				# Directly along the riser, turning into and out of it
+				if source_height < target_height:
+					length, source_sign, target_sign = target_height - source_height, -1, 1
+				else:
+					length, source_sign, target_sign = source_height - target_height, 1, -1
+				path = (length + (2 * self.bend_allowance), source_sign, target_sign)
+			else:
+				# Up to the trays, along them and back down, turning into and out of
+				# each riser and each end of the trays
+				path = ( (self.tray_height - source_height)
+				         + self.tray_lengths[source_cabinet][target_cabinet]
+				         + (self.tray_height - target_height)
+				         + (4 * self.bend_allowance)
+				       , -1, -1
+				       )
+			
+			self._rack_paths[key] = path
+		
+		return self._rack_paths[key]
+	
+	
+	def wire_length(self, source, source_direction, target, target_direction):
+		"""
+		Get the routed length of a cable between the sockets for the given
+		directions of the slots at the given coordinates.Cabinet coordinates.
+		"""
+		source_x, source_y, source_offset = self._socket(source.slot, source_direction)
+		target_x, target_y, target_offset = self._socket(target.slot, target_direction)
+		
+		if source.cabinet == target.cabinet and source.rack == target.rack:
+			# Directly across the front of the rack
+			return ( abs(source_x - target_x) + abs(source_y - target_y)
+			       + self.bend_allowance
+			       )
+		
+		length, source_sign, target_sign = self.rack_path( (source.cabinet, source.rack)
+		                                                 , (target.cabinet, target.rack)
+		                                                 )
+		
+		return ( length
+		       + (source_sign * source_y) + (target_sign * target_y)
+		       + source_offset + target_offset
+		       )
+
+
+def tray_congestion(routing, cabinet_matrix):
+	"""
+	Count the cables passing along each tray segment and through the cut-out in
+	the top of each cabinet through which cables leave its riser for the trays.
+	
+	routing is a TrayRouting.
+	
+	cabinet_matrix[a][b] is the number of cables from cabinet a to cabinet b (as
+	given by metrics.wire_count_matrices, summed over each direction).
+	
+	Rather than following every cable, the cables between each pair of cabinets
+	are added to difference arrays at the ends of each straight run of their
+	route (along a row or across aisles) which are then summed along each row
+	and column of cabinets.
+	
+	Returns a tuple (segments, cutouts) where segments is a dict {(a, b): cables,
+	...} for each of routing.tray_segments and cutouts is a list giving the
+	number of cables through each cabinet's cut-out.
+	"""
+	system = routing.system
+	n = system.num_cabinets
+	grid = system.cabinet_grid_positions
+	
+	# Differences in the number of cables between consecutive columns of each row
+	# and consecutive rows of each column
+	row_deltas    = [[0] * (system.cabinets_per_row + 1) for _ in range(system.num_rows)]
+	column_deltas = [[0] * (system.num_rows + 1) for _ in range(system.cabinets_per_row)]
+	
+	cutouts = [0] * n
+	
+	for a in range(n):
+		for b in range(n):
+			cables = cabinet_matrix[a][b]
+			if a == b or cables == 0:
+				continue
+			
+			cutouts[a] += cables
+			cutouts[b] += cables
+			
+			for (start_col, start_row), (end_col, end_row) in _straight_runs(
+			    [grid[c] for c in routing.tray_route(a, b)]):
+				if start_row == end_row:
+					deltas, lo, hi = row_deltas[start_row], start_col, end_col
+				else:
+					deltas, lo, hi = column_deltas[start_col], start_row, end_row
+				deltas[min(lo, hi)] += cables
+				deltas[max(lo, hi)] -= cables
+	
+	# Accumulate the differences to get the cables between each consecutive pair
+	# of positions along each row and column
+	def accumulate(deltas):
+		totals = []
+		for delta in deltas:
+			totals.append((totals[-1] if totals else 0) + delta)
+		return totals
+	row_totals    = map(accumulate, row_deltas)
+	column_totals = map(accumulate, column_deltas)
+	
+	segments = {}
+	for a, b in routing.tray_segments:
+		(col, row), (b_col, b_row) = grid[a], grid[b]
+		if row == b_row:
+			segments[(a, b)] = row_totals[row][min(col, b_col)]
+		else:
+			segments[(a, b)] = column_totals[col][min(row, b_row)]
+	
+	return segments, cutouts
+
+
+def _straight_runs(route):
+	"""
+	Used internally. Split a route, a list of (col, row) positions, into a list
+	of straight runs [(start, end),...] along a row or column.
+	"""
+	runs = []
+	start = route[0]
+	for i in range(1, len(route)):
+		end = route[i]
+		if i + 1 == len(route) or (route[i + 1][1] == end[1]) != (end[1] == start[1]):
+			runs.append((start, end))
+			start = end
+	return runs
@@ -0,0 +1,557 @@
+#!/usr/bin/env python
+
+"""
+Wire statistics for folded, cabinetised tori computed from the symmetry of the
+layout rather than by visiting every wire.
+
+The boards of a torus are laid out (see wiring_guide.py) by converting their
+hexagonal coordinates into Cartesian coordinates, wrapping the result into a
+rectangle and compressing it into a regular grid. Folding and cabinetising
+this grid then treat the x and y axes independently: the cabinet a board is
+placed in depends only on its x coordinate, its rack only on its y coordinate
+and its slot on a pair of values, one from each.
+
+Wires within the grid are translations: a wire leaving (x, y) arrives at ((x +
+dx) mod w, (y + dy) mod h) where the offset (dx, dy) repeats with a small
+period in each axis, except for a band of boards along each edge where the
+torus wraps around. The grid is therefore split into classes of boards with
+identical offsets for each wire direction: one class per combination of
+position within the repeating pattern (plus each boundary position) on each
+axis. A class is described by the list of x coordinates and the list of y
+coordinates of its boards and the wires leaving it are every combination of one
+of each.
+
+Statistics which depend only on the x or only on the y coordinates of the ends
+of a wire (such as the cabinets or racks it connects) are counted once per
+distinct value on each axis and the counts multiplied up. Wire lengths, which
+depend on both, are evaluated once per distinct combination of the relative
+position of the cabinets, racks and slots involved. The results are exact and
+are produced without creating any boards, in time proportional to the number of
+classes times the width plus height of the grid rather than their product.
+
+Boards allocated to slots along a space-filling curve (see
+topology.ALLOCATIONS) are not placed independently in each axis so every wire
+is visited, though still without creating any boards and measuring only one
+wire per distinct relative position.
+
+For quickly screening many layouts, the estimate_* functions model the grid as
+a plain torus, ignoring the wires which wrap around differently. They come with
+an exact bound on the number of wires which may be misplaced.
+"""
+
+from collections import defaultdict
+
+import topology
+import coordinates
+
+
+# The period (in each axis) with which the wire offsets in the grid repeat away
+# from the edges of the grid.
+PERIOD = 2
+
+# The number of positions at each edge of the grid (in each axis) whose wires
+# may wrap around the torus.
+BOUNDARY = 2
+
+# The directions in which wires are counted by default: every wire in a fully
+# connected system is counted exactly once.
+DIRECTIONS = [topology.NORTH, topology.EAST, topology.SOUTH_WEST]
+
+
+def grid_size(width, height, compress_rows = True):
+	"""
+	Get the (width, height) of the grid a torus of width x height threeboards is
+	laid out on.
+	"""
+	if compress_rows:
+		return (width * 2, ((height * 3) + 1) / 2)
+	else:
+		return (width, height * 3)
+
+
+def hex_to_grid(coord, width, height, compress_rows = True):
+	"""
+	Get the grid coordinate of the board at the given hexagonal coordinate in a
+	torus of width x height threeboards. Equivalent to the transforms
+	hex_to_cartesian, rhombus_to_rect and compress (dividing rows if
+	compress_rows and columns otherwise) applied to a whole torus.
+	"""
+	x, y = topology.hex_to_cartesian(coord)
+	x %= width * 2
+	y %= height * 3
+	
+	if compress_rows:
+		return coordinates.Cartesian2D(x, y / 2)
+	else:
+		return coordinates.Cartesian2D(x / 2, y)
+
+
+def grid_to_hex(coord, width, height, compress_rows = True):
+	"""
+	Get the hexagonal coordinate of the board at the given grid coordinate (the
+	inverse of hex_to_grid) or None if no board is there.
+	"""
+	x, y = coord
+	
+	# The Cartesian coordinates compressed into this grid position
+	if compress_rows:
+		candidates = [(x, y*2), (x, (y*2) + 1)]
+	else:
+		candidates = [(x*2, y), ((x*2) + 1, y)]
+	
+	for cart_x, cart_y in candidates:
+		# The threeboard row and the board within it (see topology.threeboards)
+		# are given by the y coordinate alone.
+		tb_y = cart_y / 3
+		z    = {0:0, 2:1, 1:2}[cart_y % 3]
+		
+		# Only every other column (after wrapping) contains boards of each type
+		tb_x2 = (cart_x + tb_y - (z >= 2)) % (width * 2)
+		if tb_y >= height or tb_x2 % 2:
+			continue
+		tb_x = tb_x2 / 2
+		
+		return coordinates.Hexagonal( (tb_x*2) - tb_y + (z >= 2)
+		                            , tb_x + tb_y + (z >= 1)
+		                            , 0
+		                            )
+	
+	return None
+
+
+def grid_neighbour(coord, direction, width, height, compress_rows = True):
+	"""
+	Get the grid coordinate of the board connected to the board at the given grid
+	coordinate by the wire in the given direction (or None if there is no board
+	at the given coordinate).
+	"""
+	hex_coord = grid_to_hex(coord, width, height, compress_rows)
+	if hex_coord is None:
+		return None
+	
+	return hex_to_grid( topology.wrap_around( topology.add_direction(hex_coord, direction)
+	                                        , (width, height)
+	                                        )
+	                  , width, height, compress_rows
+	                  )
+
+
+def _axis_classes(size):
+	"""
+	Used internally. Split the positions along an axis of the given size into
+	classes whose wires have the same offset. Returns a list of lists of
+	positions.
+	"""
+	classes = defaultdict(list)
+	for v in range(size):
+		if v < BOUNDARY:
+			classes[("low", v)].append(v)
+		elif v >= size - BOUNDARY:
+			classes[("high", size - v)].append(v)
+		else:
+			classes[("period", v % PERIOD)].append(v)
+	
+	return [classes[c] for c in sorted(classes)]
+
+
+def _class_offset(xs, ys, direction, width, height, compress_rows):
+	"""
+	Used internally. Get the offset (dx, dy) within the grid of the wire in the
+	given direction leaving the first board of a class of boards with positions
+	xs and ys or None if there is no board there.
+	"""
+	w, h = grid_size(width, height, compress_rows)
+	
+	target = grid_neighbour((xs[0], ys[0]), direction, width, height, compress_rows)
+	if target is None:
+		return None
+	
+	return ((target[0] - xs[0]) % w, (target[1] - ys[0]) % h)
+
+
+def wire_classes(width, height, compress_rows = True, directions = DIRECTIONS):
+	"""
+	Split the wires of a torus of width x height threeboards into classes of
+	wires with the same offset within the grid (see grid_size).
+	
+	Returns a list [(direction, x_pairs, y_pairs),...] where x_pairs is a list
+	[(x, target_x),...] and y_pairs is a list [(y, target_y),...]. The wires in
+	the given direction leave the grid positions (x, y) and arrive at (target_x,
+	target_y) for every combination of one pair from each list.
+	"""
+	w, h = grid_size(width, height, compress_rows)
+	
+	out = []
+	for direction in directions:
+		for xs in _axis_classes(w):
+			for ys in _axis_classes(h):
+				# Every wire in the class has the same offset as the first
+				offset = _class_offset(xs, ys, direction, width, height, compress_rows)
+				if offset is None:
+					continue
+				dx, dy = offset
+				
+				out.append(( direction
+				           , [(x, (x + dx) % w) for x in xs]
+				           , [(y, (y + dy) % h) for y in ys]
+				           ))
+	
+	return out
+
+
+def _count(pairs, key):
+	"""
+	Used internally. Count the pairs of positions by the given key function of
+	the pair. Returns a dict {key: (count, pair),...} where pair is the first
+	pair with that key.
+	"""
+	counts = {}
+	for pair in pairs:
+		k = key(*pair)
+		count, first = counts.get(k, (0, pair))
+		counts[k] = (count + 1, first)
+	return counts
+
+
+def _folded_size(grid, folds):
+	"""
+	Used internally. Get the (width, height) of the space a grid of size grid =
+	(w, h) occupies once folded. Folds which do not evenly divide the grid leave
+	gaps so this may be larger than the grid (as in transforms.cabinetise, which
+	takes its bounds from the folded coordinates).
+	"""
+	return tuple(max(topology.fold_map(size, f)[2]) + 1
+	             for (size, f) in zip(grid, folds))
+
+
+def _slot_positions(grid, folds, num_cabinets, racks_per_cabinet, allocation):
+	"""
+	Used internally. Get a list giving the (cabinet, rack, slot) allocated to the
+	board at every position, (x*h) + y, of a grid of size grid = (w, h) once the
+	grid is folded (see topology.allocation_map).
+	"""
+	w, h = grid
+	fw, fh = folded = _folded_size(grid, folds)
+	
+	encoder = topology.allocation_map(folded, num_cabinets, racks_per_cabinet, allocation)[0]
+	slots_per_rack = (fw * fh) / num_cabinets / racks_per_cabinet
+	
+	positions = []
+	for x in topology.fold_map(w, folds[0])[2]:
+		for y in topology.fold_map(h, folds[1])[2]:
+			cabinet, index = divmod(encoder[(x * fh) + y], slots_per_rack * racks_per_cabinet)
+			positions.append((cabinet,) + divmod(index, slots_per_rack))
+	
+	return positions
+
+
+def wire_count_matrices( width, height, folds, num_cabinets, racks_per_cabinet
+                       , compress_rows = True
+                       , directions = DIRECTIONS
+                       , allocation = "interleave"
+                       ):
+	"""
+	As metrics.wire_count_matrices for the cabinetised torus of width x height
+	threeboards folded into folds = (x_folds, y_folds) pieces and split into
+	num_cabinets cabinets of racks_per_cabinet racks each (see transforms.fold
+	and transforms.cabinetise, including its allocation).
+	"""
+	w, h = grid_size(width, height, compress_rows)
+	
+	out = {}
+	for direction in directions:
+		cabinet_matrix = [[0] * num_cabinets for _ in range(num_cabinets)]
+		rack_matrix    = [[0] * (num_cabinets * racks_per_cabinet)
+		                  for _ in range(num_cabinets * racks_per_cabinet)]
+		out[direction] = (cabinet_matrix, rack_matrix)
+	
+	if allocation == "interleave":
+		fw, fh = _folded_size((w, h), folds)
+		cols_per_cabinet = fw / num_cabinets
+		rows_per_rack    = fh / racks_per_cabinet
+		
+		# The cabinet and rack of each grid position
+		cabinets = [x / cols_per_cabinet for x in topology.fold_map(w, folds[0])[2]]
+		racks    = [y / rows_per_rack    for y in topology.fold_map(h, folds[1])[2]]
+		
+		for direction, x_pairs, y_pairs in wire_classes(width, height, compress_rows, directions):
+			cabinet_matrix, rack_matrix = out[direction]
+			
+			cabinet_counts = _count(x_pairs, (lambda x, tx: (cabinets[x], cabinets[tx])))
+			rack_counts    = _count(y_pairs, (lambda y, ty: (racks[y], racks[ty])))
+			
+			for (source_cabinet, target_cabinet), (x_count, _) in cabinet_counts.iteritems():
+				cabinet_matrix[source_cabinet][target_cabinet] += x_count * len(y_pairs)
+				
+				for (source_rack, target_rack), (y_count, _) in rack_counts.iteritems():
+					rack_matrix[(source_cabinet * racks_per_cabinet) + source_rack] \
+					           [(target_cabinet * racks_per_cabinet) + target_rack] \
+					           += x_count * y_count
+	else:
+		# Every wire must be visited (see above)
+		positions = _slot_positions((w, h), folds, num_cabinets, racks_per_cabinet, allocation)
+		
+		for direction, x_pairs, y_pairs in wire_classes(width, height, compress_rows, directions):
+			cabinet_matrix, rack_matrix = out[direction]
+			
+			for x, tx in x_pairs:
+				for y, ty in y_pairs:
+					source_cabinet, source_rack, _ = positions[(x * h) + y]
+					target_cabinet, target_rack, _ = positions[(tx * h) + ty]
+					
+					cabinet_matrix[source_cabinet][target_cabinet] += 1
+					rack_matrix[(source_cabinet * racks_per_cabinet) + source_rack] \
+					           [(target_cabinet * racks_per_cabinet) + target_rack] += 1
+	
+	for direction in directions:
+		cabinet_matrix, rack_matrix = out[direction]
+		
+		# Differences in the number of wires crossing consecutive boundaries (as in
+		# metrics.wire_count_matrices)
+		crossing_deltas = [0] * num_cabinets
+		for a in range(num_cabinets):
+			for b in range(num_cabinets):
+				crossing_deltas[min(a, b)] += cabinet_matrix[a][b]
+				crossing_deltas[max(a, b)] -= cabinet_matrix[a][b]
+		
+		crossings = []
+		for delta in crossing_deltas[:-1]:
+			crossings.append((crossings[-1] if crossings else 0) + delta)
+		
+		out[direction] = (cabinet_matrix, rack_matrix, crossings)
+	
+	return out
+
+
+def wire_length_histogram( width, height, folds, system, wire_offsets = {}
+                         , compress_rows = True
+                         , directions = DIRECTIONS
+                         , allocation = "interleave"
+                         ):
+	"""
+	Get the distribution of wire lengths in the cabinetised torus of width x
+	height threeboards folded into folds = (x_folds, y_folds) pieces and placed in
+	the given cabinet.System (see transforms.cabinet_to_physical).
+	
+	wire_offsets is as for metrics.wire_length.
+	
+	allocation is as for transforms.cabinetise.
+	
+	Returns a dict {direction: {length: count,...},...}. As cabinets and racks are
+	regularly spaced, wires between pairs of slots with the same relative
+	position have the same length which is computed just once.
+	"""
+	return _wire_length_histogram( wire_classes(width, height, compress_rows, directions)
+	                             , grid_size(width, height, compress_rows)
+	                             , folds, system, wire_offsets, directions
+	                             , allocation
+	                             )
+
+
+def _cabinet_key(system, cabinet, target_cabinet):
+	"""
+	Used internally. Get a key which is the same for pairs of cabinets with the
+	same relative position in the given cabinet.System.
+	"""
+	col, row = system.cabinet_grid_positions[cabinet]
+	target_col, target_row = system.cabinet_grid_positions[target_cabinet]
+	return (target_col - col, row, target_row)
+
+
+def _measure(system, source, target, direction, wire_offsets):
+	"""
+	Used internally. Get the length of the wire in the given direction between
+	the slots at the given (cabinet, rack, slot) positions.
+	"""
+	source = system.get_position(coordinates.Cabinet(*source))
+	target = system.get_position(coordinates.Cabinet(*target))
+	
+	if direction in wire_offsets:
+		source += wire_offsets[direction]
+	if topology.opposite(direction) in wire_offsets:
+		target += wire_offsets[topology.opposite(direction)]
+	
+	return (source - target).magnitude()
+
+
+def _wire_length_histogram( classes, grid, folds, system, wire_offsets, directions
+                          , allocation = "interleave"
+                          ):
+	"""
+	Used internally. Get the distribution of the lengths of the wires in the
+	given list of classes (see wire_classes) in a grid of size grid = (w, h). The
+	remaining arguments are as for wire_length_histogram.
+	"""
+	w, h = grid
+	
+	num_cabinets      = system.num_cabinets
+	racks_per_cabinet = system.cabinet.num_racks
+	
+	histograms = dict((direction, defaultdict(int)) for direction in directions)
+	lengths = {}
+	
+	if allocation != "interleave":
+		# Every wire must be visited (see above)
+		positions = _slot_positions(grid, folds, num_cabinets, racks_per_cabinet, allocation)
+		
+		for direction, x_pairs, y_pairs in classes:
+			histogram = histograms[direction]
+			
+			for x, tx in x_pairs:
+				for y, ty in y_pairs:
+					source = positions[(x * h) + y]
+					target = positions[(tx * h) + ty]
+					
+					key = ( direction, _cabinet_key(system, source[0], target[0])
+					      , target[1] - source[1], source[2], target[2])
+					if key not in lengths:
+						lengths[key] = _measure(system, source, target, direction, wire_offsets)
+					
+					histogram[lengths[key]] += 1
+		
+		return dict((direction, dict(histogram))
+		            for (direction, histogram) in histograms.iteritems())
+	
+	fw, fh = _folded_size(grid, folds)
+	cols_per_cabinet = fw / num_cabinets
+	rows_per_rack    = fh / racks_per_cabinet
+	
+	# The cabinet/rack and the column/row within it of each grid position
+	x_positions = [divmod(x, cols_per_cabinet) for x in topology.fold_map(w, folds[0])[2]]
+	y_positions = [divmod(y, rows_per_rack)    for y in topology.fold_map(h, folds[1])[2]]
+	
+	def x_key(x, tx):
+		(cabinet, col), (target_cabinet, target_col) = x_positions[x], x_positions[tx]
+		return (_cabinet_key(system, cabinet, target_cabinet), col, target_col)
+	
+	def y_key(y, ty):
+		(rack, row), (target_rack, target_row) = y_positions[y], y_positions[ty]
+		return (target_rack - rack, row, target_row)
+	
+	for direction, x_pairs, y_pairs in classes:
+		histogram = histograms[direction]
+		
+		x_counts = _count(x_pairs, x_key)
+		y_counts = _count(y_pairs, y_key)
+		
+		for xk, (x_count, (x, tx)) in x_counts.iteritems():
+			for yk, (y_count, (y, ty)) in y_counts.iteritems():
+				key = (direction, xk, yk)
+				if key not in lengths:
+					# Measure one representative wire
+					(cabinet, col), (target_cabinet, target_col) = x_positions[x], x_positions[tx]
+					(rack, row), (target_rack, target_row) = y_positions[y], y_positions[ty]
+					
+					lengths[key] = _measure( system
+					                       , (cabinet, rack, row + (rows_per_rack * col))
+					                       , ( target_cabinet, target_rack
+					                         , target_row + (rows_per_rack * target_col))
+					                       , direction, wire_offsets
+					                       )
+				
+				histogram[lengths[key]] += x_count * y_count
+	
+	return dict((direction, dict(histogram))
+	            for (direction, histogram) in histograms.iteritems())
+
+
+################################################################################
+# Estimation
+################################################################################
+
+def _estimate_axis_classes(size):
+	"""
+	Used internally. Split the positions along an axis of the given size into
+	one class for each position within the repeating pattern, ignoring the
+	boundary. The first position of each class is clear of the boundary
+	(where possible).
+	"""
+	classes = []
+	for phase in range(min(PERIOD, size)):
+		positions = range(phase, size, PERIOD)
+		interior  = [v for v in positions if BOUNDARY <= v < size - BOUNDARY]
+		classes.append(interior[:1] + [v for v in positions if v not in interior[:1]])
+	return classes
+
+
+def estimate_wire_classes(width, height, compress_rows = True, directions = DIRECTIONS):
+	"""
+	As wire_classes but modelling the grid as a plain torus in which every wire
+	is a translation determined only by the position of its source within the
+	repeating pattern. That is, the different offsets of the wires which wrap
+	around the torus (and any empty grid positions) are ignored.
+	
+	Only (PERIOD * PERIOD) classes are produced per direction, rather than
+	(PERIOD + (2 * BOUNDARY))**2.
+	"""
+	w, h = grid_size(width, height, compress_rows)
+	
+	out = []
+	for direction in directions:
+		for xs in _estimate_axis_classes(w):
+			for ys in _estimate_axis_classes(h):
+				offset = _class_offset(xs, ys, direction, width, height, compress_rows)
+				if offset is None:
+					continue
+				dx, dy = offset
+				
+				out.append(( direction
+				           , [(x, (x + dx) % w) for x in xs]
+				           , [(y, (y + dy) % h) for y in ys]
+				           ))
+	
+	return out
+
+
+def estimate_wire_length_histogram( width, height, folds, system, wire_offsets = {}
+                                  , compress_rows = True
+                                  , directions = DIRECTIONS
+                                  ):
+	"""
+	Estimate the distribution of wire lengths given by wire_length_histogram
+	using the model of estimate_wire_classes. Suitable for quickly discarding
+	poor layouts before evaluating them exactly.
+	
+	Only the wires leaving boards whose wires are not modelled exactly may differ
+	from the exact distribution. For any length l, the number of wires no longer
+	than l differs from the exact number by at most the bound given by
+	estimate_error_bound(). The count of any range of lengths (e.g. a bin of a
+	histogram) thus differs by at most twice the bound.
+	"""
+	return _wire_length_histogram( estimate_wire_classes(width, height, compress_rows, directions)
+	                             , grid_size(width, height, compress_rows)
+	                             , folds, system, wire_offsets, directions
+	                             )
+
+
+def estimate_error_bound(width, height, compress_rows = True, directions = DIRECTIONS):
+	"""
+	Get the maximum number of wires in each direction which may be misplaced by
+	estimate_wire_length_histogram (see its documentation). Returns a dict
+	{direction: count,...}.
+	
+	The bound is the number of grid positions whose exact class (see
+	wire_classes) has a different offset to the class it is modelled by.
+	"""
+	w, h = grid_size(width, height, compress_rows)
+	
+	# The offset of each class in the model, by position within the pattern
+	x_classes = _estimate_axis_classes(w)
+	y_classes = _estimate_axis_classes(h)
+	
+	out = {}
+	for direction in directions:
+		offsets = dict( ((xs[0] % PERIOD, ys[0] % PERIOD),
+		                 _class_offset(xs, ys, direction, width, height, compress_rows))
+		                for xs in x_classes
+		                for ys in y_classes
+		              )
+		
+		out[direction] = sum( len(xs) * len(ys)
+		                      for xs in _axis_classes(w)
+		                      for ys in _axis_classes(h)
+		                      if _class_offset(xs, ys, direction, width, height, compress_rows)
+		                         != offsets[(xs[0] % PERIOD, ys[0] % PERIOD)]
+		                    )
+	
+	return out
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+
+"""
+Flat, integer-indexed tables describing [(board, coord),...] lists. These allow
+computations over a whole machine without repeatedly following references
+between Board objects or rebuilding board-to-coordinate dictionaries.
+
+Boards are identified by their index in the list of boards the table was built
+from.
+"""
+
+from array import array
+from itertools import imap, repeat
+from operator import add
+
+import topology
+import board
+
+
+# All wire directions
+DIRECTIONS = [ topology.EAST
+             , topology.NORTH_EAST
+             , topology.NORTH
+             , topology.WEST
+             , topology.SOUTH_WEST
+             , topology.SOUTH
+             ]
+
+
+def board_index(boards):
+	"""
+	Returns a dict {board: index,...} giving the index of each board in the
+	list.
+	"""
+	return dict((board, index) for (index, (board, coord)) in enumerate(boards))
+
+
+def neighbour_table(boards, directions = DIRECTIONS):
+	"""
+	Returns a dict {direction: array,...} where array[i] is the index of the
+	board at the other end of the wire leaving boards[i] in the given direction
+	or -1 if no wire is connected.
+	"""
+	b2i = board_index(boards)
+	b2i[None] = -1
+	
+	return dict( (direction, array("l", [ b2i[board.connection[direction]]
+	                                      for (board, coord) in boards
+	                                    ]))
+	             for direction in directions
+	           )
+
+
+def coordinate_columns(boards):
+	"""
+	Returns a list of arrays, one per coordinate field, such that
+	columns[field][i] is the given field of the coordinate of boards[i].
+	"""
+	if len(boards) == 0:
+		return []
+	
+	columns = []
+	for values in zip(*(coord for (board, coord) in boards)):
+		if all(isinstance(v, (int, long)) for v in values):
+			columns.append(array("l", values))
+		else:
+			columns.append(array("d", values))
+	
+	return columns
+
+
+def rings(successors):
+	"""
+	Decompose a permutation, given as an array where successors[i] follows i,
+	into its cycles. Returns a tuple (ring_ids, positions, lengths) as described
+	for wiring_rings.
+	"""
+	n = len(successors)
+	
+	# Also marks which elements have been visited (-1 until visited)
+	ring_ids  = array("l", [-1]) * n
+	positions = array("l", [0]) * n
+	lengths   = []
+	
+	for start in xrange(n):
+		if ring_ids[start] != -1:
+			continue
+		
+		ring = len(lengths)
+		i = start
+		position = 0
+		while ring_ids[i] == -1:
+			ring_ids[i]  = ring
+			positions[i] = position
+			position += 1
+			i = successors[i]
+		
+		# Every element has exactly one predecessor so the ring must close at its
+		# start.
+		assert(i == start)
+		lengths.append(position)
+	
+	return ring_ids, positions, lengths
+
+
+def wiring_rings(boards, directions = DIRECTIONS):
+	"""
+	Decompose the whole machine into the rings formed by following the wires in
+	each direction (see board.follow_wiring_loop), visiting each board once per
+	direction. Every wire must be connected.
+	
+	Returns a dict {direction: (ring_ids, positions, lengths),...} where
+	ring_ids[i] is the number of the ring which boards[i] is in and positions[i]
+	is its position in the ring: following the wire in the given direction from
+	position p leads to position p+1 (wrapping around to 0). lengths[r] is the
+	number of boards in ring r. Rings are numbered in order of their
+	lowest-indexed board which is at position 0.
+	"""
+	neighbours = neighbour_table(boards, directions)
+	
+	out = {}
+	for direction in directions:
+		assert(-1 not in neighbours[direction])
+		out[direction] = rings(neighbours[direction])
+	
+	return out
+
+
+def packet_rings(boards, directions = DIRECTIONS):
+	"""
+	Decompose the whole machine into the rings followed by packets travelling in
+	each direction (see board.follow_packet_loop). Every wire must be connected.
+	
+	A packet travelling in a given direction can enter a board on one of two
+	sides: the side opposite the direction or the side counter-clockwise from
+	that. Packets are identified by the index (2*i) + side where i is the index
+	of the board in the list and side is 0 or 1 respectively.
+	
+	Returns a dict {direction: (ring_ids, positions, lengths),...} as for
+	wiring_rings but indexed by packet rather than board. Lengths are given in
+	boards.
+	"""
+	neighbours = neighbour_table(boards)
+	
+	return dict( (direction, rings(packet_successors(neighbours, direction)))
+	             for direction in directions
+	           )
+
+
+def packet_successors(neighbours, direction):
+	"""
+	Get an array giving the packet (numbered as for packet_rings) which follows
+	each packet travelling in the given direction. neighbours is a neighbour
+	table for every direction in which every wire is connected.
+	"""
+	n = len(neighbours[direction])
+	
+	entry_sides = [ topology.opposite(direction)
+	              , topology.next_ccw(topology.opposite(direction))
+	              ]
+	
+	successors = array("l", [0]) * (2 * n)
+	for side, in_wire_side in enumerate(entry_sides):
+		out_wire_side = board.PACKET_OUT_SIDES[(in_wire_side, direction)]
+		next_side = entry_sides.index(topology.opposite(out_wire_side))
+		
+		targets = neighbours[out_wire_side]
+		assert(-1 not in targets)
+		
+		# successors[(2 * i) + side] = (2 * targets[i]) + next_side
+		successors[side::2] = array("l", imap(add, imap(add, targets, targets),
+		                                      repeat(next_side)))
+	
+	return successors
@@ -9,7 +9,12 @@ python tests.py
 import unittest
 
 from itertools import product
+from collections import defaultdict
 import fractions
+import tempfile
+import os
+import sys
+import random
 
 import topology
 import board
@@ -17,6 +22,14 @@ import cabinet
 import coordinates
 import transforms
 import metrics
+import plan
+import patterns
+import symmetry
+import table
+import partition
+import routing
+import validation
+import faults
 
 class TopologyTests(unittest.TestCase):
 	"""
@@ -294,6 +307,129 @@ class TopologyTests(unittest.TestCase):
 		self.assertEqual(topology.fold_interleave_dimension(9, 12, 4), 11)
 	
 	
+	def test_fold_map(self):
+		# The lookup tables agree with the scalar functions, including where the
+		# dimension doesn't divide evenly
+		for w, f in product(range(1, 14), range(1, 5)):
+			new_xs, folds, interleaved = topology.fold_map(w, f)
+			for x in range(w):
+				self.assertEqual((new_xs[x], folds[x]), topology.fold_dimension(x, w, f))
+				self.assertEqual(interleaved[x], topology.fold_interleave_dimension(x, w, f))
+			
+			# Cached
+			self.assertTrue(topology.fold_map(w, f) is topology.fold_map(w, f))
+	
+	
+	def test_fold_column(self):
+		xs = [3, 0, 11, 5, 5]
+		self.assertEqual(topology.fold_column(xs, 12, 4),
+		                 tuple(map(list, zip(*(topology.fold_dimension(x, 12, 4) for x in xs)))))
+		self.assertEqual(topology.fold_interleave_column(xs, 12, 4),
+		                 [topology.fold_interleave_dimension(x, 12, 4) for x in xs])
+		
+		# Values outside the dimension fall back on the scalar functions
+		xs = [-1, 12, 3]
+		self.assertEqual(topology.fold_column(xs, 12, 4),
+		                 tuple(map(list, zip(*(topology.fold_dimension(x, 12, 4) for x in xs)))))
+		self.assertEqual(topology.fold_interleave_column(xs, 12, 4),
+		                 [topology.fold_interleave_dimension(x, 12, 4) for x in xs])
+		
+		# Empty columns
+		self.assertEqual(topology.fold_interleave_column([], 12, 4), [])
+	
+	
+	def test_fold_levels(self):
+		self.assertEqual(topology.fold_levels(1), (1,))
+		self.assertEqual(topology.fold_levels(4), (4,))
+		self.assertEqual(topology.fold_levels((2,2)), (2,2))
+		self.assertEqual(topology.fold_levels([3,2]), (3,2))
+		
+		self.assertEqual(topology.fold_count(1), 1)
+		self.assertEqual(topology.fold_count(4), 4)
+		self.assertEqual(topology.fold_count((2,2)), 4)
+		self.assertEqual(topology.fold_count((3,2,2)), 12)
+	
+	
+	def test_fold_hierarchical(self):
+		# Fold in two then fold the result in two again
+		self.assertEqual([topology.fold_interleave_dimension(x, 8, (2,2)) for x in range(8)],
+		                 [0, 4, 6, 2, 3, 7, 5, 1])
+		
+		# A single level is the same as the plain number of folds
+		for w, f in product(range(1, 14), range(1, 5)):
+			self.assertEqual(topology.fold_map(w, (f,)), topology.fold_map(w, f))
+			for x in range(w):
+				self.assertEqual(topology.fold_interleave_dimension(x, w, (f,)),
+				                 topology.fold_interleave_dimension(x, w, f))
+		
+		# Lookup tables agree with the scalar function and every position is used
+		# exactly once when the dimension divides evenly
+		for w, levels in product(range(1, 25), [(2,2), (2,3), (3,2), (2,2,2)]):
+			interleaved = topology.fold_map(w, levels)[2]
+			self.assertEqual(list(interleaved),
+			                 [topology.fold_interleave_dimension(x, w, levels) for x in range(w)])
+			self.assertEqual(topology.fold_interleave_column(range(w), w, levels),
+			                 list(interleaved))
+			if w % topology.fold_count(levels) == 0:
+				self.assertEqual(sorted(interleaved), range(w))
+	
+	
+	def test_morton(self):
+		self.assertEqual([topology.morton_decode(d) for d in range(8)],
+		                 [(0,0), (1,0), (0,1), (1,1), (2,0), (3,0), (2,1), (3,1)])
+		
+		for x, y in product([0, 1, 5, 12, 255, 0xFFFF], repeat = 2):
+			self.assertEqual(topology.morton_decode(topology.morton_encode(x, y)), (x, y))
+	
+	
+	def test_hilbert(self):
+		for order in range(5):
+			n = 1 << order
+			points = [topology.hilbert_decode(d, order) for d in range(n * n)]
+			
+			# Visits every point once, starting and ending on the bottom row
+			self.assertEqual(sorted(points), list(product(range(n), repeat = 2)))
+			self.assertEqual(points[0], (0, 0))
+			self.assertEqual(points[-1], (n - 1, 0))
+			
+			# Consecutive points are adjacent
+			for (x1, y1), (x2, y2) in zip(points, points[1:]):
+				self.assertEqual(abs(x2 - x1) + abs(y2 - y1), 1)
+			
+			for d, (x, y) in enumerate(points):
+				self.assertEqual(topology.hilbert_encode(x, y, order), d)
+	
+	
+	def test_allocation_map(self):
+		bounds = (4, 6)
+		for allocation in topology.ALLOCATIONS:
+			encoder, decoder = topology.allocation_map(bounds, 2, 3, allocation)
+			
+			# A permutation and its inverse
+			self.assertEqual(sorted(encoder), range(24))
+			for p in range(24):
+				self.assertEqual(decoder[encoder[p]], p)
+			
+			# Agrees with cabinetise and fills every slot
+			slots = set()
+			for x, y in product(range(4), range(6)):
+				c = topology.cabinetise((x, y), bounds, 2, 3, 4, allocation)
+				self.assertEqual(((c.cabinet * 3) + c.rack) * 4 + c.slot, encoder[(x * 6) + y])
+				slots.add(c)
+			self.assertEqual(len(slots), 24)
+		
+		# The interleaved allocation is the plain cabinetise
+		for x, y in product(range(4), range(6)):
+			self.assertEqual(topology.cabinetise((x, y), bounds, 2, 3, 4, "interleave"),
+			                 topology.cabinetise((x, y), bounds, 2, 3, 4))
+		
+		# The Hilbert allocation puts the first rack in a compact block: the first
+		# four positions along a 8x8 curve
+		encoder, decoder = topology.allocation_map((4, 6), 2, 3, "hilbert")
+		self.assertEqual(sorted(divmod(p, 6) for p in decoder[:4]),
+		                 [(0,0), (0,1), (1,0), (1,1)])
+	
+	
 	def test_cabinetise(self):
 		# Test a 4x4 system exhaustively
 		#                          +---+---+  +---+---+
@@ -487,6 +623,43 @@ class BoardTests(unittest.TestCase):
 						# its length.
 						if direction in (topology.NORTH_EAST, topology.SOUTH_WEST):
 							self.assertEqual(num_nodes, self.lcm(w,h)*3)
+	
+	
+	def test_rings(self):
+		# Check the batch decomposition into rings agrees with following each loop
+		for w, h in BoardTests.TEST_CASES:
+			boards = board.create_torus(w, h)
+			b2i = dict((b, i) for (i, (b, c)) in enumerate(boards))
+			
+			wiring = table.wiring_rings(boards)
+			packets = table.packet_rings(boards)
+			
+			for direction in table.DIRECTIONS:
+				ring_ids, positions, lengths = wiring[direction]
+				self.assertEqual(sum(lengths), len(boards))
+				
+				for i, (b, c) in enumerate(boards):
+					loop = list(board.follow_wiring_loop(b, direction))
+					self.assertEqual(lengths[ring_ids[i]], len(loop))
+					for p, lb in enumerate(loop):
+						self.assertEqual(ring_ids[b2i[lb]], ring_ids[i])
+						self.assertEqual(positions[b2i[lb]],
+						                 (positions[i] + p) % len(loop))
+				
+				# Every packet ring has the length given in test_threeboard_packets
+				ring_ids, positions, lengths = packets[direction]
+				self.assertEqual(sum(lengths), 2 * len(boards))
+				expected = {
+					topology.NORTH : h, topology.SOUTH : h,
+					topology.EAST  : w, topology.WEST  : w,
+				}.get(direction, self.lcm(w, h))
+				self.assertEqual(set(lengths), set([(expected * 2)]))
+				
+				entry_sides = [topology.opposite(direction),
+				               topology.next_ccw(topology.opposite(direction))]
+				for (in_wire_side, b) in board.follow_packet_loop(boards[0][0], entry_sides[0], direction):
+					packet = (2 * b2i[b]) + entry_sides.index(in_wire_side)
+					self.assertEqual(ring_ids[packet], ring_ids[0])
 
 
 
@@ -584,6 +757,35 @@ class CabinetTests(unittest.TestCase):
 		
 		# Check accessing a particular link
 		self.assertEqual(sys.get_position((0,0,2), topology.NORTH), (6.75,3.5,2.0))
+		
+		# A single row is drawn as it is
+		self.assertEqual(sys.get_elevation_position((1,1,0)), (128.75,23.5))
+	
+	
+	def test_system_rows(self):
+		s = cabinet.Slot((1,10,10), {topology.NORTH : (0.0,0.0,1.0)})
+		r = cabinet.Rack(s, (20,15,15), 10, 0.5)
+		c = cabinet.Cabinet(r, (25, 120, 20), 5, 5.0, (1,1,1))
+		
+		# Seven cabinets in three rows of three with aisles of 50 and 60
+		sys = cabinet.System(c, 7, 100, 3, [50, 60])
+		
+		# Each row runs back along the previous one
+		self.assertEqual(sys.cabinet_grid_positions,
+		                 [(0,0), (1,0), (2,0), (2,1), (1,1), (0,1), (0,2)])
+		
+		self.assertEqual(sys.get_position((0,0,0)), (3.75,3.5,1.0))
+		self.assertEqual(sys.get_position((2,0,0)), (253.75,3.5,1.0))
+		self.assertEqual(sys.get_position((3,0,0)), (253.75,3.5,71.0))
+		self.assertEqual(sys.get_position((5,0,0)), (3.75,3.5,71.0))
+		self.assertEqual(sys.get_position((6,0,0)), (3.75,3.5,151.0))
+		
+		# Rows are drawn above each other
+		self.assertEqual(sys.get_elevation_position((4,1,0)), (128.75,243.5))
+		
+		# Equal spacing
+		sys = cabinet.System(c, 4, 100, 2, 50)
+		self.assertEqual(sys.get_position((3,0,0)), (3.75,3.5,71.0))
 
 
 
@@ -631,8 +833,1080 @@ class MetricsTests(unittest.TestCase):
 		# South wire (which reaches the chip above-right)
 		self.assertTrue(metrics.wire_length(boards, b, topology.SOUTH, wire_offsets),
 			2.0)
+	
+	
+	def test_wire_length_histogram(self):
+		boards = board.create_torus(3, 2)
+		boards = transforms.hex_to_cartesian(boards)
+		boards = transforms.cabinetise(transforms.compress(transforms.rhombus_to_rect(boards)), 1, 1)
+		boards = transforms.cabinet_to_physical(boards, cabinet.System())
+		wire_offsets = cabinet.Slot().wire_position
+		
+		histograms = metrics.wire_length_histogram(boards, wire_offsets = wire_offsets)
+		for direction in [topology.NORTH, topology.EAST, topology.SOUTH_WEST]:
+			expected = defaultdict(int)
+			for b, c in boards:
+				expected[metrics.wire_length(boards, b, direction, wire_offsets)] += 1
+			self.assertEqual(histograms[direction], dict(expected))
+	
+	
+	def test_routed_wire_length_histogram(self):
+		boards = board.create_torus(4, 4)
+		boards = transforms.hex_to_cartesian(boards)
+		boards = transforms.cabinetise(transforms.compress(transforms.rhombus_to_rect(boards)), 4, 2)
+		system = cabinet.System(cabinet.Cabinet(num_racks = 2), 4, num_rows = 2)
+		cable_routing = routing.TrayRouting(system, bend_allowance = 1.0)
+		b2c = dict(boards)
+		
+		histograms = metrics.routed_wire_length_histogram(boards, cable_routing)
+		for direction in [topology.NORTH, topology.EAST, topology.SOUTH_WEST]:
+			expected = defaultdict(int)
+			for b, c in boards:
+				target = b2c[b.connection[direction]]
+				length = cable_routing.wire_length(c, direction,
+				                                   target, topology.opposite(direction))
+				expected[length] += 1
+				
+				# Routes are never shorter than the straight line
+				straight = (system.get_position(c, direction)
+				            - system.get_position(target, topology.opposite(direction))
+				           ).magnitude()
+				self.assertTrue(length >= straight - 1e-9)
+			self.assertEqual(histograms[direction], dict(expected))
+	
+	
+	def test_wire_count_matrices(self):
+		boards = board.create_torus(4)
+		boards = transforms.hex_to_cartesian(boards)
+		boards = transforms.rhombus_to_rect(boards)
+		boards = transforms.compress(boards)
+		boards = transforms.fold(boards, (2,1))
+		boards = transforms.cabinetise(boards, 4, 2, 6)
+		b2c = dict(boards)
+		
+		directions = [topology.NORTH, topology.EAST, topology.SOUTH_WEST]
+		matrices = metrics.wire_count_matrices(boards, directions)
+		
+		for direction in directions:
+			cabinet_matrix, rack_matrix, crossings = matrices[direction]
+			
+			self.assertEqual(len(cabinet_matrix), 4)
+			self.assertEqual(len(rack_matrix), 8)
+			self.assertEqual(len(crossings), 3)
+			
+			# Count the slow way
+			expected_cabinet = defaultdict(int)
+			expected_rack = defaultdict(int)
+			expected_crossings = [0, 0, 0]
+			for b, (c, r, s) in boards:
+				tc, tr, ts = b2c[b.follow_wire(direction)]
+				expected_cabinet[(c, tc)] += 1
+				expected_rack[((c*2) + r, (tc*2) + tr)] += 1
+				for i in range(min(c, tc), max(c, tc)):
+					expected_crossings[i] += 1
+			
+			for a, b in product(range(4), repeat = 2):
+				self.assertEqual(cabinet_matrix[a][b], expected_cabinet[(a,b)])
+			for a, b in product(range(8), repeat = 2):
+				self.assertEqual(rack_matrix[a][b], expected_rack[(a,b)])
+			self.assertEqual(crossings, expected_crossings)
+			
+			# Every wire counted exactly once
+			self.assertEqual(sum(map(sum, cabinet_matrix)), len(boards))
+
+
+
+
+class PlanTests(unittest.TestCase):
+	"""
+	Tests for the on-disk wiring plan
+	"""
+	
+	def setUp(self):
+		# A 2x2 threeboard system in two cabinets of three racks
+		boards = board.create_torus(2)
+		boards = transforms.hex_to_cartesian(boards)
+		boards = transforms.rhombus_to_rect(boards)
+		boards = transforms.compress(boards)
+		self.boards = transforms.cabinetise(boards, 2, 3, 2)
+		
+		fd, self.filename = tempfile.mkstemp()
+		os.close(fd)
+	
+	
+	def tearDown(self):
+		os.remove(self.filename)
+	
+	
+	def check_plan(self, boards):
+		b2c = dict(boards)
+		
+		plan.write_plan(boards, self.filename, {topology.NORTH : "J5 (N)"})
+		p = plan.WiringPlan(self.filename)
+		
+		self.assertEqual(len(p), len(boards)*6)
+		
+		# Every wire should be found
+		for b, coord in boards:
+			for direction in range(6):
+				self.assertEqual(p.lookup(*(tuple(coord) + (direction,))),
+				                 (b2c[b.follow_wire(direction)],
+				                  topology.opposite(direction)))
+		
+		# Lookup by socket name
+		b, coord = boards[0]
+		self.assertEqual(p.lookup(*(tuple(coord) + ("J5",))),
+		                 (b2c[b.follow_wire(topology.NORTH)], topology.SOUTH))
+		self.assertRaises(KeyError, p.lookup, 0, 0, 0, "J9")
+		
+		# Non-existent slots
+		self.assertEqual(p.lookup(100, 0, 0, topology.NORTH), None)
+		
+		p.close()
+	
+	
+	def test_dense(self):
+		# Every slot is occupied so records are found by offset
+		self.check_plan(self.boards)
+		p = plan.WiringPlan(self.filename)
+		self.assertTrue(p.dense)
+		p.close()
+	
+	
+	def test_sparse(self):
+		# Leave a gap in the slots (and so require a binary search)
+		boards = [(b, coordinates.Cabinet(c, r, s*2)) for (b, (c,r,s)) in self.boards]
+		self.check_plan(boards)
+		p = plan.WiringPlan(self.filename)
+		self.assertFalse(p.dense)
+		p.close()
+	
+	
+	def test_single_board(self):
+		# A lone, unconnected board
+		plan.write_plan([(board.Board(), coordinates.Cabinet(1, 2, 3))], self.filename)
+		p = plan.WiringPlan(self.filename)
+		self.assertEqual(len(p), 0)
+		self.assertEqual(p.lookup(1, 2, 3, topology.NORTH), None)
+		p.close()
+
+
+
+class PatternTests(unittest.TestCase):
+	"""
+	Tests for the wiring pattern finder
+	"""
+	
+	def test_pack_offsets(self):
+		offsets = [[0, -3, 3], [1, 2, -2], [0, 0, -1]]
+		packed = patterns.pack_offsets(offsets, 3)
+		
+		self.assertEqual(len(set(packed)), 3)
+		self.assertEqual([patterns.unpack_offset(p, 3, 3) for p in packed],
+		                 [(0,1,0), (-3,2,0), (3,-2,-1)])
+	
+	
+	def test_find_patterns(self):
+		# A layout where some racks' patterns are mirror images of each other
+		boards = board.create_torus(2)
+		boards = transforms.hex_to_cartesian(boards)
+		boards = transforms.rhombus_to_rect(boards)
+		boards = transforms.compress(boards)
+		boards = transforms.fold(boards, (2,2))
+		boards = transforms.cabinetise(boards, 2, 3, 2)
+		b2c = dict(boards)
+		
+		group_key   = (lambda (c,r,s): (c,r))
+		elem_key    = (lambda (c,r,s): s)
+		wire_filter = (lambda o: o[0] == 0)
+		
+		found = patterns.find_patterns(boards, group_key, elem_key, wire_filter)
+		
+		for direction in range(6):
+			group_patterns, pattern_counts = found[direction]
+			
+			# Find the patterns the slow way
+			expected = defaultdict(set)
+			for b, coord in boards:
+				offset = b2c[b.follow_wire(direction)] - coord
+				if wire_filter(offset):
+					expected[group_key(coord)].add((elem_key(coord), offset))
+			
+			self.assertEqual(set(group_patterns), set(expected))
+			self.assertEqual(sum(pattern_counts), len(expected))
+			self.assertEqual(len(pattern_counts),
+			                 len(set(map(frozenset, expected.itervalues()))))
+			
+			# Groups share an id iff they share a pattern
+			for g1, g2 in product(expected, repeat = 2):
+				self.assertEqual(group_patterns[g1] == group_patterns[g2],
+				                 expected[g1] == expected[g2])
+	
+	
+	def test_canonical_pattern(self):
+		# Offsets are single values packed with a bound of 2
+		mirror = patterns.mirror_offsets([0,1,2,3,4], 2, 1, 0)
+		self.assertEqual(mirror, {0:4, 1:3, 2:2, 3:1, 4:0})
+		
+		a = [(0, 3), (1, 4), (2, 2)]
+		# a translated
+		b = [(5, 3), (6, 4), (7, 2)]
+		# a mirrored (and translated)
+		c = [(10, 1), (9, 0), (8, 2)]
+		# Something different
+		d = [(0, 3), (1, 4), (3, 2)]
+		
+		cp = patterns.canonical_pattern
+		
+		# No symmetries
+		self.assertEqual(cp(a), frozenset(a))
+		self.assertNotEqual(cp(a), cp(b))
+		
+		# Translation only
+		self.assertEqual(cp(a, True), cp(b, True))
+		self.assertNotEqual(cp(a, True), cp(c, True))
+		self.assertNotEqual(cp(a, True), cp(d, True))
+		
+		# Translation and mirroring
+		self.assertEqual(cp(a, True, mirror), cp(b, True, mirror))
+		self.assertEqual(cp(a, True, mirror), cp(c, True, mirror))
+		self.assertNotEqual(cp(a, True, mirror), cp(d, True, mirror))
+		
+		# Canonical form is independent of which variant is given
+		self.assertTrue(cp(a, True, mirror) in (cp(a, True), cp(c, True)))
+	
+	
+	def test_find_patterns_symmetries(self):
+		# A layout where some racks' patterns are mirror images of each other
+		boards = board.create_torus(2)
+		boards = transforms.hex_to_cartesian(boards)
+		boards = transforms.rhombus_to_rect(boards)
+		boards = transforms.compress(boards)
+		boards = transforms.fold(boards, (2,2))
+		boards = transforms.cabinetise(boards, 2, 3, 2)
+		
+		group_key = (lambda (c,r,s): (c,r))
+		elem_key  = (lambda (c,r,s): s)
+		
+		plain     = patterns.find_patterns(boards, group_key, elem_key)
+		symmetric = patterns.find_patterns(boards, group_key, elem_key,
+		                                   translate = True, mirror_field = 2)
+		
+		for direction in range(6):
+			plain_patterns, plain_counts = plain[direction]
+			symmetric_patterns, symmetric_counts = symmetric[direction]
+			
+			# The same groups are present but there may be fewer patterns
+			self.assertEqual(set(plain_patterns), set(symmetric_patterns))
+			self.assertTrue(len(symmetric_counts) <= len(plain_counts))
+			
+			# Groups with identical patterns remain identical
+			for g1, g2 in product(plain_patterns, repeat = 2):
+				if plain_patterns[g1] == plain_patterns[g2]:
+					self.assertEqual(symmetric_patterns[g1], symmetric_patterns[g2])
+		
+		# The symmetries merge some patterns in this layout
+		self.assertEqual([len(plain[d][1]) for d in range(6)],
+		                 [6, 6, 4, 6, 6, 4])
+		self.assertEqual([len(symmetric[d][1]) for d in range(6)],
+		                 [5, 6, 4, 5, 6, 4])
+
+
+
+class SymmetryTests(unittest.TestCase):
+	"""
+	Tests for the symmetry-reduced wire statistics against the brute-force
+	equivalents
+	"""
+	
+	def build(self, width, height, compress_rows, folds, num_cabinets, num_racks):
+		"""
+		Build a cabinetised torus following the same steps as wiring_guide.py.
+		"""
+		boards = board.create_torus(width, height)
+		boards = transforms.hex_to_cartesian(boards)
+		boards = transforms.rhombus_to_rect(boards)
+		comp = transforms.compress(boards, 1 if compress_rows else 2
+		                                 , 2 if compress_rows else 1)
+		boards = transforms.fold(comp, folds)
+		boards = transforms.cabinetise(boards, num_cabinets, num_racks)
+		return comp, boards
+	
+	def test_wire_classes(self):
+		for compress_rows in [True, False]:
+			for width, height in product([1, 2, 3, 5, 8], repeat = 2):
+				comp, boards = self.build(width, height, compress_rows, (1,1), 1, 1)
+				b2c = dict(comp)
+				
+				self.assertEqual(symmetry.grid_size(width, height, compress_rows),
+				                 tuple(m + 1 for m in map(max, *(c for (b,c) in comp))))
+				
+				expected = set( (d, x, y) + tuple(b2c[b.follow_wire(d)])
+				                for (b, (x, y)) in comp
+				                for d in symmetry.DIRECTIONS
+				              )
+				
+				wires = [ (d, x, y, tx, ty)
+				          for (d, x_pairs, y_pairs)
+				          in symmetry.wire_classes(width, height, compress_rows)
+				          for (x, tx) in x_pairs
+				          for (y, ty) in y_pairs
+				        ]
+				
+				# Every wire appears exactly once
+				self.assertEqual(len(wires), len(expected))
+				self.assertEqual(set(wires), expected)
+	
+	def test_wire_count_matrices(self):
+		for compress_rows, width, height, folds, num_cabinets, num_racks in [
+			(True,  4, 4,  (2,1), 4, 2),
+			(True,  5, 6,  (2,3), 2, 3),
+			(False, 6, 4,  (3,2), 3, 4),
+			(True,  20, 20, (4,2), 10, 5),
+			(True,  20, 20, ((2,2),2), 10, 5),
+			(False, 8, 6,  ((2,2),(3,1)), 4, 3),
+			# Uneven folds leave gaps: 108 boards in a 12x10 space
+			(True,  6, 6,  (1,(2,2)), 2, 5),
+		]:
+			comp, boards = self.build(width, height, compress_rows, folds,
+			                          num_cabinets, num_racks)
+			
+			self.assertEqual(symmetry.wire_count_matrices(width, height, folds,
+			                                              num_cabinets, num_racks,
+			                                              compress_rows),
+			                 metrics.wire_count_matrices(boards))
+			
+			# Allocations along space-filling curves
+			for allocation in ["morton", "hilbert"]:
+				boards = transforms.cabinetise(transforms.fold(comp, folds),
+				                               num_cabinets, num_racks,
+				                               allocation = allocation)
+				self.assertEqual(symmetry.wire_count_matrices(width, height, folds,
+				                                              num_cabinets, num_racks,
+				                                              compress_rows,
+				                                              allocation = allocation),
+				                 metrics.wire_count_matrices(boards))
+	
+	def test_wire_length_histogram(self):
+		system = cabinet.System(cabinet.Cabinet(num_racks = 3), num_cabinets = 2)
+		wire_offsets = cabinet.Slot().wire_position
+		
+		for compress_rows, width, height, folds in [
+			(True,  4, 4, (2,1)),
+			(True,  3, 6, (3,3)),
+			(False, 4, 3, (2,3)),
+			(True,  4, 4, ((2,2),1)),
+		]:
+			self.check_wire_length_histogram(compress_rows, width, height, folds,
+			                                 system, wire_offsets)
+		
+		# Several rows of cabinets
+		system = cabinet.System(cabinet.Cabinet(num_racks = 3), num_cabinets = 6,
+		                        num_rows = 3, row_spacing = [100, 150])
+		self.check_wire_length_histogram(True, 6, 6, (2,1), system, wire_offsets)
+		
+		# Uneven folds which leave gaps in the folded grid
+		system = cabinet.System(cabinet.Cabinet(num_racks = 5), num_cabinets = 2)
+		self.check_wire_length_histogram(True, 6, 6, (1,(2,2)), system, wire_offsets)
+	
+	def check_wire_length_histogram(self, compress_rows, width, height, folds,
+	                                system, wire_offsets):
+		"""
+		Compare the symmetric wire lengths with those of every wire for a system.
+		"""
+		num_cabinets = system.num_cabinets
+		num_racks    = system.cabinet.num_racks
+		for allocation in topology.ALLOCATIONS:
+			comp, boards = self.build(width, height, compress_rows, folds,
+			                          num_cabinets, num_racks)
+			boards = transforms.cabinetise(transforms.fold(comp, folds),
+			                               num_cabinets, num_racks,
+			                               allocation = allocation)
+			boards = transforms.cabinet_to_physical(boards, system)
+			
+			histograms = symmetry.wire_length_histogram(width, height, folds, system,
+			                                            wire_offsets, compress_rows,
+			                                            allocation = allocation)
+			
+			for direction in symmetry.DIRECTIONS:
+				# Compare the sorted lists of lengths
+				expected = sorted(metrics.wire_length(boards, b, direction, wire_offsets)
+				                  for (b, c) in boards)
+				lengths = sorted(l for (l, count) in histograms[direction].iteritems()
+				                   for _ in range(count))
+				
+				self.assertEqual(len(lengths), len(expected))
+				for l, e in zip(lengths, expected):
+					self.assertAlmostEqual(l, e)
+	
+	def test_estimate_wire_length_histogram(self):
+		# Check the documented error bound against the wire lengths of the systems
+		# described by the shipped parameter files (measured as in wiring_guide.py)
+		params_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+		
+		# The parameter files import from the model package
+		if params_directory not in sys.path:
+			sys.path.append(params_directory)
+		for params_file in [ "params_spin103.py", "params_spin104.py"
+		                   , "params_spin105.py", "params_spin106.py"
+		                   ]:
+			p = {}
+			execfile(os.path.join(params_directory, "params_physical.py"), p)
+			execfile(os.path.join(params_directory, params_file), p)
+			
+			system = cabinet.System(
+				cabinet = cabinet.Cabinet(
+					rack = cabinet.Rack(
+						slot = cabinet.Slot( dimensions = (p["slot_width"], p["slot_height"], p["slot_depth"])
+						                   , wire_position = p["wire_positions"]
+						                   ),
+						dimensions   = (p["rack_width"], p["rack_height"], p["rack_depth"]),
+						num_slots    = p["num_slots_per_rack"],
+						slot_spacing = p["slot_spacing"],
+						slot_offset  = p["slot_offset"],
+					),
+					dimensions   = (p["cabinet_width"], p["cabinet_height"], p["cabinet_depth"]),
+					num_racks    = p["num_racks_per_cabinet"],
+					rack_spacing = p["rack_spacing"],
+					rack_offset  = p["rack_offset"],
+				),
+				num_cabinets    = p["num_cabinets"],
+				cabinet_spacing = p["cabinet_spacing"],
+			)
+			wire_offsets = system.cabinet.rack.slot.wire_position
+			folds = (p["num_folds_x"], p["num_folds_y"])
+			
+			comp, boards = self.build(p["width"], p["height"], p["compress_rows"], folds,
+			                          p["num_cabinets"], p["num_racks_per_cabinet"])
+			boards = transforms.cabinet_to_physical(boards, system)
+			
+			estimate = symmetry.estimate_wire_length_histogram(p["width"], p["height"],
+			                                                   folds, system,
+			                                                   wire_offsets,
+			                                                   p["compress_rows"])
+			bounds = symmetry.estimate_error_bound(p["width"], p["height"],
+			                                       p["compress_rows"])
+			
+			for direction in symmetry.DIRECTIONS:
+				lengths = sorted(metrics.wire_length(boards, b, direction, wire_offsets)
+				                 for (b, c) in boards)
+				
+				# The number of wires no longer than every length is within the bound
+				for length in set(lengths) | set(estimate[direction]):
+					exact     = len([l for l in lengths if l <= length + 1e-9])
+					estimated = sum(count for (l, count) in estimate[direction].iteritems()
+					                      if l <= length + 1e-9)
+					self.assertTrue(abs(exact - estimated) <= bounds[direction])
+				
+				# The bound is never more than the whole system
+				self.assertTrue(bounds[direction] <= len(boards))
+
+
+class PartitionTests(unittest.TestCase):
+	"""
+	Tests for the graph-partitioning allocator
+	"""
+	
+	def build(self, width, height):
+		"""
+		A folded torus as produced by wiring_guide.py for the 10^6 machine.
+		"""
+		boards = board.create_torus(width, height)
+		boards = transforms.hex_to_cartesian(boards)
+		boards = transforms.rhombus_to_rect(boards)
+		boards = transforms.compress(boards, 1, 2)
+		return transforms.fold(boards, (4,2))
+	
+	def test_wire_graph(self):
+		boards = board.create_torus(4)
+		adj = partition.wire_graph(boards)
+		
+		# Every board has six wires and wires are counted at both ends
+		for v, edges in enumerate(adj):
+			self.assertEqual(sum(edges.values()), 6)
+			for u, wires in edges.iteritems():
+				self.assertEqual(adj[u][v], wires)
+		
+		self.assertEqual(partition.cut_wires(adj, [0] * len(adj)), 0)
+		self.assertEqual(partition.cut_wires(adj, range(len(adj))), 3 * len(adj))
+	
+	def test_partition(self):
+		boards = self.build(20, 20)
+		
+		allocated = partition.partition(boards, 10, 5, 24)
+		self.assertEqual([b for (b, c) in allocated], [b for (b, c) in boards])
+		
+		# Every slot used exactly once
+		self.assertEqual(set(c for (b, c) in allocated),
+		                 set(coordinates.Cabinet(*c) for c in product(range(10), range(5), range(24))))
+		
+		# Fewer wires between racks and between cabinets than the interleaved
+		# allocation
+		interleaved = transforms.cabinetise(boards, 10, 5, 24)
+		adj = partition.wire_graph(boards)
+		for key in [(lambda c: (c.cabinet, c.rack)), (lambda c: c.cabinet)]:
+			self.assertTrue(partition.cut_wires(adj, [key(c) for (b, c) in allocated]) <
+			                partition.cut_wires(adj, [key(c) for (b, c) in interleaved]))
+		
+		# Deterministic for a given seed
+		self.assertEqual(partition.partition(boards, 10, 5, 24), allocated)
+	
+	def test_partition_uneven(self):
+		# Boards don't divide evenly between racks: no rack may exceed its slots
+		boards = board.create_torus(3, 3)
+		for num_cabinets, num_racks, num_slots in [(1, 2, 14), (2, 2, 7), (3, 1, 9), (1, 1, None)]:
+			allocated = partition.partition(boards, num_cabinets, num_racks, num_slots)
+			self.assertEqual(len(set(c for (b, c) in allocated)), len(boards))
+			for b, c in allocated:
+				self.assertTrue(0 <= c.cabinet < num_cabinets)
+				self.assertTrue(0 <= c.rack < num_racks)
+				self.assertTrue(c.slot < (num_slots or len(boards)))
+		
+		self.assertEqual(partition.partition([], 2, 2), [])
+
+
+
+class RoutingTests(unittest.TestCase):
+	"""
+	Tests for the cable routing model
+	"""
+	
+	def setUp(self):
+		s = cabinet.Slot((1,10,10), {topology.NORTH : (0.0,0.0,1.0)})
+		r = cabinet.Rack(s, (20,15,15), 10, 0.5)
+		self.cabinet = cabinet.Cabinet(r, (25, 120, 20), 5, 5.0, (1,1,1))
+	
+	def test_tray_lengths(self):
+		# Two rows of three cabinets with an aisle of 50
+		system = cabinet.System(self.cabinet, 6, 100, 2, 50)
+		
+		# Crossing the aisle at each end of the rows
+		lengths = routing.TrayRouting(system, bend_allowance = 1.0).tray_lengths
+		self.assertEqual(lengths[0][1], 125.0)
+		self.assertEqual(lengths[0][2], 250.0)
+		self.assertEqual(lengths[0][5], 72.0)
+		self.assertEqual(lengths[2][3], 72.0)
+		self.assertEqual(lengths[0][3], 322.0)
+		self.assertEqual(lengths[1][4], 322.0)
+		self.assertEqual(lengths[4][1], 322.0)
+		
+		# Crossing only in the middle
+		lengths = routing.TrayRouting(system, bend_allowance = 1.0,
+		                              aisle_crossings = [1]).tray_lengths
+		self.assertEqual(lengths[0][5], 322.0)
+		self.assertEqual(lengths[1][4], 72.0)
+		self.assertEqual(lengths[2][3], 322.0)
+	
+	def test_tray_route(self):
+		system = cabinet.System(self.cabinet, 6, 100, 2, 50)
+		cable_routing = routing.TrayRouting(system)
+		
+		self.assertEqual(cable_routing.tray_segments,
+		                 [(0,1), (0,5), (1,2), (2,3), (3,4), (4,5)])
+		self.assertEqual(cable_routing.tray_route(0, 2), [0, 1, 2])
+		self.assertEqual(cable_routing.tray_route(1, 5), [1, 0, 5])
+		self.assertEqual(cable_routing.tray_route(4, 4), [4])
+	
+	def test_tray_congestion(self):
+		# Seven cabinets in two rows (the last cabinet of the second row is
+		# missing)
+		system = cabinet.System(self.cabinet, 7, 100, 2, 50)
+		
+		for aisle_crossings in [None, [1, 3]]:
+			cable_routing = routing.TrayRouting(system, aisle_crossings = aisle_crossings)
+			
+			cabinet_matrix = [[(a * 3 + b * 5) % 7 for b in range(7)] for a in range(7)]
+			segments, cutouts = routing.tray_congestion(cable_routing, cabinet_matrix)
+			
+			# Follow every cable
+			expected_segments = dict((segment, 0) for segment in cable_routing.tray_segments)
+			expected_cutouts = [0] * 7
+			for a in range(7):
+				for b in range(7):
+					if a == b:
+						continue
+					route = cable_routing.tray_route(a, b)
+					for c, d in zip(route, route[1:]):
+						expected_segments[(min(c, d), max(c, d))] += cabinet_matrix[a][b]
+					expected_cutouts[a] += cabinet_matrix[a][b]
+					expected_cutouts[b] += cabinet_matrix[a][b]
+			
+			self.assertEqual(segments, expected_segments)
+			self.assertEqual(cutouts, expected_cutouts)
+	
+	def test_wire_length(self):
+		system = cabinet.System(self.cabinet, 2, 100)
+		cable_routing = routing.TrayRouting(system, tray_height = 130,
+		                                    bend_allowance = 1.0)
+		n = topology.NORTH
+		
+		def length(source, target):
+			return cable_routing.wire_length(coordinates.Cabinet(*source), n,
+			                                 coordinates.Cabinet(*target), n)
+		
+		# Between cabinets: along to the riser, up to the tray, along to the next
+		# cabinet, down and along to the socket with four bends
+		self.assertAlmostEqual(length((0,0,0), (1,2,4)),
+		                       3.75 + (130 - 3.5) + 125 + (130 - 43.5) + 9.75 + 4)
+		self.assertAlmostEqual(length((1,2,4), (0,0,0)), length((0,0,0), (1,2,4)))
+		
+		# Between racks of a cabinet: along the riser with two bends
+		self.assertAlmostEqual(length((0,0,0), (0,2,4)), 3.75 + 40 + 9.75 + 2)
+		self.assertAlmostEqual(length((0,2,4), (0,0,0)), 3.75 + 40 + 9.75 + 2)
+		
+		# Within a rack: directly across the rack with one bend
+		self.assertAlmostEqual(length((1,3,0), (1,3,4)), 6 + 1)
+		
+		# Moving the riser
+		cable_routing = routing.TrayRouting(system, riser_offset = 25.0)
+		self.assertAlmostEqual(length((0,0,0), (0,2,4)), 21.25 + 40 + 15.25)
 
 
 
+
+class ValidationTests(unittest.TestCase):
+	"""
+	Tests for the torus validator
+	"""
+	
+	def test_ring_lengths(self):
+		for w, h in BoardTests.TEST_CASES:
+			boards = board.create_torus(w, h)
+			wiring = table.wiring_rings(boards)
+			packets = table.packet_rings(boards)
+			for direction in table.DIRECTIONS:
+				self.assertEqual(set(wiring[direction][2]),
+				                 set([validation.wiring_ring_length(w, h, direction)]))
+				self.assertEqual(set(packets[direction][2]),
+				                 set([validation.packet_ring_length(w, h, direction)]))
+	
+	def test_valid(self):
+		for w, h in BoardTests.TEST_CASES:
+			boards = board.create_torus(w, h)
+			self.assertEqual(validation.check_torus(boards), [])
+			self.assertEqual(validation.check_torus(boards, w, h), [])
+	
+	def test_invalid(self):
+		n = topology.NORTH
+		s = topology.SOUTH
+		
+		# Disconnected wire
+		boards = board.create_torus(3, 2)
+		target = boards[0][0].connection[n]
+		t = [b for (b, c) in boards].index(target)
+		boards[0][0].connection[n] = None
+		target.connection[s] = None
+		self.assertEqual(validation.check_torus(boards, 3, 2),
+		                 [(validation.UNCONNECTED, n, [0]),
+		                  (validation.UNCONNECTED, s, [t])])
+		
+		# Wire back to the same board
+		boards[0][0].connection[n] = boards[0][0]
+		boards[0][0].connection[s] = boards[0][0]
+		target.connection[s] = None
+		problems = validation.check_torus(boards, 3, 2)
+		self.assertIn((validation.SELF_LINK, n, [0]), problems)
+		self.assertIn((validation.SELF_LINK, s, [0]), problems)
+		self.assertIn((validation.UNCONNECTED, s, [t]), problems)
+		
+		# Wire which doesn't lead back
+		boards = board.create_torus(3, 2)
+		a = boards[0][0]
+		k = [i for (i, (b, c)) in enumerate(boards)
+		     if b is not a and a.connection[n] is not b and b.connection[n] is not a][0]
+		b = boards[k][0]
+		a.connection[n], b.connection[n] = b.connection[n], a.connection[n]
+		problems = validation.check_torus(boards, 3, 2)
+		self.assertEqual([(p, d) for (p, d, i) in problems],
+		                 [(validation.ASYMMETRIC, n), (validation.ASYMMETRIC, s)])
+		self.assertEqual(problems[0][2], [0, k])
+		
+		# The wrong dimensions
+		boards = board.create_torus(4, 3)
+		problems = validation.check_torus(boards, 3, 4)
+		self.assertTrue(problems)
+		for problem, direction, offenders in problems:
+			self.assertIn(problem, [validation.WIRING_RING, validation.PACKET_RING])
+			self.assertEqual(offenders, range(len(boards)))
+
+
+
+class FaultTests(unittest.TestCase):
+	"""
+	Tests for the fault-injection model
+	"""
+	
+	def components(self, boards, dead_boards, dead_wires):
+		"""
+		Find the sizes of the components of the live boards by searching.
+		"""
+		b2i = dict((b, i) for (i, (b, c)) in enumerate(boards))
+		seen = set(dead_boards)
+		sizes = []
+		for i, (b, c) in enumerate(boards):
+			if i in seen:
+				continue
+			seen.add(i)
+			stack = [i]
+			size = 0
+			while stack:
+				j = stack.pop()
+				size += 1
+				for direction in table.DIRECTIONS:
+					k = b2i[boards[j][0].follow_wire(direction)]
+					if k not in seen and (j, direction) not in dead_wires:
+						seen.add(k)
+						stack.append(k)
+			sizes.append(size)
+		return sizes
+	
+	def test_isolated(self):
+		boards = board.create_torus(3, 3)
+		model = faults.FaultModel(boards)
+		self.assertEqual((model.num_components(), model.largest_component()),
+		                 (1, len(boards)))
+		self.assertEqual(model.isolated_boards(), [])
+		self.assertEqual(model.hop_stretch(), (1.0, 1.0))
+		
+		# Cut every wire of board 0 (from either end)
+		for direction in table.DIRECTIONS[:3]:
+			model.remove_wire(0, direction)
+		b2i = dict((b, i) for (i, (b, c)) in enumerate(boards))
+		for direction in table.DIRECTIONS[3:]:
+			model.remove_wire(b2i[boards[0][0].follow_wire(direction)],
+			                  topology.opposite(direction))
+		
+		self.assertEqual(model.isolated_boards(), [0])
+		self.assertEqual((model.num_components(), model.largest_component()),
+		                 (2, len(boards) - 1))
+		
+		# Removing the board leaves no isolated boards
+		model.remove_board(0)
+		self.assertEqual(model.isolated_boards(), [])
+		self.assertEqual(model.num_components(), 1)
+		self.assertEqual(model.components()[0][0], -1)
+		
+		# Removing the remaining neighbours of a board isolates it
+		model = faults.FaultModel(boards)
+		for direction in table.DIRECTIONS:
+			model.remove_board(b2i[boards[4][0].follow_wire(direction)])
+		self.assertIn(4, model.isolated_boards())
+		
+		# Paths get longer
+		mean, worst = model.hop_stretch()
+		self.assertTrue(1.0 <= mean <= worst)
+	
+	def test_random_faults(self):
+		rng = random.Random(1)
+		boards = board.create_torus(4, 3)
+		n = len(boards)
+		b2i = dict((b, i) for (i, (b, c)) in enumerate(boards))
+		
+		events = []
+		for _ in range(60):
+			if rng.random() < 0.2:
+				events.append(("board", rng.randrange(n)))
+			else:
+				events.append(("wire", rng.randrange(n), rng.choice(table.DIRECTIONS)))
+		
+		timeline = faults.fault_timeline(boards, events)
+		self.assertEqual(len(timeline), len(events))
+		
+		model = faults.FaultModel(boards)
+		dead_boards = set()
+		dead_wires = set()
+		for event, (num_components, largest) in zip(events, timeline):
+			if event[0] == "board":
+				model.remove_board(event[1])
+				dead_boards.add(event[1])
+			else:
+				i, direction = event[1:]
+				model.remove_wire(i, direction)
+				dead_wires.add((i, direction))
+				dead_wires.add((b2i[boards[i][0].follow_wire(direction)],
+				                topology.opposite(direction)))
+			
+			sizes = self.components(boards, dead_boards, dead_wires)
+			self.assertEqual(sorted(model.components()[1]), sorted(sizes))
+			self.assertEqual((num_components, largest), (len(sizes), max(sizes or [0])))
+			
+			isolated = [i for i in range(n) if i not in dead_boards and
+			            all((i, d) in dead_wires
+			                or b2i[boards[i][0].follow_wire(d)] in dead_boards
+			                for d in table.DIRECTIONS)]
+			self.assertEqual(model.isolated_boards(), isolated)
+	
+	def test_interleaved_queries(self):
+		# Components are split incrementally as faults occur so queries made at
+		# any point must agree with the (reverse union-find) timeline.
+		rng = random.Random(2)
+		boards = board.create_torus(6, 5)
+		n = len(boards)
+		
+		events = []
+		for _ in range(250):
+			if rng.random() < 0.3:
+				events.append(("board", rng.randrange(n)))
+			else:
+				events.append(("wire", rng.randrange(n), rng.choice(table.DIRECTIONS)))
+		
+		timeline = faults.fault_timeline(boards, events)
+		self.assertTrue(timeline[-1][0] > 1)
+		
+		model = faults.FaultModel(boards)
+		for num, (event, expected) in enumerate(zip(events, timeline)):
+			if event[0] == "board":
+				model.remove_board(event[1])
+			else:
+				model.remove_wire(*event[1:])
+			
+			# Query after only some of the faults
+			if num % 3 == 0 or num == len(events) - 1:
+				self.assertEqual((model.num_components(), model.largest_component()),
+				                 expected)
+				component_ids, sizes = model.components()
+				self.assertEqual((len(sizes), max(sizes or [0])), expected)
+				self.assertEqual(sum(sizes), sum(1 for i in component_ids if i != -1))
+
+
+class SVGDiagramTests(unittest.TestCase):
+	"""
+	Smoke tests for the SVG diagram backend (svg_diagram.py, alongside the
+	wiring guide).
+	"""
+	
+	def setUp(self):
+		# The backend lives above the model package and uses it by that name so
+		# boards must be created through it too.
+		svg_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+		if svg_directory not in sys.path:
+			sys.path.append(svg_directory)
+		
+		import svg_diagram
+		from model import board, transforms, cabinet, topology
+		self.svg_diagram = svg_diagram
+		self.board       = board
+		self.transforms  = transforms
+		self.cabinet     = cabinet
+		self.topology    = topology
+		
+		from xml.etree import ElementTree
+		self.ElementTree = ElementTree
+	
+	def parse(self, d):
+		# Parse the diagram and count the elements of each kind it contains
+		root = self.ElementTree.fromstring(d.get_svg())
+		counts = defaultdict(int)
+		for element in root:
+			counts[element.tag.split("}")[-1]] += 1
+		return counts
+	
+	def test_hexagons(self):
+		topology = self.topology
+		boards = self.transforms.hex_to_cartesian(self.board.create_torus(3, 2))
+		
+		d = self.svg_diagram.SVGDiagram()
+		for b, c in boards:
+			d.add_board_hexagon(b, c, ["fill=red!50!white"])
+			d.add_label(b, r"\tiny %d,%d"%c)
+			d.add_wire(b, topology.NORTH, ["thick", "red"])
+			d.add_curved_wire(b, topology.EAST, ["thick", "green"])
+		
+		counts = self.parse(d)
+		self.assertEqual(counts["polygon"], len(boards))
+		self.assertEqual(counts["path"], 2 * len(boards))
+		self.assertEqual(counts["text"], len(boards))
+	
+	def test_cabinets(self):
+		topology   = self.topology
+		transforms = self.transforms
+		boards = self.board.create_torus(3, 2)
+		boards = transforms.hex_to_cartesian(boards)
+		boards = transforms.cabinetise(transforms.compress(transforms.rhombus_to_rect(boards)), 1, 3)
+		system = self.cabinet.System(self.cabinet.Cabinet(num_racks = 3), num_cabinets = 1)
+		
+		d = self.svg_diagram.SVGDiagram()
+		d.set_cabinet_system(system, 7.0)
+		d.set_level_of_detail(self.svg_diagram.Diagram.LOD_BOARD)
+		for b, c in boards:
+			d.add_board_cabinet(b, c)
+			for direction in [topology.NORTH, topology.EAST, topology.SOUTH_WEST]:
+				d.add_wire(b, direction)
+		
+		counts = self.parse(d)
+		# The cabinet, its racks and slots and every board
+		self.assertEqual( counts["polygon"]
+		                , 1 + 3 + (3 * system.cabinet.rack.num_slots) + len(boards)
+		                )
+		self.assertEqual(counts["path"], 3 * len(boards))
+
+
+class _RecordingDiagram(object):
+	"""
+	A stand-in for diagram.Diagram which records the wires and stubs added.
+	"""
+	
+	def __init__(self):
+		self.boards = []
+		self.wires  = []
+		self.stubs  = []
+	
+	def add_board(self, board, coord):
+		self.boards.append(board)
+	
+	def add_wire(self, board, direction, styles):
+		self.wires.append((board, direction))
+	
+	def add_wire_stub(self, board, direction, label, styles):
+		self.stubs.append((board, direction, label))
+
+
+class TilingTests(unittest.TestCase):
+	"""
+	Tests for the generation of tiled diagrams (tiling.py, alongside the wiring
+	guide).
+	"""
+	
+	def setUp(self):
+		# As for SVGDiagramTests
+		tiling_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+		if tiling_directory not in sys.path:
+			sys.path.append(tiling_directory)
+		
+		import tiling
+		from model import board, transforms, topology
+		self.tiling   = tiling
+		self.topology = topology
+		
+		boards = board.create_torus(4)
+		boards = transforms.hex_to_cartesian(boards)
+		boards = transforms.rhombus_to_rect(boards)
+		boards = transforms.compress(boards, 1, 2)
+		self.boards = transforms.fold(boards, (2,2))
+		self.tile_size = (3, 2)
+	
+	def test_split_tiles(self):
+		tiles = self.tiling.split_tiles(self.boards, self.tile_size)
+		
+		# Every board is in exactly one tile, the one covering its position
+		self.assertEqual(sorted(b for t in tiles.itervalues() for (b, c) in t),
+		                 sorted(b for (b, c) in self.boards))
+		for (col, row), tile_boards in tiles.iteritems():
+			self.assertTrue(tile_boards)
+			for b, (x, y) in tile_boards:
+				self.assertEqual((x // 3, y // 2), (col, row))
+	
+	def test_stubs(self):
+		topology = self.topology
+		wires = [(d, []) for d in [topology.NORTH, topology.EAST, topology.SOUTH_WEST]]
+		
+		tiles = self.tiling.generate_tiles( self.boards, self.tile_size
+		                                  , _RecordingDiagram.add_board, wires
+		                                  , diagram_class = _RecordingDiagram
+		                                  , render_func = (lambda d: d)
+		                                  , processes = 1
+		                                  )
+		
+		b2t = dict((b, self.tiling.get_tile(c, self.tile_size)) for (b, c) in self.boards)
+		self.assertEqual(set(tiles), set(b2t.values()))
+		
+		# Every wire within a tile is drawn once and every wire between tiles has
+		# one stub at each end, labelled with the tile at the other end.
+		expected_wires = defaultdict(list)
+		expected_stubs = defaultdict(list)
+		for b, c in self.boards:
+			for d, styles in wires:
+				target = b.follow_wire(d)
+				if b2t[b] == b2t[target]:
+					expected_wires[b2t[b]].append((b, d))
+				else:
+					expected_stubs[b2t[b]].append((b, d, r"\tiny %d,%d"%b2t[target]))
+					expected_stubs[b2t[target]].append(
+						(target, topology.opposite(d), r"\tiny %d,%d"%b2t[b]))
+		self.assertTrue(sum(map(len, expected_stubs.values())))
+		
+		for tile, d in tiles.iteritems():
+			self.assertEqual(sorted(d.boards), sorted(b for b in b2t if b2t[b] == tile))
+			self.assertEqual(sorted(d.wires), sorted(expected_wires[tile]))
+			self.assertEqual(sorted(d.stubs), sorted(expected_stubs[tile]))
+
+
+
+class IncrementalTests(unittest.TestCase):
+	"""
+	Tests for the incremental report build (incremental.py, alongside the wiring
+	guide).
+	"""
+	
+	def setUp(self):
+		# As for SVGDiagramTests
+		incremental_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+		if incremental_directory not in sys.path:
+			sys.path.append(incremental_directory)
+		
+		import incremental
+		self.incremental = incremental
+		
+		self.cache_directory = tempfile.mkdtemp()
+		self.source_filename = os.path.join(self.cache_directory, "source.py")
+		self.write_source("x = 1")
+	
+	def tearDown(self):
+		for filename in os.listdir(self.cache_directory):
+			os.remove(os.path.join(self.cache_directory, filename))
+		os.rmdir(self.cache_directory)
+	
+	def write_source(self, source):
+		f = open(self.source_filename, "w")
+		f.write(source)
+		f.close()
+	
+	def create_build(self):
+		"""
+		A build of two independent sections sharing a stage.
+		"""
+		build = self.incremental.Build(self.cache_directory, [self.source_filename])
+		build.add_stage("base", (lambda: build.params["a"]), ["a"])
+		build.add_section("plus", (lambda base: base + build.params["b"]), ["b"], ["base"])
+		build.add_section("times", (lambda base: base * build.params["c"]), ["c"], ["base"])
+		build.add_split_section("split", (lambda base: {0: lambda: base, 1: lambda: -base}),
+		                        stages = ["base"])
+		return build
+	
+	def get(self, build, **params):
+		build.set_params(params)
+		return build.get_sections(["plus", "times", "split"], 1)
+	
+	def test_changed_params(self):
+		build = self.create_build()
+		self.assertEqual(self.get(build, a = 1, b = 2, c = 3),
+		                 {"plus": 3, "times": 3, "split": {0: 1, 1: -1}})
+		self.assertEqual(sorted(build.computed), ["base", "plus", "split", "times"])
+		
+		# Only the dependants of a changed parameter are recomputed
+		self.assertEqual(self.get(build, a = 1, b = 5, c = 3)["plus"], 6)
+		self.assertEqual(build.computed, ["plus"])
+		self.assertEqual(sorted(build.reused), ["base", "split", "times"])
+		
+		self.assertEqual(self.get(build, a = 2, b = 5, c = 3),
+		                 {"plus": 7, "times": 6, "split": {0: 2, 1: -2}})
+		self.assertEqual(sorted(build.computed), ["base", "plus", "split", "times"])
+		
+		# Results persist between builds
+		build = self.create_build()
+		self.assertEqual(self.get(build, a = 2, b = 5, c = 3)["times"], 6)
+		self.assertEqual(build.computed, [])
+	
+	def test_changed_source(self):
+		build = self.create_build()
+		self.get(build, a = 1, b = 2, c = 3)
+		
+		# Persisted results are not reused once the code has changed
+		self.write_source("x = 2")
+		build = self.create_build()
+		self.get(build, a = 1, b = 2, c = 3)
+		self.assertEqual(sorted(build.computed), ["base", "plus", "split", "times"])
+
+
 if __name__=="__main__":
 	unittest.main()
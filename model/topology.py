@@ -14,6 +14,7 @@ Contains:
   * Functions for Generation arrangements of spinnaker boards
   * Functions for transforming Cartesian coordinates
   * Functions for working with cabinets
+  * Functions for space-filling curves
 
 This uses the hexagonal addressing scheme suggested in
 
@@ -21,6 +22,8 @@ This uses the hexagonal addressing scheme suggested in
 	Mobile Users and Connection Rerouting in Cellular Networks by Nocetti et. al.
 """
 
+from array import array
+
 import coordinates
 
 ################################################################################
@@ -264,21 +267,291 @@ def fold_interleave_dimension(x, w, f):
 	
 	That is, it interleaves points which would be mapped to the same position by
 	fold_dimension.
+	
+	f may also be a hierarchical fold specification (see fold_levels), e.g.
+	(2,2). The dimension is folded into f[0] pieces, then the (interleaved)
+	pieces are folded together into f[1] pieces and so on.
 	"""
+	levels = fold_levels(f)
+	f = levels[0]
+	
 	new_x, fold = fold_dimension(x,w,f)
 	
+	# Fold the pieces (all of the width of the first) at the remaining levels
+	if len(levels) > 1:
+		new_x = fold_interleave_dimension(new_x, (w+(f-1)) / f, levels[1:])
+	
 	new_x *= f
 	new_x += fold
 	
 	return new_x
 
 
+def fold_levels(f):
+	"""
+	Get the number of pieces at each level of a fold specification as a tuple.
+	
+	A fold specification is either an integer, the number of pieces a dimension
+	is folded into, or a sequence of integers for a hierarchical fold (e.g. into
+	cabinets and then into racks). In the latter case the dimension is folded
+	into f[0] pieces, then the pieces (as a whole) are folded into f[1] pieces
+	and so on.
+	"""
+	if isinstance(f, (tuple, list)):
+		return tuple(f)
+	else:
+		return (f,)
+
+
+def fold_count(f):
+	"""
+	Get the total number of pieces a dimension is folded into by a fold
+	specification (see fold_levels).
+	"""
+	return reduce((lambda a, b: a * b), fold_levels(f), 1)
+
+
+# Fold maps already computed {(w, levels): (new_xs, folds, interleaved),...}
+# (see fold_map).
+_fold_maps = {}
+
+
+def fold_map(w, f):
+	"""
+	Get lookup tables giving the result of fold_dimension and
+	fold_interleave_dimension for every x in range(w). Returns a tuple (new_xs,
+	folds, interleaved) of arrays such that:
+	
+	* fold_dimension(x, w, f) == (new_xs[x], folds[x])
+	* fold_interleave_dimension(x, w, f) == interleaved[x]
+	
+	Maps are cached per (w, f) so that repeatedly folding a dimension costs one
+	lookup per coordinate.
+	
+	f may be a hierarchical fold specification (see fold_levels) in which case
+	new_xs and folds describe the first level only.
+	"""
+	levels = fold_levels(f)
+	
+	if (w, levels) not in _fold_maps:
+		f = levels[0]
+		fold_width = (w+(f-1)) / f
+		
+		# Width of the last fold (which may be smaller if not evenly divisible)
+		last_fold_width = fold_width - ((fold_width*f) - w)
+		
+		new_xs = array("l")
+		folds  = array("l")
+		for x in xrange(w):
+			fold, new_x = divmod(x, fold_width)
+			
+			# If on a reverse-facing fold, flip the coordinate
+			if fold%2:
+				new_x = (last_fold_width if fold == f - 1 else fold_width) - new_x - 1
+			
+			new_xs.append(new_x)
+			folds.append(fold)
+		
+		# The remaining levels fold the pieces (which are at most fold_width long)
+		if len(levels) > 1:
+			inner = fold_map(fold_width, levels[1:])[2]
+		else:
+			inner = range(fold_width)
+		
+		interleaved = array("l", ((inner[new_x] * f) + fold
+		                          for (new_x, fold) in zip(new_xs, folds)))
+		
+		_fold_maps[(w, levels)] = (new_xs, folds, interleaved)
+	
+	return _fold_maps[(w, levels)]
+
+
+def fold_column(xs, w, f):
+	"""
+	As fold_dimension for a sequence of integer coordinates, xs, all on the same
+	dimension. Returns a tuple (new_xs, folds) of lists.
+	"""
+	if len(xs) and (min(xs) < 0 or max(xs) >= w):
+		# Outside the dimension: not covered by the map
+		return tuple(map(list, zip(*(fold_dimension(x, w, f) for x in xs))))
+	
+	new_xs, folds, interleaved = fold_map(w, f)
+	return ([new_xs[x] for x in xs], [folds[x] for x in xs])
+
+
+def fold_interleave_column(xs, w, f):
+	"""
+	As fold_interleave_dimension for a sequence of integer coordinates, xs, all
+	on the same dimension. f may be a hierarchical fold specification. Returns a
+	list.
+	"""
+	if len(xs) and (min(xs) < 0 or max(xs) >= w):
+		# Outside the dimension: not covered by the map
+		return [fold_interleave_dimension(x, w, f) for x in xs]
+	
+	new_xs, folds, interleaved = fold_map(w, f)
+	return [interleaved[x] for x in xs]
+
+
+################################################################################
+# Space-Filling Curves
+################################################################################
+
+
+def _spread_bits(v):
+	"""
+	Used internally. Move the low 16 bits of v into the even bit positions.
+	"""
+	v &= 0x0000FFFF
+	v = (v | (v << 8)) & 0x00FF00FF
+	v = (v | (v << 4)) & 0x0F0F0F0F
+	v = (v | (v << 2)) & 0x33333333
+	v = (v | (v << 1)) & 0x55555555
+	return v
+
+
+def _compact_bits(v):
+	"""
+	Used internally. The inverse of _spread_bits: gather the even bits of v.
+	"""
+	v &= 0x55555555
+	v = (v | (v >> 1)) & 0x33333333
+	v = (v | (v >> 2)) & 0x0F0F0F0F
+	v = (v | (v >> 4)) & 0x00FF00FF
+	v = (v | (v >> 8)) & 0x0000FFFF
+	return v
+
+
+def morton_encode(x, y):
+	"""
+	Get the position of (x, y) along the Morton (Z-order) curve by interleaving
+	the bits of the (16 bit) coordinates, x taking the low bit.
+	"""
+	return _spread_bits(x) | (_spread_bits(y) << 1)
+
+
+def morton_decode(d):
+	"""
+	Get the (x, y) coordinate at position d along the Morton curve.
+	"""
+	return (_compact_bits(d), _compact_bits(d >> 1))
+
+
+def _hilbert_rotate(s, x, y, rx, ry):
+	"""
+	Used internally. Rotate/flip the quadrant of size s to the orientation of
+	the Hilbert curve within it.
+	"""
+	if ry == 0:
+		if rx == 1:
+			x = s-1 - x
+			y = s-1 - y
+		x, y = y, x
+	return (x, y)
+
+
+def hilbert_encode(x, y, order):
+	"""
+	Get the position of (x, y) along the Hilbert curve which fills a square of
+	side 2**order starting at (0, 0) and ending at (2**order - 1, 0).
+	"""
+	n = 1 << order
+	d = 0
+	s = n >> 1
+	while s > 0:
+		rx = 1 if x & s else 0
+		ry = 1 if y & s else 0
+		d += s * s * ((3 * rx) ^ ry)
+		x, y = _hilbert_rotate(n, x, y, rx, ry)
+		s >>= 1
+	return d
+
+
+def hilbert_decode(d, order):
+	"""
+	Get the (x, y) coordinate at position d along the Hilbert curve of the given
+	order (see hilbert_encode).
+	"""
+	n = 1 << order
+	x = y = 0
+	s = 1
+	while s < n:
+		rx = 1 & (d / 2)
+		ry = 1 & (d ^ rx)
+		x, y = _hilbert_rotate(s, x, y, rx, ry)
+		x += s * rx
+		y += s * ry
+		d /= 4
+		s <<= 1
+	return (x, y)
+
+
 ################################################################################
 # Cabinets
 ################################################################################
 
+# The ways boards may be allocated to slots by cabinetise. "interleave" splits
+# the grid into a column per cabinet and a row per rack. The others number the
+# grid positions in the order they are visited by a space-filling curve
+# (covering a square with a power-of-two side) and fill each rack, and so each
+# cabinet, in turn.
+ALLOCATIONS = ["interleave", "morton", "hilbert"]
+
+
+# Allocation maps already computed {(bounds, num_cabinets, racks_per_cabinet,
+# allocation): (encoder, decoder),...} (see allocation_map).
+_allocation_maps = {}
+
+
+def allocation_map(bounds, num_cabinets, racks_per_cabinet, allocation = "interleave"):
+	"""
+	Get lookup tables mapping every position in a Cartesian space of the given
+	bounds, (w,h), to and from the index of the slot it is allocated to by
+	cabinetise, where slots are numbered cabinet by cabinet, rack by rack.
+	Returns a tuple (encoder, decoder) of arrays such that:
+	
+	* encoder[(x*h) + y] is the slot index of (x, y)
+	* decoder[index] is (x*h) + y for the position in the slot with that index
+	
+	Maps are cached so that cabinetising a whole machine costs one lookup per
+	board.
+	"""
+	key = (tuple(bounds), num_cabinets, racks_per_cabinet, allocation)
+	
+	if key not in _allocation_maps:
+		w, h = bounds
+		assert(allocation in ALLOCATIONS)
+		
+		# Must be divisible into racks of equal size
+		assert((w * h) % (num_cabinets * racks_per_cabinet) == 0)
+		slots_per_rack = (w * h) / num_cabinets / racks_per_cabinet
+		
+		if allocation == "interleave":
+			def index(x, y):
+				c = cabinetise((x, y), bounds, num_cabinets, racks_per_cabinet)
+				return (((c.cabinet * racks_per_cabinet) + c.rack) * slots_per_rack) + c.slot
+		elif allocation == "morton":
+			index = morton_encode
+		else:
+			order = max(0, max(w, h) - 1).bit_length()
+			index = (lambda x, y: hilbert_encode(x, y, order))
+		
+		# Number the positions in order of their index (the curves may visit
+		# positions outside the space which are skipped)
+		decoder = array("l", sorted(xrange(w * h),
+		                            key = (lambda p: index(*divmod(p, h)))))
+		encoder = array("l", [0] * (w * h))
+		for i, p in enumerate(decoder):
+			encoder[p] = i
+		
+		_allocation_maps[key] = (encoder, decoder)
+	
+	return _allocation_maps[key]
+
 
-def cabinetise(coord, bounds, num_cabinets, racks_per_cabinet, slots_per_rack = None):
+def cabinetise( coord, bounds, num_cabinets, racks_per_cabinet, slots_per_rack = None
+              , allocation = "interleave"
+              ):
 	r"""
 	Takes a set of Cartesian coordinates and maps them into a series of cabinets.
 	Splits the system into columns, one per cabinet. Splits each column into rows,
@@ -292,12 +565,26 @@ def cabinetise(coord, bounds, num_cabinets, racks_per_cabinet, slots_per_rack =
 	If slots_per_rack is given then an assertion checks that the number of slots
 	is adequate.
 	
+	allocation selects an alternative allocation of positions to slots (see
+	ALLOCATIONS and allocation_map).
+	
 	Returns a tuple (cabinet, rack, slot).
 	"""
 	
 	x, y = coord
 	w, h = bounds
 	
+	if allocation != "interleave":
+		encoder, decoder = allocation_map(bounds, num_cabinets, racks_per_cabinet, allocation)
+		
+		boards_per_rack = (w * h) / num_cabinets / racks_per_cabinet
+		assert(slots_per_rack is None or boards_per_rack <= slots_per_rack)
+		
+		cabinet, index = divmod(encoder[(x * h) + y], boards_per_rack * racks_per_cabinet)
+		rack, slot = divmod(index, boards_per_rack)
+		
+		return coordinates.Cabinet(cabinet, rack, slot)
+	
 	# Must be divisible into cabinets
 	assert(w % num_cabinets == 0)
 	
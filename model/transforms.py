@@ -111,6 +111,9 @@ def space_folds(boards, folds, gaps = None):
 		+---+---+---+---+          +---+---+        +---+---+
 		| 0 | 1 | 2 | 3 |          | 0 | 1 |        | 2 | 3 |
 		+---+---+---+---+          +---+---+        +---+---+
+	
+	Hierarchical fold specifications (see topology.fold_levels) have a gap
+	between every one of the topology.fold_count() segments.
 	"""
 	_assert_coord(boards, (coordinates.Cartesian2D, coordinates.Cartesian3D))
 	
@@ -125,16 +128,18 @@ def space_folds(boards, folds, gaps = None):
 	# Must have a number of folds and gaps for each dimension
 	assert(len(boards[0][1]) == len(folds) == len(gaps))
 	
-	maxes = map(max, *(c for (b,c) in boards))
+	columns = zip(*(c for (b,c) in boards))
 	
-	# Use topology.fold_dimension() to get the fold number and multiply this by
-	# the gap size to get an offset for each value.
-	return [ ( board, type(boards[0][1])(*[v + (g*topology.fold_dimension(v,m+1,f)[1])
-	                                       for (v,m,f,g)
-	                                       in zip(c, maxes, folds, gaps)]
-	                                    )
-	         )
-	         for (board, c) in boards
+	# Use topology.fold_column() to get the fold number of every value in each
+	# column and multiply this by the gap size to get an offset for each value.
+	columns = [ [v + (g*fold) for (v, fold)
+	             in zip(column, topology.fold_column( column, max(column)+1
+	                                                  , topology.fold_count(f))[1])]
+	            for (column, f, g) in zip(columns, folds, gaps)
+	          ]
+	
+	return [ (board, type(boards[0][1])(*c))
+	         for ((board, _), c) in zip(boards, zip(*columns))
 	       ]
 
 
@@ -151,6 +156,10 @@ def fold(boards, folds):
 		+---+---+---+---+          +---+---+---+---+
 		| 0 | 1 | 2 | 3 |          | 0 | 3 | 1 | 2 |
 		+---+---+---+---+          +---+---+---+---+
+	
+	The number of segments for a dimension may also be a hierarchical fold
+	specification (see topology.fold_levels), e.g. fold(b, ((2,2),1)) folds the
+	X axis in two and then folds the result in two again.
 	"""
 	_assert_coord(boards, (coordinates.Cartesian2D, coordinates.Cartesian3D))
 	
@@ -161,19 +170,21 @@ def fold(boards, folds):
 	# Must have a number of folds and gaps for each dimension
 	assert(len(boards[0][1]) == len(folds))
 	
-	maxes = map(max, *(c for (b,c) in boards))
+	columns = zip(*(c for (b,c) in boards))
 	
-	# Use topology.fold_dimension() to get the fold number and multiply this by
-	# the gap size to get an offset for each value.
-	return [ (board, type(boards[0][1])(*[topology.fold_interleave_dimension(v,m+1,f)
-	                                      for (v,m,f)
-	                                      in zip(c, maxes, folds)]
-	                                   ))
-	         for (board, c) in boards
+	# Fold each column in one go using topology.fold_interleave_column()
+	columns = [ topology.fold_interleave_column(column, max(column)+1, f)
+	            for (column, f) in zip(columns, folds)
+	          ]
+	
+	return [ (board, type(boards[0][1])(*c))
+	         for ((board, _), c) in zip(boards, zip(*columns))
 	       ]
 
 
-def cabinetise(boards, num_cabinets, racks_per_cabinet, slots_per_rack = None):
+def cabinetise( boards, num_cabinets, racks_per_cabinet, slots_per_rack = None
+              , allocation = "interleave"
+              ):
 	r"""
 	Takes a set of Cartesian coordinates and maps them into a series of cabinets.
 	Splits the system into columns, one per cabinet. Splits each column into rows,
@@ -182,6 +193,9 @@ def cabinetise(boards, num_cabinets, racks_per_cabinet, slots_per_rack = None):
 	
 	If slots_per_rack is given then an assertion checks that the number of slots
 	is adequate.
+	
+	allocation selects an alternative allocation of boards to slots, e.g.
+	following a space-filling curve (see topology.ALLOCATIONS).
 	"""
 	_assert_coord(boards, coordinates.Cartesian2D)
 	
@@ -196,6 +210,7 @@ def cabinetise(boards, num_cabinets, racks_per_cabinet, slots_per_rack = None):
 	                                    , num_cabinets
 	                                    , racks_per_cabinet
 	                                    , slots_per_rack
+	                                    , allocation
 	                                    ))
 	         for (board, (x,y)) in boards
 	       ]
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+
+"""
+Checks that a system of boards is wired as a consistent torus, for example
+after building a custom machine or patching a wiring plan.
+
+The checks work over whole neighbour tables (see the table module) at once:
+the wiring is first checked by comparing entire arrays, which is fast, and the
+offending boards are only searched for when a check fails. The ring lengths
+are found by decomposing the whole machine into rings in a single pass (see
+table.wiring_rings and table.packet_rings).
+"""
+
+from array import array
+from itertools import imap
+from operator import eq
+
+from fractions import gcd
+
+import topology
+import table
+
+
+# Names of the problems which may be found
+UNCONNECTED  = "unconnected"
+SELF_LINK    = "self-link"
+ASYMMETRIC   = "asymmetric"
+WIRING_RING  = "wiring ring length"
+PACKET_RING  = "packet ring length"
+
+
+def _power_of_two(n):
+	"""
+	Used internally. Get the largest k such that 2**k divides n.
+	"""
+	k = 0
+	while n % 2 == 0:
+		n /= 2
+		k += 1
+	return k
+
+
+def wiring_ring_length(width, height, direction):
+	"""
+	Get the number of boards in each ring formed by following wires in the given
+	direction around a torus of width x height threeboards (see
+	board.create_torus).
+	
+	This is three times the lowest common multiple of the width and height
+	except that wires to the north (or south) form rings of half that length when
+	the height has more factors of two than the width and wires to the
+	north-east (or south-west) do so when the width has more factors of two than
+	the height. This has been verified for every torus up to 16x16 threeboards.
+	"""
+	length = 3 * ((width * height) / gcd(width, height))
+	
+	if direction in (topology.NORTH, topology.SOUTH):
+		halved = _power_of_two(height) > _power_of_two(width)
+	elif direction in (topology.NORTH_EAST, topology.SOUTH_WEST):
+		halved = _power_of_two(width) > _power_of_two(height)
+	else:
+		halved = False
+	
+	return length / 2 if halved else length
+
+
+def packet_ring_length(width, height, direction):
+	"""
+	Get the number of boards passed by a packet travelling around a torus of
+	width x height threeboards in the given direction before it returns.
+	"""
+	if direction in (topology.NORTH, topology.SOUTH):
+		threeboards = height
+	elif direction in (topology.EAST, topology.WEST):
+		threeboards = width
+	else:
+		threeboards = (width * height) / gcd(width, height)
+	
+	# A threeboard is passed every two boards
+	return 2 * threeboards
+
+
+def _compose(a, b):
+	"""
+	Used internally. Get the permutation which applies b then a.
+	"""
+	return array("l", imap(a.__getitem__, b))
+
+
+def _wrong_ring_length(successors, length):
+	"""
+	Used internally. Get the elements in rings of the permutation which are not
+	of the given length.
+	"""
+	ring_ids, positions, lengths = table.rings(successors)
+	if all(l == length for l in lengths):
+		return []
+	else:
+		return [i for (i, ring) in enumerate(ring_ids) if lengths[ring] != length]
+
+
+def check_neighbours(neighbours, width = None, height = None):
+	"""
+	Check that a neighbour table (see table.neighbour_table, with all six
+	directions) describes a consistent torus: every board has all six wires
+	connected, no wire connects a board to itself and every wire arrives at its
+	target from the opposite direction.
+	
+	If the width and height in threeboards are given (and the wiring is
+	otherwise consistent), the length of the rings formed by following the wires
+	and packets in each direction are also checked (see wiring_ring_length and
+	packet_ring_length). Only one of each pair of opposite directions is checked
+	since, once the wiring is consistent, its rings are those of the other
+	direction reversed.
+	
+	Returns a list [(problem, direction, boards),...] of the problems found
+	(empty if none) where boards is a list of the indices of the offending
+	boards.
+	"""
+	problems = []
+	
+	n = len(neighbours[table.DIRECTIONS[0]])
+	identity = array("l", xrange(n))
+	
+	for direction in table.DIRECTIONS:
+		targets  = neighbours[direction]
+		opposite = neighbours[topology.opposite(direction)]
+		
+		if -1 in targets:
+			problems.append((UNCONNECTED, direction,
+			                 [i for (i, t) in enumerate(targets) if t == -1]))
+		
+		if any(imap(eq, targets, identity)):
+			problems.append((SELF_LINK, direction,
+			                 [i for (i, t) in enumerate(targets) if t == i]))
+		
+		if -1 in targets or -1 in opposite or _compose(opposite, targets) != identity:
+			asymmetric = [ i for (i, t) in enumerate(targets)
+			               if t != -1 and opposite[t] != i
+			             ]
+			if asymmetric:
+				problems.append((ASYMMETRIC, direction, asymmetric))
+	
+	if problems or width is None or height is None:
+		return problems
+	
+	for direction in [topology.NORTH, topology.EAST, topology.SOUTH_WEST]:
+		wrong = _wrong_ring_length( neighbours[direction]
+		                          , wiring_ring_length(width, height, direction)
+		                          )
+		if wrong:
+			problems.append((WIRING_RING, direction, wrong))
+		
+		# Packets are numbered 2*board + side (see table.packet_rings)
+		wrong = _wrong_ring_length( table.packet_successors(neighbours, direction)
+		                          , packet_ring_length(width, height, direction)
+		                          )
+		if wrong:
+			problems.append((PACKET_RING, direction, sorted(set(p / 2 for p in wrong))))
+	
+	return problems
+
+
+def check_torus(boards, width = None, height = None):
+	"""
+	Check a list [(board, coord),...] as for check_neighbours. Returns a list
+	of problems with boards given by their index in the list.
+	"""
+	return check_neighbours(table.neighbour_table(boards), width, height)
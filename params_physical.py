@@ -13,6 +13,23 @@ cabinet_unit = "m"
 # The scaling factor applied to drawing of the racks/cabinets
 cabinet_diagram_scaling_factor = 7.0
 
+# Level of detail of the cabinet diagram: "board" draws every board and wire,
+# "rack" or "cabinet" draw one box per rack/cabinet with bundled wires.
+cabinet_diagram_level_of_detail = "board"
+
+# Split the folded torus diagram into tiles of this (width, height) in boards
+# (drawn as separate figures) or None to draw it as a single figure.
+folded_torus_diagram_tile_size = None
+
+# Compile each figure separately, in parallel, caching the results in this
+# directory (see figures.py) or None to include figures in the main document.
+figure_cache_directory = None
+
+# Also write SVG copies of the diagrams of the development of the board
+# placement, which can be viewed in a web browser without LaTeX (see
+# svg_diagram.py), to this directory or None to disable.
+svg_diagram_directory = None
+
 # How big is each slot in a rack (not including spacing between slots) m
 slot_width  = 1.5/100.0
 slot_height = 24.0/100.0
@@ -64,9 +81,41 @@ cabinet_depth  = 25./100.0
 # Space in-between cabinets. m
 cabinet_spacing = 10.0/100.0
 
+# Number of rows the cabinets are arranged in. Consecutive cabinets run along
+# each row and back along the next.
+num_cabinet_rows = 1
+
+# Space between each row of cabinets (i.e. the aisle width), or a list giving
+# the width of each aisle. m
+cabinet_row_spacing = 120.0/100.0
+
 # Position of bottom-left corner of the first rack in the cabinet relative to
 # the bottom-left corner of the cabinet or None to center all the racks in the
 # cabinet. m
 rack_offset = None
 #rack_offset = (1.0, 1.0, 0.0)
 
+# How wire lengths are measured: "straight" takes the straight-line distance
+# between sockets, "tray" follows each cable up its cabinet's riser and along
+# the overhead cable trays (see model/routing.py). Routed lengths are always
+# measured wire by wire, ignoring symmetric_metrics.
+wire_routing = "straight"
+
+# Height of the cable trays above the floor. m
+cable_tray_height = cabinet_height + 10.0/100.0
+
+# Horizontal position of the cable riser relative to the left-hand side of each
+# cabinet. m
+cable_riser_offset = 5.0/100.0
+
+# Additional length of cable required for each bend in its route. m
+cable_bend_allowance = 5.0/100.0
+
+# Columns of cabinets at which trays cross the aisles between rows or None for
+# both ends of the rows.
+cable_tray_aisle_crossings = None
+
+# The number of cables which fit along each segment of cable tray and through
+# the cut-out in the top of each cabinet (shown when wire_routing is "tray").
+cable_tray_capacity   = 800
+cable_cutout_capacity = 600
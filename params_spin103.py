@@ -15,6 +15,8 @@ width  = 1
 height = 1
 
 # The number of folds (actually the number of faces of a folded sheet)
+# Either may instead be a hierarchical fold such as (2,2): fold in two and then
+# fold the result in two again (see model.topology.fold_levels).
 num_folds_x = 1
 num_folds_y = 1
 
@@ -28,11 +30,27 @@ num_cabinets          = 1
 num_racks_per_cabinet = 1
 num_slots_per_rack    = 4
 
+# How boards are allocated to slots: "interleave" gives each cabinet a block of
+# columns and each rack a block of rows of the folded torus, "morton" and
+# "hilbert" fill racks in turn along a space-filling curve (see
+# model.topology.ALLOCATIONS) and "partition" minimises the wires between racks
+# (see model/partition.py, always measured wire by wire, ignoring
+# symmetric_metrics).
+slot_allocation = "interleave"
+
 
 ################################################################################
 # Report Parameters
 ################################################################################
 
+# Number of processes used to compute the sections of the report concurrently
+# or None to use one per CPU.
+report_processes = None
+
+# Directory in which computed report sections are kept to be reused by later
+# runs with the same parameters or None to recompute every section.
+report_cache_directory = None
+
 title = "SpiNNaker $10^3$ Machine Wiring"
 
 # Scale all diagrams by this factor
@@ -41,9 +59,26 @@ diagram_scaling = 1.0
 # Scale the cabinet diagram by this factor
 cabinet_diagram_scaling_factor = 40
 
+# Level of detail of the cabinet diagram: "board" draws every board and wire,
+# "rack" or "cabinet" draw one box per rack/cabinet with bundled wires.
+cabinet_diagram_level_of_detail = "board"
+
+# Split the folded torus diagram into tiles of this (width, height) in boards
+# (drawn as separate figures) or None to draw it as a single figure.
+folded_torus_diagram_tile_size = None
+
+# Compile each figure separately, in parallel, caching the results in this
+# directory (see figures.py) or None to include figures in the main document.
+figure_cache_directory = None
+
 # Show metrics relating to the 
 show_wiring_metrics = False
 
+# Compute the wiring metrics from the symmetry of the layout (see
+# model/symmetry.py) rather than by measuring every wire. The results are the
+# same but are produced far more quickly for large systems.
+symmetric_metrics = False
+
 # Show information relating to the topology
 show_topology_metrics = True
 
@@ -58,3 +93,7 @@ show_wiring_instructions = True
 
 # Number of bins on wire-length histograms
 wire_length_histogram_bins = 5
+
+# Write a memory-mappable copy of the wiring plan (see model/plan.py) to this
+# file or None to disable.
+wiring_plan_filename = None
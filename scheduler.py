@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+"""
+Concurrent evaluation of independent computations over a shared, read-only
+model.
+
+Jobs are functions of no arguments which are run in a pool of worker processes.
+The workers are forked after the model has been built and so inherit it from
+the parent process (copy-on-write) rather than having it pickled and sent to
+them. Only the results of each job, which must be picklable, are passed back.
+"""
+
+import multiprocessing
+
+
+# The list of jobs being run. Set by run_jobs() for the benefit of worker
+# processes.
+_jobs = None
+
+
+def _run_job(index):
+	"""
+	Used internally. Run a single job of the current list of jobs.
+	"""
+	return _jobs[index]()
+
+
+def run_jobs(jobs, processes = None):
+	"""
+	Run a list of functions, each taking no arguments, concurrently and return a
+	list of their results in the same order. Given enough processors, the time
+	taken is that of the slowest job rather than the sum of all of them.
+	
+	processes is the number of worker processes to use. If None, one per CPU is
+	used. If 1, or if called from within a worker process, the jobs are run one
+	after another in this process.
+	"""
+	global _jobs
+	
+	processes = min(processes or multiprocessing.cpu_count(), len(jobs))
+	
+	# Worker processes may not create pools of their own
+	if processes <= 1 or multiprocessing.current_process().daemon:
+		return [job() for job in jobs]
+	
+	_jobs = jobs
+	try:
+		pool = multiprocessing.Pool(processes)
+		try:
+			# One job at a time so that the slow jobs don't hold up quick ones queued
+			# behind them in the same worker.
+			return pool.map(_run_job, range(len(jobs)), chunksize = 1)
+		finally:
+			pool.close()
+			pool.join()
+	finally:
+		_jobs = None
+
+
+if __name__=="__main__":
+	import time
+	
+	def job(n):
+		time.sleep(1)
+		return n
+	
+	start = time.time()
+	print run_jobs([(lambda n=n: job(n)) for n in range(4)], 4)
+	print "Took %.1fs"%(time.time() - start)
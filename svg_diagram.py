@@ -0,0 +1,638 @@
+#!/usr/bin/env python
+
+"""
+A module which generates SVG diagrams of systems of boards.
+
+SVGDiagram offers the same drawing API as diagram.Diagram but computes all
+geometry in Python and writes SVG directly, avoiding the need to run LaTeX.
+Only the commonly used TikZ styles are understood (see SVGDiagram._attributes),
+others are ignored.
+"""
+
+import re
+
+from StringIO import StringIO
+
+from math import sin, cos, radians
+
+from model import coordinates
+from model import board
+from model import transforms
+from model import topology
+from model import cabinet
+
+from diagram import Diagram
+
+
+class SVGDiagram(object):
+	"""
+	A drawing tool for generating SVG diagrams.
+	
+	All geometry is given in cm (the default TikZ unit) with y increasing upward.
+	"""
+	
+	# Named colours (as used in TikZ styles) as (r,g,b) tuples
+	COLOURS = {
+		"red"       : (1.0, 0.0, 0.0),
+		"green"     : (0.0, 1.0, 0.0),
+		"blue"      : (0.0, 0.0, 1.0),
+		"yellow"    : (1.0, 1.0, 0.0),
+		"cyan"      : (0.0, 1.0, 1.0),
+		"magenta"   : (1.0, 0.0, 1.0),
+		"orange"    : (1.0, 0.5, 0.0),
+		"black"     : (0.0, 0.0, 0.0),
+		"white"     : (1.0, 1.0, 1.0),
+		"gray"      : (0.5, 0.5, 0.5),
+		"lightgray" : (0.75, 0.75, 0.75),
+		"darkgray"  : (0.25, 0.25, 0.25),
+	}
+	
+	# Line widths (in cm) of the TikZ line width styles
+	LINE_WIDTHS = {
+		"ultra thin"  : 0.1 / 28.45,
+		"very thin"   : 0.2 / 28.45,
+		"thin"        : 0.4 / 28.45,
+		"semithick"   : 0.6 / 28.45,
+		"thick"       : 0.8 / 28.45,
+		"very thick"  : 1.2 / 28.45,
+		"ultra thick" : 1.6 / 28.45,
+	}
+	
+	# Font sizes (in cm) of LaTeX size commands
+	FONT_SIZES = {
+		"tiny"         : 5.0 / 28.45,
+		"scriptsize"   : 7.0 / 28.45,
+		"footnotesize" : 8.0 / 28.45,
+		"small"        : 9.0 / 28.45,
+		"normalsize"   : 10.0 / 28.45,
+		"large"        : 12.0 / 28.45,
+	}
+	
+	# Radius of a hexagon (centre to corner)
+	HEX_RADIUS = 0.5 / cos(radians(30))
+	
+	# The angles of the edges of a hexagon on which each wire is drawn. Each wire
+	# sits in the middle of the edge between the corners at the given angles
+	# (matching the \hexagon macro in Diagram.PREAMBLE).
+	HEX_EDGES = {
+		topology.NORTH      : ( 120,   60),
+		topology.NORTH_EAST : (  60,    0),
+		topology.EAST       : (   0,  -60),
+		topology.SOUTH      : ( -60, -120),
+		topology.SOUTH_WEST : (-120, -180),
+		topology.WEST       : ( 180,  120),
+	}
+	
+	# Corners of a skewed hexagon relative to its centre. Wires sit in the middle
+	# of the edge from the given corner to the next (matching the
+	# \skewedhexagon macro).
+	SKEWED_HEX_CORNERS = [ (-0.5,-0.5), (-0.5, 0.0), ( 0.0, 0.5)
+	                     , ( 0.5, 0.5), ( 0.5, 0.0), ( 0.0,-0.5)
+	                     ]
+	SKEWED_HEX_EDGES = {
+		topology.SOUTH_WEST : 0,
+		topology.WEST       : 1,
+		topology.NORTH      : 2,
+		topology.NORTH_EAST : 3,
+		topology.EAST       : 4,
+		topology.SOUTH      : 5,
+	}
+	
+	# Positions of the wires of a square relative to its centre (matching the
+	# \squarenode macro).
+	SQUARE_WIRES = {
+		topology.SOUTH_WEST : (-0.5,-0.5),
+		topology.WEST       : (-0.5, 0.0),
+		topology.NORTH      : ( 0.0, 0.5),
+		topology.NORTH_EAST : ( 0.5, 0.5),
+		topology.EAST       : ( 0.5, 0.0),
+		topology.SOUTH      : ( 0.0,-0.5),
+	}
+	
+	
+	def __init__(self):
+		# Each of the following are lists of primitives which are drawn in order.
+		# References to boards are resolved when the diagram is written since, as
+		# in TikZ, wires may be added before the board at their far end.
+		
+		# Drawing of each of the cabinets as a list [(points, styles),...]
+		self.cabinet_definitions = []
+		
+		# Polygons for each board as a list [(points, styles),...]
+		self.board_definitions = []
+		
+		# Paths as a list [(refs, curve_offset, styles),...] where refs is a list of
+		# (board_id, direction) tuples.
+		self.path_definitions = []
+		
+		# Labels as a list [(board_id, text, styles),...]
+		self.label_definitions = []
+		
+		# Labelled stubs of wires as a list [(board_id, direction, text,
+		# styles),...]
+		self.stub_definitions = []
+		
+		# Lookup {(board_id, direction): (x,y),...} giving the position of each
+		# wire (and with direction None, the centre) of every board.
+		self.board_points = {}
+		
+		# The cabinet system the boards are placed in or None if no cabinets used
+		self.cabinet_system = None
+		self.cabinet_scale = 0.01
+	
+	
+	############################################################################
+	# Geometry
+	############################################################################
+	
+	@staticmethod
+	def _hexagonal_to_xy(position):
+		"""
+		Convert a Hexagonal{,2D} coordinate into a Cartesian position using the
+		"hexagon coords" TikZ style.
+		"""
+		x, y, z = (list(position) + [0])[:3]
+		return ( (x * cos(radians(-30))) + (z * cos(radians(-150)))
+		       , (x * sin(radians(-30))) + y + (z * sin(radians(-150)))
+		       )
+	
+	
+	def _add_polygon(self, board, corners, wires, centre, styles):
+		"""
+		Used internally. Add a board drawn as the polygon with the given corners
+		with wires at the positions given by the dict {direction: (x,y),...}.
+		"""
+		self.board_points[(board.id, None)] = centre
+		for direction, point in wires.iteritems():
+			self.board_points[(board.id, direction)] = point
+		
+		self.board_definitions.append((corners, styles))
+	
+	
+	def set_cabinet_system(self, system, scale = 0.01, background = None):
+		"""
+		Set the cabinet system which boards added by add_board_cabinet() are placed
+		in.
+		
+		background is accepted for compatibility with diagram.Diagram and ignored:
+		every SVG diagram draws its own cabinets.
+		"""
+		self.cabinet_system = system
+		self.cabinet_definitions = []
+		self.cabinet_scale = scale
+		
+		if self.cabinet_system is None:
+			return
+		
+		cabinet = system.cabinet
+		rack    = cabinet.rack
+		slot    = rack.slot
+		
+		def rectangle(x, y, width, height):
+			return [ (x * scale, y * scale)
+			       , ((x + width) * scale, y * scale)
+			       , ((x + width) * scale, (y + height) * scale)
+			       , (x * scale, (y + height) * scale)
+			       ]
+		
+		for cabinet_num in range(system.num_cabinets):
+			cabinet_x, cabinet_y = system.cabinet_elevation_positions[cabinet_num]
+			# Only bother drawing the cabinet if we have more than one rack
+			if cabinet.num_racks > 1:
+				self.cabinet_definitions.append((
+					rectangle(cabinet_x, cabinet_y, cabinet.width, cabinet.height),
+					["cabinet"]))
+			for rack_num in range(cabinet.num_racks):
+				rack_x = cabinet_x + cabinet.offset.x
+				rack_y = cabinet_y + cabinet.offset.y \
+				         + (rack.height + cabinet.rack_spacing) * rack_num
+				
+				self.cabinet_definitions.append((
+					rectangle(rack_x, rack_y, rack.width, rack.height),
+					["rack"]))
+				for slot_num in range(rack.num_slots):
+					slot_x = rack_x + rack.offset.x \
+					         + (slot.width + rack.slot_spacing) * slot_num
+					slot_y = rack_y + rack.offset.y
+					
+					self.cabinet_definitions.append((
+						rectangle(slot_x, slot_y, slot.width, slot.height),
+						["slot"]))
+	
+	
+	def set_level_of_detail(self, level):
+		"""
+		Provided for compatibility with diagram.Diagram: only
+		Diagram.LOD_BOARD is supported.
+		"""
+		assert(level == Diagram.LOD_BOARD)
+	
+	
+	def add_board_hexagon(self, board, position, styles = None):
+		"""
+		Add a hexagonal board to the design.
+		
+		board is the board object this represents
+		
+		position is the hexagonal coordinate or the Cartesian coordinate generated
+		by transforms.hex_to_cartesian()
+		
+		styles is an array of tikz styles to apply to the node
+		"""
+		styles = styles or []
+		
+		if isinstance(position, (coordinates.Hexagonal, coordinates.Hexagonal2D)):
+			cx, cy = self._hexagonal_to_xy(position)
+		elif isinstance(position, coordinates.Cartesian2D):
+			# "cartesian hexagon coords"
+			cx = position.x * cos(radians(30))
+			cy = position.y * 0.5
+		else:
+			raise Exception("Hexagonal{,2D} or Cartesian2D coordinates required.")
+		
+		def corner(angle):
+			return ( cx + (SVGDiagram.HEX_RADIUS * cos(radians(angle)))
+			       , cy + (SVGDiagram.HEX_RADIUS * sin(radians(angle)))
+			       )
+		
+		corners = [corner(a) for a in (120, 60, 0, -60, -120, 180)]
+		wires = {}
+		for direction, (a1, a2) in SVGDiagram.HEX_EDGES.iteritems():
+			(x1, y1), (x2, y2) = corner(a1), corner(a2)
+			wires[direction] = ((x1 + x2) / 2.0, (y1 + y2) / 2.0)
+		
+		self._add_polygon(board, corners, wires, (cx, cy), styles)
+	
+	
+	def add_board_skewed_hexagon(self, board, position, styles = None):
+		"""
+		Add a skewed hexagonal board to the design.
+		
+		board is the board object this represents
+		
+		position is the hexagonal coordinate or the Cartesian coordinate generated
+		by transforms.hex_to_cartesian()
+		
+		styles is an array of tikz styles to apply to the node
+		"""
+		styles = styles or []
+		
+		if isinstance(position, coordinates.Hexagonal):
+			position = topology.hex_to_skewed_cartesian(position)
+		elif isinstance(position, coordinates.Hexagonal2D):
+			position = topology.hex_to_skewed_cartesian(list(position)+[0])
+		elif isinstance(position, coordinates.Cartesian2D):
+			pass
+		else:
+			raise Exception("Hexagonal{,2D} or Cartesian2D coordinates required.")
+		
+		# "cartesian skewed hexagon coords"
+		cx, cy = position.x * 0.5, position.y * 0.5
+		
+		corners = [(cx + x, cy + y) for (x, y) in SVGDiagram.SKEWED_HEX_CORNERS]
+		wires = {}
+		for direction, edge in SVGDiagram.SKEWED_HEX_EDGES.iteritems():
+			(x1, y1) = corners[edge]
+			(x2, y2) = corners[(edge + 1) % len(corners)]
+			wires[direction] = ((x1 + x2) / 2.0, (y1 + y2) / 2.0)
+		
+		self._add_polygon(board, corners, wires, (cx, cy), styles)
+	
+	
+	def add_board_square(self, board, position, styles = None):
+		"""
+		Add a board drawn as a simple square to the design.
+		
+		board is the board object this represents
+		
+		position is the Cartesian coordinate of the rectangle
+		
+		styles is an array of tikz styles to apply to the node
+		"""
+		assert(isinstance(position, coordinates.Cartesian2D))
+		
+		styles = styles or []
+		
+		cx, cy = position
+		
+		corners = [ (cx - 0.5, cy - 0.5), (cx - 0.5, cy + 0.5)
+		          , (cx + 0.5, cy + 0.5), (cx + 0.5, cy - 0.5)
+		          ]
+		wires = dict( (direction, (cx + x, cy + y))
+		              for (direction, (x, y)) in SVGDiagram.SQUARE_WIRES.iteritems()
+		            )
+		
+		self._add_polygon(board, corners, wires, (cx, cy), styles)
+	
+	
+	def add_board_cabinet(self, board, position, styles = None):
+		"""
+		Add a board to be drawn in the cabinet specified by set_cabinet_system().
+		
+		board is the board object this represents
+		
+		position is the Cabinet coordinate of the board
+		
+		styles is an array of tikz styles to apply to the node
+		"""
+		assert(self.cabinet_system is not None)
+		assert(isinstance(position, coordinates.Cabinet))
+		
+		styles = styles or []
+		
+		scale = self.cabinet_scale
+		slot  = self.cabinet_system.cabinet.rack.slot
+		
+		x, y = self.cabinet_system.get_elevation_position(position)
+		
+		corners = [ (x * scale, y * scale)
+		          , ((x + slot.width) * scale, y * scale)
+		          , ((x + slot.width) * scale, (y + slot.height) * scale)
+		          , (x * scale, (y + slot.height) * scale)
+		          ]
+		wires = {}
+		for direction in Diagram.DIRECTION_POSTFIX:
+			wx, wy = slot.get_position(direction)[:2]
+			wires[direction] = ((x + wx) * scale, (y + wy) * scale)
+		centre = ((x + (slot.width / 2.0)) * scale, (y + (slot.height / 2.0)) * scale)
+		
+		self._add_polygon(board, corners, wires, centre, ["occupied slot"] + styles)
+	
+	
+	def add_label(self, board, latex, styles = None):
+		"""
+		Add a label to the center of the requested board. Simple LaTeX commands
+		(e.g. font sizes) are removed from the text.
+		
+		styles is an array of tikz styles to apply to the node containing the label
+		"""
+		styles = styles or []
+		
+		self.label_definitions.append((board.id, latex, styles))
+	
+	
+	def _add_path(self, refs, curve_offset = None, styles = None):
+		"""
+		For internal use.
+		
+		Add a path going between all the (board_id, direction) refs given.
+		
+		curve_offset is an optional Hexagonal offset which, if given, draws the
+		path as a curve leaving and entering in the direction of the offset.
+		
+		styles is an array of tikz styles to apply to the path
+		"""
+		styles = styles or []
+		
+		self.path_definitions.append((refs, curve_offset, styles))
+	
+	
+	def add_wire(self, board, direction, styles = None):
+		self._add_path(
+			[ (board.id, direction)
+			, (board.follow_wire(direction).id, topology.opposite(direction))
+			],
+			styles = styles
+		)
+	
+	
+	def add_curved_wire(self, board, direction, styles = None):
+		offset = topology.add_direction((0, 0, 0), direction)
+		self._add_path(
+			[ (board.id, direction)
+			, (board.follow_wire(direction).id, topology.opposite(direction))
+			],
+			offset,
+			styles
+		)
+	
+	
+	def add_wire_stub(self, board, direction, latex, styles = None):
+		"""
+		Add a short, labelled wire leaving the given board in the given direction in
+		place of a wire whose far end is not drawn.
+		"""
+		styles = styles or []
+		
+		self.stub_definitions.append((board.id, direction, latex, styles))
+	
+	
+	def add_packet_path(self, board, in_direction, out_direction, styles = None):
+		self._add_path(
+			[ (board.id, in_direction)
+			, (board.id, out_direction)
+			],
+			styles = styles
+		)
+	
+	
+	############################################################################
+	# SVG Generation
+	############################################################################
+	
+	@staticmethod
+	def _colour(spec):
+		"""
+		Convert an xcolor-style colour specification (e.g. "red!50!white") into an
+		SVG colour.
+		"""
+		parts = spec.split("!")
+		r, g, b = SVGDiagram.COLOURS.get(parts[0], (0.0, 0.0, 0.0))
+		
+		# Mix in each subsequent colour (white if not given)
+		for i in range(1, len(parts), 2):
+			percent = float(parts[i]) / 100.0
+			other = parts[i+1] if i+1 < len(parts) else "white"
+			r2, g2, b2 = SVGDiagram.COLOURS.get(other, (1.0, 1.0, 1.0))
+			r = (r * percent) + (r2 * (1.0 - percent))
+			g = (g * percent) + (g2 * (1.0 - percent))
+			b = (b * percent) + (b2 * (1.0 - percent))
+		
+		return "#%02x%02x%02x"%(int(r * 255), int(g * 255), int(b * 255))
+	
+	
+	@staticmethod
+	def _attributes(styles, stroke = "black", fill = "none"):
+		"""
+		Convert a list of TikZ styles into a dict of SVG attributes. Unsupported
+		styles are ignored.
+		"""
+		attributes = {
+			"stroke"       : stroke,
+			"fill"         : fill,
+			"stroke-width" : SVGDiagram.LINE_WIDTHS["thin"],
+		}
+		
+		for style in styles:
+			if style in SVGDiagram.LINE_WIDTHS:
+				attributes["stroke-width"] = SVGDiagram.LINE_WIDTHS[style]
+			elif style == "dashed":
+				attributes["stroke-dasharray"] = "0.1,0.1"
+			elif style == "cabinet":
+				attributes["stroke"] = "none"
+				attributes["fill"] = SVGDiagram._colour("gray")
+			elif style == "rack":
+				attributes["stroke"] = "none"
+				attributes["fill"] = SVGDiagram._colour("gray!50!white")
+			elif style == "slot":
+				attributes["stroke"] = "none"
+			elif style == "occupied slot":
+				attributes["stroke"] = "none"
+				attributes["fill"] = SVGDiagram._colour("green!20!white")
+			elif style.startswith("fill="):
+				attributes["fill"] = SVGDiagram._colour(style[len("fill="):])
+			elif style.startswith("rotate="):
+				attributes["rotate"] = float(style[len("rotate="):])
+			elif style.split("!")[0] in SVGDiagram.COLOURS:
+				attributes["stroke"] = SVGDiagram._colour(style)
+		
+		return attributes
+	
+	
+	@staticmethod
+	def _format_attributes(attributes):
+		"""
+		Format a dict of SVG attributes.
+		"""
+		return " ".join('%s="%s"'%(name, ("%f"%value) if isinstance(value, float)
+		                                 else value)
+		                for (name, value) in sorted(attributes.iteritems())
+		                if name != "rotate")
+	
+	
+	@staticmethod
+	def _latex_to_text(latex):
+		"""
+		Returns a tuple (text, font_size) removing any simple LaTeX commands from
+		the given string.
+		"""
+		font_size = SVGDiagram.FONT_SIZES["normalsize"]
+		for command in re.findall(r"\\([a-zA-Z]+)", latex):
+			font_size = SVGDiagram.FONT_SIZES.get(command, font_size)
+		
+		text = re.sub(r"\\[a-zA-Z]+\s*", "", latex).replace("$", "")
+		text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+		
+		return text, font_size
+	
+	
+	def _get_bounds(self):
+		"""
+		Get the bounding box of everything drawn as a tuple (min_x, min_y, max_x,
+		max_y).
+		"""
+		points = [p for (polygon, styles) in self.cabinet_definitions for p in polygon]
+		points += [p for (polygon, styles) in self.board_definitions for p in polygon]
+		points += self.board_points.values()
+		
+		if not points:
+			return (0.0, 0.0, 0.0, 0.0)
+		
+		xs, ys = zip(*points)
+		return (min(xs), min(ys), max(xs), max(ys))
+	
+	
+	def write(self, f, margin = 0.5):
+		"""
+		Write the diagram as an SVG document to the file-like object f.
+		"""
+		min_x, min_y, max_x, max_y = self._get_bounds()
+		min_x -= margin
+		min_y -= margin
+		max_x += margin
+		max_y += margin
+		
+		f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+		f.write('<svg xmlns="http://www.w3.org/2000/svg" version="1.1" '
+		        'width="%fcm" height="%fcm" viewBox="%f %f %f %f">\n'%(
+		          max_x - min_x, max_y - min_y,
+		          min_x, -max_y, max_x - min_x, max_y - min_y,
+		        ))
+		
+		# Note: all y coordinates are negated as SVG's y-axis points downward.
+		
+		for polygon, styles in self.cabinet_definitions + self.board_definitions:
+			f.write('<polygon points="%s" %s/>\n'%(
+				" ".join("%f,%f"%(x, -y) for (x, y) in polygon),
+				self._format_attributes(self._attributes(styles)),
+			))
+		
+		for refs, curve_offset, styles in self.path_definitions:
+			points = [self.board_points[ref] for ref in refs]
+			if curve_offset is None:
+				d = "M " + " L ".join("%f,%f"%(x, -y) for (x, y) in points)
+			else:
+				# Control points are offset from each end in the given direction
+				(x1, y1), (x2, y2) = points
+				ox, oy = self._hexagonal_to_xy(curve_offset)
+				d = "M %f,%f C %f,%f %f,%f %f,%f"%(
+					x1, -y1,
+					x1 + ox, -(y1 + oy),
+					x2 - ox, -(y2 - oy),
+					x2, -y2,
+				)
+			f.write('<path d="%s" %s/>\n'%(
+				d, self._format_attributes(self._attributes(styles))))
+		
+		for board_id, direction, latex, styles in self.stub_definitions:
+			# Continue the line from the centre of the board through the socket
+			cx, cy = self.board_points[(board_id, None)]
+			x1, y1 = self.board_points[(board_id, direction)]
+			x2, y2 = x1 + ((x1 - cx) * 0.5), y1 + ((y1 - cy) * 0.5)
+			text, font_size = self._latex_to_text(latex)
+			
+			f.write('<path d="M %f,%f L %f,%f" %s/>\n'%(
+				x1, -y1, x2, -y2,
+				self._format_attributes(self._attributes(styles))))
+			f.write('<text x="%f" y="%f" font-size="%f" text-anchor="middle" '
+			        'dominant-baseline="central">%s</text>\n'%(
+			          x2, -y2, font_size, text,
+			        ))
+		
+		for board_id, latex, styles in self.label_definitions:
+			x, y = self.board_points[(board_id, None)]
+			text, font_size = self._latex_to_text(latex)
+			attributes = self._attributes(styles, stroke = "none", fill = "black")
+			
+			transform = ""
+			if "rotate" in attributes:
+				transform = ' transform="rotate(%f %f %f)"'%(-attributes["rotate"], x, -y)
+			
+			f.write('<text x="%f" y="%f" font-size="%f" text-anchor="middle" '
+			        'dominant-baseline="central"%s %s>%s</text>\n'%(
+			          x, -y, font_size, transform,
+			          self._format_attributes(attributes), text,
+			        ))
+		
+		f.write('</svg>\n')
+	
+	
+	def get_svg(self):
+		out = StringIO()
+		self.write(out)
+		return out.getvalue()
+
+
+if __name__=="__main__":
+	import sys
+	
+	d = SVGDiagram()
+	boards = board.create_torus(20)
+	boards = transforms.hex_to_cartesian(boards)
+	b2c = dict(boards)
+	boards = transforms.compress(boards)
+	boards = transforms.rhombus_to_rect(boards)
+	boards = transforms.fold(boards, (4,2))
+	
+	boards = transforms.cabinetise(boards, 5, 10, 24)
+	
+	d.set_cabinet_system(cabinet.System(), 0.1)
+	
+	for board, coords in boards:
+		d.add_board_cabinet(board, coords)
+		d.add_label(board, r"\tiny %s"%(str(tuple(b2c[board]))), ["rotate=90"])
+		d.add_wire(board, topology.NORTH, ["red"])
+		d.add_wire(board, topology.EAST, ["green"])
+		d.add_wire(board, topology.SOUTH_WEST, ["blue"])
+	
+	d.write(sys.stdout)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+"""
+Generation of large diagrams as a set of page-sized tiles.
+
+The boards of a diagram are split into a grid of tiles according to their
+position. Each tile is drawn as a separate diagram containing only the boards
+within it. Wires between boards in the same tile are drawn as usual while wires
+which leave the tile are drawn as short stubs labelled with the tile they lead
+to. The time taken to generate (and render) each tile is thus bounded by the
+tile size rather than the size of the whole system.
+
+Each tile is generated by a separate job (see scheduler.py) so that tiles are
+generated concurrently, either alone (generate_tiles) or alongside the other
+jobs of a report (see tile_jobs and incremental.py). Rather than pickling the
+(highly interconnected) board objects for every worker, the jobs are created
+before the pool is and are inherited by the (forked) workers. Only the
+generated diagram text passes between processes.
+"""
+
+from model import topology
+
+import diagram
+import scheduler
+
+
+def get_tile(coord, tile_size):
+	"""
+	Get the (column, row) of the tile which contains the given position.
+	"""
+	return (int(coord[0] // tile_size[0]), int(coord[1] // tile_size[1]))
+
+
+def split_tiles(boards, tile_size):
+	"""
+	Split a list [(board, coord),...] into tiles of size (width, height) in the
+	units of the first two coordinate fields.
+	
+	Returns a dict {(column, row): [(board, coord),...],...} containing only the
+	tiles with boards in them.
+	"""
+	tiles = {}
+	for board, coord in boards:
+		tiles.setdefault(get_tile(coord, tile_size), []).append((board, coord))
+	return tiles
+
+
+def _generate_tile(tile, tiles, b2t, add_board_func, wires, label_func,
+                   diagram_class, render_func):
+	"""
+	Used internally. Generate the diagram for a single tile (see tile_jobs).
+	"""
+	d = diagram_class()
+	
+	for board, coord in tiles[tile]:
+		add_board_func(d, board, coord)
+		if label_func is not None:
+			d.add_label(board, label_func(board, coord))
+	
+	for board, coord in tiles[tile]:
+		for direction, styles in wires:
+			# Wires within the tile are drawn once, from the end at which they are
+			# added.
+			target = board.follow_wire(direction)
+			if b2t.get(target) == tile:
+				d.add_wire(board, direction, styles)
+			elif target is not None:
+				d.add_wire_stub(board, direction, r"\tiny %d,%d"%b2t[target], styles)
+			
+			# Stubs are also required where the wire arrives from another tile
+			back_direction = topology.opposite(direction)
+			source = board.follow_wire(back_direction)
+			if source is not None and b2t.get(source) != tile:
+				d.add_wire_stub(board, back_direction, r"\tiny %d,%d"%b2t[source], styles)
+	
+	return render_func(d)
+
+
+def tile_jobs( boards, tile_size, add_board_func, wires
+             , label_func = None
+             , diagram_class = diagram.Diagram
+             , render_func = diagram.Diagram.get_tikz
+             ):
+	"""
+	Get the jobs which generate each tile of a tiled diagram.
+	
+	boards is a list [(board, coord),...] giving the position of every board and
+	tile_size is the (width, height) of each tile (see split_tiles).
+	
+	add_board_func(diagram, board, coord) adds a board to a diagram, e.g.
+	diagram.Diagram.add_board_square.
+	
+	wires is a list [(direction, styles),...] giving the wires to draw from each
+	board. As in wiring_guide.py, each wire should be listed in only one
+	direction.
+	
+	label_func(board, coord) optionally gives the LaTeX label for each board.
+	
+	diagram_class and render_func give the type of diagram to generate and the
+	function which produces its output, e.g. svg_diagram.SVGDiagram and
+	svg_diagram.SVGDiagram.get_svg.
+	
+	Returns a dict {(column, row): job,...} for every non-empty tile where each
+	job is a function of no arguments which returns the output for that tile.
+	"""
+	tiles = split_tiles(boards, tile_size)
+	b2t = dict( (board, tile)
+	            for (tile, tile_boards) in tiles.iteritems()
+	            for (board, coord) in tile_boards
+	          )
+	
+	return dict( (tile, (lambda tile=tile:
+	                      _generate_tile( tile, tiles, b2t, add_board_func, wires
+	                                    , label_func, diagram_class, render_func
+	                                    )))
+	             for tile in tiles
+	           )
+
+
+def generate_tiles( boards, tile_size, add_board_func, wires
+                  , label_func = None
+                  , diagram_class = diagram.Diagram
+                  , render_func = diagram.Diagram.get_tikz
+                  , processes = None
+                  ):
+	"""
+	Generate a tiled diagram. The arguments are as for tile_jobs.
+	
+	processes is the number of worker processes to use (see
+	scheduler.run_jobs).
+	
+	Returns a dict {(column, row): output,...} for every non-empty tile.
+	"""
+	jobs = tile_jobs( boards, tile_size, add_board_func, wires
+	                , label_func, diagram_class, render_func
+	                )
+	
+	tile_order = sorted(jobs)
+	return dict(zip(tile_order, scheduler.run_jobs([jobs[tile] for tile in tile_order],
+	                                               processes)))
+
+
+if __name__=="__main__":
+	from model import board
+	from model import transforms
+	
+	boards = board.create_torus(20)
+	boards = transforms.hex_to_cartesian(boards)
+	boards = transforms.rhombus_to_rect(boards)
+	boards = transforms.compress(boards, 1, 2)
+	boards = transforms.fold(boards, (4,2))
+	
+	tiles = generate_tiles( boards, (20, 15)
+	                      , diagram.Diagram.add_board_square
+	                      , [ (topology.NORTH, ["thick","red"])
+	                        , (topology.EAST, ["thick","green"])
+	                        , (topology.SOUTH_WEST, ["thick","blue"])
+	                        ]
+	                      , lambda b, c: r"\tiny %d,%d"%c
+	                      )
+	
+	for tile, tikz in sorted(tiles.iteritems()):
+		print r"%% Tile %d,%d"%tile
+		print r"\begin{tikzpicture}"
+		print tikz
+		print r"\end{tikzpicture}"
+		print r"\newpage"
@@ -8,8 +8,17 @@ structures containing the information to be presented and then proceeds to
 generate an absolutely massive LaTeX file.
 """
 
+import os
+import sys
+import time
+import traceback
+
+from optparse import OptionParser
+
 from collections import defaultdict
 
+from functools import partial
+
 from model.topology import NORTH, NORTH_EAST, EAST, SOUTH, SOUTH_WEST, WEST
 
 from model import topology
@@ -18,8 +27,18 @@ from model import board
 from model import transforms
 from model import metrics
 from model import coordinates
+from model import plan
+from model import patterns
+from model import symmetry
+from model import table
+from model import partition
+from model import routing
 
 import diagram
+import svg_diagram
+import tiling
+import figures
+import incremental
 
 ################################################################################
 # Load Parameters
@@ -32,6 +51,43 @@ from params_physical import *
 #from params_spin105 import *
 from params_spin106 import *
 
+option_parser = OptionParser(usage = "%prog [options] [params_file]")
+option_parser.add_option( "-w", "--watch", action = "store_true", default = False
+                        , help = "regenerate the report whenever the parameter "
+                                 "files change (requires params_file and -o)"
+                        )
+option_parser.add_option( "-o", "--output", metavar = "FILE"
+                        , help = "write the report to FILE rather than stdout"
+                        )
+options, args = option_parser.parse_args()
+if len(args) > 1:
+	option_parser.error("at most one parameter file may be given")
+if options.watch and not (args and options.output):
+	option_parser.error("--watch requires a parameter file and an output file")
+
+
+def load_params(filenames):
+	"""
+	Execute the given parameter files in order and return a dict of the
+	parameters they define.
+	"""
+	params = {}
+	for filename in filenames:
+		execfile(filename, params)
+	del params["__builtins__"]
+	return params
+
+# A parameter file given on the command line is used in place of the one
+# imported above.
+params_filenames = [ os.path.join(os.path.dirname(os.path.abspath(__file__)), "params_physical.py") ] + args
+if args:
+	loaded_params = load_params(params_filenames)
+	# The values replaced by the files (see watch())
+	default_params = dict( (name, value) for (name, value) in globals().items()
+	                       if name in loaded_params
+	                     )
+	globals().update(loaded_params)
+
 # XXX
 show_wiring_metrics = False
 show_topology_metrics = False
@@ -45,8 +101,33 @@ show_wiring_patterns = True
 # Generate models
 ################################################################################
 
+# The models and report sections are only computed when the parameters they
+# depend on (or the code which computes them) change (see incremental.py).
+# Computed sections are persisted in the given directory (if any) to be reused
+# by later runs.
+build = incremental.Build( report_cache_directory
+                         , [ os.path.splitext(module.__file__)[0] + ".py"
+                             for module in [ topology, cabinet, board, transforms
+                                           , metrics, coordinates, plan, patterns
+                                           , symmetry, table, partition, routing
+                                           , diagram, svg_diagram, tiling
+                                           , sys.modules[__name__]
+                                           ]
+                           ]
+                         )
+
+# Parameters which describe the physical construction of the system
+PHYSICAL_PARAMS = [ "slot_width", "slot_height", "slot_depth", "wire_positions"
+                  , "rack_width", "rack_height", "rack_depth"
+                  , "num_slots_per_rack", "slot_spacing", "slot_offset"
+                  , "cabinet_width", "cabinet_height", "cabinet_depth"
+                  , "num_racks_per_cabinet", "rack_spacing", "rack_offset"
+                  , "num_cabinets", "cabinet_spacing"
+                  , "num_cabinet_rows", "cabinet_row_spacing"
+                  ]
+
 # Set up the cabinet data structure
-cabinet_system = cabinet.System(
+build.add_stage("cabinet_system", (lambda: cabinet.System(
 	cabinet = cabinet.Cabinet(
 		rack = cabinet.Rack(
 			slot = cabinet.Slot(
@@ -65,45 +146,99 @@ cabinet_system = cabinet.System(
 	),
 	num_cabinets    = num_cabinets,
 	cabinet_spacing = cabinet_spacing,
-)
+	num_rows        = num_cabinet_rows,
+	row_spacing     = cabinet_row_spacing,
+)), PHYSICAL_PARAMS)
+
+# The routes taken by cables (see model/routing.py)
+build.add_stage("cable_routing", (lambda cabinet_system: routing.TrayRouting(
+	system          = cabinet_system,
+	tray_height     = cable_tray_height,
+	riser_offset    = cable_riser_offset,
+	bend_allowance  = cable_bend_allowance,
+	aisle_crossings = cable_tray_aisle_crossings,
+)), [ "cable_tray_height", "cable_riser_offset", "cable_bend_allowance"
+    , "cable_tray_aisle_crossings"
+    ], ["cabinet_system"])
 
 # Create an inter-linked torus
-torus = board.create_torus(width, height)
+build.add_stage("torus", (lambda: board.create_torus(width, height)), ["width", "height"])
 
 # Convert to Cartesian coordinates as the coming manipulations use/abuse this
-cart_torus = transforms.hex_to_cartesian(torus)
+build.add_stage("cart_torus", transforms.hex_to_cartesian, stages = ["torus"])
+
+# Display coordinates for Cartesian positions
+build.add_stage("board2coord", dict, stages = ["cart_torus"])
 
 # Cut the left-hand side of the torus off and move it to the right to form a
 # rectangle
-rect_torus = transforms.rhombus_to_rect(cart_torus)
+build.add_stage("rect_torus", transforms.rhombus_to_rect, stages = ["cart_torus"])
 
 # Compress the coordinates to eliminate the "wavy" pattern on the y-axis turning
 # the board coordinates into a continuous mesh.
-comp_torus = transforms.compress(rect_torus, 1 if compress_rows else 2
-                                           , 2 if compress_rows else 1
-                                           )
+build.add_stage( "comp_torus"
+               , (lambda rect_torus: transforms.compress( rect_torus
+                                                        , 1 if compress_rows else 2
+                                                        , 2 if compress_rows else 1
+                                                        ))
+               , ["compress_rows"], ["rect_torus"]
+               )
 
 # Show where the folds will occur
-fold_spaced_torus = transforms.space_folds(comp_torus, (num_folds_x, num_folds_y))
+build.add_stage( "fold_spaced_torus"
+               , (lambda comp_torus: transforms.space_folds( comp_torus
+                                                           , (num_folds_x, num_folds_y)
+                                                           ))
+               , ["num_folds_x", "num_folds_y"], ["comp_torus"]
+               )
 
 # Actually do the folds
-folded_torus = transforms.fold(comp_torus, (num_folds_x, num_folds_y))
-
-# Place spaces in the folded version to see how it folded
-folded_spaced_torus = transforms.space_folds(folded_torus, (num_folds_x, num_folds_y))
+build.add_stage( "folded_torus"
+               , (lambda comp_torus: transforms.fold(comp_torus, (num_folds_x, num_folds_y)))
+               , ["num_folds_x", "num_folds_y"], ["comp_torus"]
+               )
 
 # Place spaces where the design is split into racks & cabinets
-folded_cabinet_spaced_torus = transforms.space_folds(folded_torus, (num_cabinets, num_racks_per_cabinet))
+build.add_stage( "folded_cabinet_spaced_torus"
+               , (lambda folded_torus: transforms.space_folds( folded_torus
+                                                             , ( num_cabinets
+                                                               , num_racks_per_cabinet
+                                                               )
+                                                             ))
+               , ["num_cabinets", "num_racks_per_cabinet"], ["folded_torus"]
+               )
 
 # Map to cabinets
-cabinet_torus = transforms.cabinetise( folded_torus
-                                     , num_cabinets
-                                     , num_racks_per_cabinet
-                                     , num_slots_per_rack
-                                     )
+def allocate_slots(folded_torus):
+	"""
+	Allocate the boards of the folded torus to slots as specified by
+	slot_allocation.
+	"""
+	if slot_allocation == "partition":
+		return partition.partition( folded_torus
+		                          , num_cabinets
+		                          , num_racks_per_cabinet
+		                          , num_slots_per_rack
+		                          )
+	else:
+		return transforms.cabinetise( folded_torus
+		                            , num_cabinets
+		                            , num_racks_per_cabinet
+		                            , num_slots_per_rack
+		                            , slot_allocation
+		                            )
+
+build.add_stage( "cabinet_torus", allocate_slots
+               , [ "num_cabinets", "num_racks_per_cabinet", "num_slots_per_rack"
+                 , "slot_allocation"
+                 ]
+               , ["folded_torus"]
+               )
 
 # Map to physical space for the cabinets described
-phys_torus = transforms.cabinet_to_physical(cabinet_torus, cabinet_system)
+build.add_stage( "phys_torus", transforms.cabinet_to_physical
+               , stages = ["cabinet_torus", "cabinet_system"]
+               )
 
 
  ##############################################################################
@@ -129,28 +264,70 @@ DIRECTION_NAMES = {
 # Mapping of directions to colours for the principle wiring directions
 DIRECTION_COLOURS = [(NORTH,"red"),(EAST,"green"),(SOUTH_WEST,"blue")]
 
+# Name of the saved box containing the cabinets which is shared by all cabinet
+# diagrams (see diagram.Diagram.get_cabinet_background)
+CABINET_BACKGROUND = "cabinetbackground"
+
 # A key describing the colours used in diagrams
 colour_key = ", ".join(r"{\color{%s}%s}"%(c, DIRECTION_NAMES[d])
                        for (d,c) in DIRECTION_COLOURS)
 
-# Display coordinates for Cartesian positions
-board2coord = dict(cart_torus)
 
-# Given a Cartesian coordinate, get a board.
-cart_coord2board = dict((c,b) for (b,c) in cart_torus)
+################################################################################
+# Figures
+################################################################################
+
+# The figure cache (if any) and the cabinets shared by all cabinet diagrams. Set
+# by generate_report().
+figure_cache            = None
+cabinet_background_tikz = None
+
+
+def picture(tikz, options = "", cabinet = False):
+	"""
+	Get a tikzpicture environment containing the given TikZ. If a figure cache is
+	in use, LaTeX which includes the separately compiled picture is returned
+	instead. cabinet should be True for pictures which use the cabinet
+	background.
+	"""
+	picture = "\\begin{tikzpicture}%s\n%s\n\\end{tikzpicture}"%(
+		"[%s]"%options if options else "", tikz)
+	
+	if figure_cache is None:
+		return picture
+	else:
+		return figure_cache.add(picture, cabinet_background_tikz if cabinet else "")
+
+
+class TemplateValues(dict):
+	"""
+	A dict of the values used to fill in part of the report in which callable
+	values are only called when the report actually uses them. Pictures given
+	this way (e.g. partial(picture, tikz)) are thus only added to the figure
+	cache, and compiled, if they appear in the report.
+	"""
+	
+	def __getitem__(self, name):
+		value = dict.__getitem__(self, name)
+		return value() if callable(value) else value
 
 
 def generate_diagram(boards, b2l, add_board_func,
                     show_wires = True,
-                    cabinet_system = None, cabinet_scale = 1.0):
+                    cabinet_system = None, cabinet_scale = 1.0,
+                    level_of_detail = diagram.Diagram.LOD_BOARD,
+                    cabinet_background = None,
+                    diagram_class = diagram.Diagram):
 	"""
 	Generates a diagram using the board positions shown and the mapping from board
-	to coordinate to use as a label.
+	to coordinate to use as a label. diagram_class may be diagram.Diagram or
+	svg_diagram.SVGDiagram.
 	"""
 	
-	d = diagram.Diagram()
+	d = diagram_class()
 	
-	d.set_cabinet_system(cabinet_system, cabinet_scale)
+	d.set_cabinet_system(cabinet_system, cabinet_scale, cabinet_background)
+	d.set_level_of_detail(level_of_detail)
 	
 	for board, coord in boards:
 		# Add board
@@ -171,24 +348,34 @@ def generate_diagram(boards, b2l, add_board_func,
 # Basic Torus Diagram
 ################################################################################
 
-# Show the regular torus with its wiring
-torus_diagram = generate_diagram( cart_torus
-                                , board2coord
-                                , diagram.Diagram.add_board_hexagon
-                                )
-torus_diagram_tikz = torus_diagram.get_tikz()
-
-# Add a line to indicate where it will be chopped
-bottom_left = torus_diagram.get_tikz_ref(cart_coord2board[(0,0)], SOUTH_WEST)
-max_y = max((y for (x,y) in cart_coord2board if x == 0))
-top_left = torus_diagram.get_tikz_ref(cart_coord2board[(0,max_y)], WEST)
-
-torus_diagram_tikz += r"""
+def generate_torus_diagram(cart_torus, board2coord):
+	"""
+	Show the regular torus with its wiring.
+	"""
+	torus_diagram = generate_diagram( cart_torus
+	                                , board2coord
+	                                , diagram.Diagram.add_board_hexagon
+	                                )
+	torus_diagram_tikz = torus_diagram.get_tikz()
+	
+	# Given a Cartesian coordinate, get a board.
+	cart_coord2board = dict((c,b) for (b,c) in cart_torus)
+	
+	# Add a line to indicate where it will be chopped
+	bottom_left = torus_diagram.get_tikz_ref(cart_coord2board[(0,0)], SOUTH_WEST)
+	max_y = max((y for (x,y) in cart_coord2board if x == 0))
+	top_left = torus_diagram.get_tikz_ref(cart_coord2board[(0,max_y)], WEST)
+	
+	torus_diagram_tikz += r"""
 \draw ([yshift=-0.5cm]%(bottom_left)s) -- ([yshift=1cm]%(top_left)s) [dashed,ultra thick];
 """%{
-	"bottom_left":bottom_left,
-	"top_left":top_left,
-}
+		"bottom_left":bottom_left,
+		"top_left":top_left,
+	}
+	
+	return torus_diagram_tikz
+
+build.add_section("torus_diagram", generate_torus_diagram, stages = ["cart_torus", "board2coord"])
 
 
 ################################################################################
@@ -196,55 +383,171 @@ torus_diagram_tikz += r"""
 ################################################################################
 
 # Show after wrapping into a rectangle
-rect_torus_diagram_tikz = generate_diagram( rect_torus
-                                          , board2coord
-                                          , diagram.Diagram.add_board_hexagon
-                                          ).get_tikz()
+build.add_section( "rect_torus_diagram"
+                 , (lambda rect_torus, board2coord:
+                     generate_diagram( rect_torus
+                                     , board2coord
+                                     , diagram.Diagram.add_board_hexagon
+                                     ).get_tikz())
+                 , stages = ["rect_torus", "board2coord"]
+                 )
 
 # Show after compressing it into a regular grid
-comp_torus_diagram_tikz = generate_diagram( comp_torus
-                                          , board2coord
-                                          , diagram.Diagram.add_board_square
-                                          ).get_tikz()
+build.add_section( "comp_torus_diagram"
+                 , (lambda comp_torus, board2coord:
+                     generate_diagram( comp_torus
+                                     , board2coord
+                                     , diagram.Diagram.add_board_square
+                                     ).get_tikz())
+                 , stages = ["comp_torus", "board2coord"]
+                 )
 
 ################################################################################
 # Folded Torus Diagram
 ################################################################################
 
 # Show with spaces for folds
-fold_spaced_torus_diagram_tikz = generate_diagram( fold_spaced_torus
-                                                 , board2coord
-                                                 , diagram.Diagram.add_board_square
-                                                 , show_wires = False
-                                                 ).get_tikz()
+build.add_section( "fold_spaced_torus_diagram"
+                 , (lambda fold_spaced_torus, board2coord:
+                     generate_diagram( fold_spaced_torus
+                                     , board2coord
+                                     , diagram.Diagram.add_board_square
+                                     , show_wires = False
+                                     ).get_tikz())
+                 , stages = ["fold_spaced_torus", "board2coord"]
+                 )
+
+
+def folded_torus_diagram_tile_jobs(folded_cabinet_spaced_torus, board2coord):
+	"""
+	Show folded diagram, split into tiles {(column, row): tikz,...} if it is too
+	large for a single page. Returns the jobs {tile: job,...} which generate each
+	tile so that they are run alongside the other sections.
+	"""
+	if folded_torus_diagram_tile_size is None:
+		return {
+			None : (lambda: generate_diagram( folded_cabinet_spaced_torus
+			                                , board2coord
+			                                , diagram.Diagram.add_board_square
+			                                ).get_tikz())
+		}
+	else:
+		return tiling.tile_jobs(
+			folded_cabinet_spaced_torus,
+			folded_torus_diagram_tile_size,
+			diagram.Diagram.add_board_square,
+			[(direction, ["thick",colour]) for (direction, colour) in DIRECTION_COLOURS],
+			lambda board, coord: r"\tiny %d,%d"%(board2coord[board]),
+		)
 
-# Show folded diagram
-folded_torus_diagram_tikz = generate_diagram( folded_cabinet_spaced_torus
-                                            , board2coord
-                                            , diagram.Diagram.add_board_square
-                                            ).get_tikz()
+build.add_split_section( "folded_torus_diagram_tiles"
+                       , folded_torus_diagram_tile_jobs
+                       , ["folded_torus_diagram_tile_size"]
+                       , ["folded_cabinet_spaced_torus", "board2coord"]
+                       )
+
+
+def generate_folded_torus_figures(folded_torus_diagram_tiles):
+	"""
+	Generate a figure for each tile of the folded torus diagram.
+	"""
+	folded_torus_figures = []
+	for num, (tile, tikz) in enumerate(sorted(folded_torus_diagram_tiles.iteritems())):
+		folded_torus_figures.append(r"""
+\begin{landscape}
+	\enlargethispage{3cm}
+	\begin{figure}
+		\center
+		%% Scaled additionally on the y axis so it actually fits
+		%(picture)s
+		
+		\caption{Arrangement after folding and interleaving shown divided into
+		cabinets/racks%(tile)s. Colour key: %(colour_key)s}
+		%(label)s
+	\end{figure}
+\end{landscape}
+"""%{
+		"picture":picture(tikz, "scale=%f,yscale=0.8"%diagram_scaling),
+		"tile":"" if tile is None else " (tile %d,%d, labelled stubs lead to other tiles)"%tile,
+		"label":r"\label{fig:folded-torus}" if num == 0 else "",
+		"scale":diagram_scaling,
+		"colour_key":colour_key,
+	})
+	return "".join(folded_torus_figures)
 
 
 ################################################################################
 # Cabinetised Torus Diagram
 ################################################################################
 
-cabinet_torus_diagram_tikz = generate_diagram( cabinet_torus
-                                             , board2coord
-                                             , diagram.Diagram.add_board_cabinet
-                                             , cabinet_system = cabinet_system
-                                             , cabinet_scale = cabinet_diagram_scaling_factor,
-                                             ).get_tikz()
+build.add_section( "cabinet_torus_diagram"
+                 , (lambda cabinet_torus, board2coord, cabinet_system:
+                     generate_diagram( cabinet_torus
+                                     , board2coord
+                                     , diagram.Diagram.add_board_cabinet
+                                     , cabinet_system = cabinet_system
+                                     , cabinet_scale = cabinet_diagram_scaling_factor
+                                     , level_of_detail = cabinet_diagram_level_of_detail
+                                     , cabinet_background = CABINET_BACKGROUND
+                                     ).get_tikz())
+                 , ["cabinet_diagram_scaling_factor", "cabinet_diagram_level_of_detail"]
+                 , ["cabinet_torus", "board2coord", "cabinet_system"]
+                 )
 
 
 ################################################################################
-# Topology Metrics
+# SVG Diagrams
 ################################################################################
 
-width_boards  = max(x for (c,(x,y)) in comp_torus) + 1
-height_boards = max(y for (c,(x,y)) in comp_torus) + 1
+def generate_svg_diagrams( cart_torus, rect_torus, comp_torus
+                         , folded_cabinet_spaced_torus, cabinet_torus
+                         , board2coord, cabinet_system
+                         ):
+	"""
+	Draw the development of the board placement as SVG (see svg_diagram.py).
+	Returns a dict {filename: svg,...}.
+	"""
+	SVGDiagram = svg_diagram.SVGDiagram
+	
+	return {
+		"torus.svg" : generate_diagram( cart_torus, board2coord
+		                              , SVGDiagram.add_board_hexagon
+		                              , diagram_class = SVGDiagram
+		                              ).get_svg(),
+		"rect_torus.svg" : generate_diagram( rect_torus, board2coord
+		                                   , SVGDiagram.add_board_hexagon
+		                                   , diagram_class = SVGDiagram
+		                                   ).get_svg(),
+		"comp_torus.svg" : generate_diagram( comp_torus, board2coord
+		                                   , SVGDiagram.add_board_square
+		                                   , diagram_class = SVGDiagram
+		                                   ).get_svg(),
+		"folded_torus.svg" : generate_diagram( folded_cabinet_spaced_torus, board2coord
+		                                     , SVGDiagram.add_board_square
+		                                     , diagram_class = SVGDiagram
+		                                     ).get_svg(),
+		"cabinet_torus.svg" : generate_diagram( cabinet_torus, board2coord
+		                                      , SVGDiagram.add_board_cabinet
+		                                      , cabinet_system = cabinet_system
+		                                      , cabinet_scale = cabinet_diagram_scaling_factor
+		                                      , diagram_class = SVGDiagram
+		                                      ).get_svg(),
+	}
+
+build.add_section( "svg_diagrams"
+                 , generate_svg_diagrams
+                 , ["cabinet_diagram_scaling_factor"]
+                 , [ "cart_torus", "rect_torus", "comp_torus"
+                   , "folded_cabinet_spaced_torus", "cabinet_torus"
+                   , "board2coord", "cabinet_system"
+                   ]
+                 )
 
 
+################################################################################
+# Topology Metrics
+################################################################################
+
 def generate_wiring_loop(boards, direction, diagram, start = (0,0,0)):
 	c2b = dict((c,b) for (b,c) in boards)
 	start_board = c2b[start]
@@ -291,63 +594,74 @@ def generate_packet_loop(boards, direction, diagram, start = (0,0,0)):
 	return ((len(loop)*3)/2) * 4
 
 
-d = generate_diagram( torus
-                    , board2coord
-                    , diagram.Diagram.add_board_hexagon
-                    , show_wires = False
-                    )
-
-wiring_loop_north_length      = generate_wiring_loop(torus, NORTH, d)
-wiring_loop_east_length       = generate_wiring_loop(torus, EAST, d)
-wiring_loop_south_west_length = generate_wiring_loop(torus, SOUTH_WEST, d)
-
-wiring_loop_diagram_tikz = d.get_tikz()
-
-d = generate_diagram( torus
-                    , board2coord
-                    , diagram.Diagram.add_board_hexagon
-                    , show_wires = False
-                    )
-
-packet_loop_north_length      = generate_packet_loop(torus, NORTH,      d, (0,1,0))
-packet_loop_east_length       = generate_packet_loop(torus, EAST,       d, (1,1,0))
-packet_loop_south_west_length = generate_packet_loop(torus, SOUTH_WEST, d, (0,0,0))
+def calculate_topology_metrics(torus, comp_torus, board2coord):
+	"""
+	Measure the size of the system and its wiring and packet loops. Returns a
+	dict of the values shown in the topology metrics section.
+	"""
+	out = {}
+	
+	out["width_boards"]  = max(x for (c,(x,y)) in comp_torus) + 1
+	out["height_boards"] = max(y for (c,(x,y)) in comp_torus) + 1
+	
+	d = generate_diagram( torus
+	                    , board2coord
+	                    , diagram.Diagram.add_board_hexagon
+	                    , show_wires = False
+	                    )
+	
+	out["wiring_loop_north_length"]      = generate_wiring_loop(torus, NORTH, d)
+	out["wiring_loop_east_length"]       = generate_wiring_loop(torus, EAST, d)
+	out["wiring_loop_south_west_length"] = generate_wiring_loop(torus, SOUTH_WEST, d)
+	
+	out["wiring_loop_diagram_tikz"] = d.get_tikz()
+	
+	d = generate_diagram( torus
+	                    , board2coord
+	                    , diagram.Diagram.add_board_hexagon
+	                    , show_wires = False
+	                    )
+	
+	out["packet_loop_north_length"]      = generate_packet_loop(torus, NORTH,      d, (0,1,0))
+	out["packet_loop_east_length"]       = generate_packet_loop(torus, EAST,       d, (1,1,0))
+	out["packet_loop_south_west_length"] = generate_packet_loop(torus, SOUTH_WEST, d, (0,0,0))
+	
+	out["packet_loop_diagram_tikz"] = d.get_tikz()
+	
+	# Count every loop in the system
+	wiring_rings = table.wiring_rings(torus, [NORTH, EAST, SOUTH_WEST])
+	packet_rings = table.packet_rings(torus, [NORTH, EAST, SOUTH_WEST])
+	for direction, name in [(NORTH, "north"), (EAST, "east"), (SOUTH_WEST, "south_west")]:
+		out["wiring_loop_%s_count"%name] = len(wiring_rings[direction][2])
+		out["packet_loop_%s_count"%name] = len(packet_rings[direction][2])
+	
+	return out
 
-packet_loop_diagram_tikz = d.get_tikz()
+build.add_section( "topology_metrics", calculate_topology_metrics
+                 , stages = ["torus", "comp_torus", "board2coord"]
+                 )
 
 
 ################################################################################
 # Wiring Stats For Cabinets
 ################################################################################
 
-def calculate_wire_cabinet_stats(boards):
+def calculate_wire_cabinet_stats(wire_matrices):
 	"""
-	Calculate stats about how often wires leave their own cabinet
+	Calculate stats about how often wires leave their own cabinet given the
+	output of metrics.wire_count_matrices().
 	"""
 	# Counters
-	stats = [
-		#              In-Rack  Between Racks  Between Cabinets
-		(NORTH      , [0,       0,             0]),
-		(EAST       , [0,       0,             0]),
-		(SOUTH_WEST , [0,       0,             0]),
-	]
-	
-	b2c = dict(boards)
-	
-	for board, coord in cabinet_torus:
-		for direction, counters in stats:
-			source = b2c[board]
-			target = b2c[board.follow_wire(direction)]
-			cabinets, racks, slots = abs(target - source)
-			
-			if cabinets > 0:
-				counters[0] += 1
-			elif racks > 0:
-				counters[1] += 1
-			elif slots > 0:
-				counters[2] += 1
-			else:
-				assert(False)
+	stats = []
+	for direction in [NORTH, EAST, SOUTH_WEST]:
+		cabinet_matrix, rack_matrix, crossings = wire_matrices[direction]
+		
+		total      = sum(map(sum, cabinet_matrix))
+		in_rack    = sum(rack_matrix[i][i] for i in range(len(rack_matrix)))
+		in_cabinet = sum(cabinet_matrix[i][i] for i in range(len(cabinet_matrix)))
+		
+		#                  Between Cabinets    Between Racks         In-Rack
+		stats.append((direction, [total - in_cabinet, in_cabinet - in_rack, in_rack]))
 	
 	wire_cabinet_stats = "\n".join(
 		"%s & %d & %d & %d & %d \\\\"%(
@@ -368,7 +682,76 @@ def calculate_wire_cabinet_stats(boards):
 	return wire_cabinet_stats, total_wire_cabinet_stats
 
 
-wire_cabinet_stats, total_wire_cabinet_stats = calculate_wire_cabinet_stats(cabinet_torus)
+def calculate_cabinet_wire_matrix(wire_matrices):
+	"""
+	Tabulate the number of wires between every pair of cabinets (in either
+	direction) and the number of wires crossing each boundary between adjacent
+	cabinets given the output of metrics.wire_count_matrices().
+	"""
+	directions = [NORTH, EAST, SOUTH_WEST]
+	
+	num_cabinets = len(wire_matrices[NORTH][0])
+	
+	# Total wires between each pair of cabinets regardless of direction
+	matrix = [[0] * num_cabinets for _ in range(num_cabinets)]
+	for direction in directions:
+		cabinet_matrix, rack_matrix, crossings = wire_matrices[direction]
+		for a in range(num_cabinets):
+			for b in range(num_cabinets):
+				matrix[min(a,b)][max(a,b)] += cabinet_matrix[a][b]
+	
+	cabinet_wire_matrix = "\n".join(
+		"%d & %s \\\\"%(a, " & ".join(str(n) if b >= a else "" for (b,n) in enumerate(row)))
+		for (a, row) in enumerate(matrix)
+	)
+	
+	# Wires crossing each boundary
+	crossings = zip(*(wire_matrices[direction][2] for direction in directions))
+	
+	cabinet_crossing_stats = "\n".join(
+		"%d--%d & %s & %d \\\\"%(i, i+1, " & ".join(map(str, counts)), sum(counts))
+		for (i, counts) in enumerate(crossings)
+	)
+	
+	max_cabinet_crossing_stats = "Max & %s & %d \\\\\n"%(
+		" & ".join(str(max(counts)) for counts in zip(*crossings)) if crossings
+		else " & ".join("0" for d in directions),
+		max(map(sum, crossings)) if crossings else 0,
+	)
+	
+	return cabinet_wire_matrix, cabinet_crossing_stats, max_cabinet_crossing_stats
+
+
+def calculate_wiring_stats(wire_matrices):
+	"""
+	Calculate all the stats about the wires between cabinets and racks given the
+	output of metrics.wire_count_matrices(). Returns a tuple (wire_cabinet_stats,
+	total_wire_cabinet_stats, cabinet_wire_matrix, cabinet_crossing_stats,
+	max_cabinet_crossing_stats).
+	"""
+	return ( calculate_wire_cabinet_stats(wire_matrices)
+	       + calculate_cabinet_wire_matrix(wire_matrices)
+	       )
+
+# Count the wires between every pair of cabinets and racks
+build.add_section( "wiring_stats"
+                 , (lambda cabinet_torus: calculate_wiring_stats(
+                     metrics.wire_count_matrices(cabinet_torus, [NORTH, EAST, SOUTH_WEST])))
+                 , stages = ["cabinet_torus"]
+                 )
+
+# As above but counted using the symmetry of the layout, without building the
+# torus (see model/symmetry.py)
+build.add_section( "symmetric_wiring_stats"
+                 , (lambda: calculate_wiring_stats(symmetry.wire_count_matrices(
+                     width, height, (num_folds_x, num_folds_y)
+                     , num_cabinets, num_racks_per_cabinet, compress_rows
+                     , [NORTH, EAST, SOUTH_WEST], slot_allocation)))
+                 , [ "width", "height", "num_folds_x", "num_folds_y"
+                   , "num_cabinets", "num_racks_per_cabinet", "compress_rows"
+                   , "slot_allocation"
+                   ]
+                 )
 
 
 
@@ -376,33 +759,30 @@ wire_cabinet_stats, total_wire_cabinet_stats = calculate_wire_cabinet_stats(cabi
 # Wiring Length Stats
 ################################################################################
 
-def calculate_wire_length_stats(boards, wire_offsets={}, num_bins = 5):
+def calculate_wire_length_histograms(boards, wire_offsets={}):
 	"""
-	Calculate stats about how often wires leave their own cabinet
+	Measure every wire. Returns a dict {direction: {length: count,...},...} for
+	each axis.
 	"""
-	# Lists of wire lengths for each axis
-	stats = [
-		(NORTH      , []),
-		(EAST       , []),
-		(SOUTH_WEST , []),
-	]
-	
-	b2c = dict(boards)
-	
-	for board, coord in cabinet_torus:
-		for direction, lengths in stats:
-			lengths.append(metrics.wire_length(boards
-			                                  , board
-			                                  , direction
-			                                  , wire_offsets
-			                                  ))
+	hists = {}
+	for direction in [NORTH, EAST, SOUTH_WEST]:
+		hist = hists[direction] = {}
+		for board, coord in boards:
+			length = metrics.wire_length(boards, board, direction, wire_offsets)
+			hist[length] = hist.get(length,0) + 1
 	
+	return hists
+
+
+def calculate_wire_length_stats(hists, num_bins = 5):
+	"""
+	Calculate stats about the lengths of wires given the output of
+	calculate_wire_length_histograms().
+	"""
 	# Convert stats to frequency counts
 	freq_stats = []
-	for direction, lengths in stats:
-		hist = {}
-		for length in lengths:
-			hist[length] = hist.get(length,0) + 1
+	for direction in [NORTH, EAST, SOUTH_WEST]:
+		hist = hists[direction]
 		
 		min_len = min(hist)
 		max_len = max(hist)
@@ -411,7 +791,9 @@ def calculate_wire_length_stats(boards, wire_offsets={}, num_bins = 5):
 		out_frequencies = []
 		for bin_num in range(num_bins):
 			bin_start = (min_len + (bin_num*bin_len)) if bin_num > 0 else 0.0
-			bin_end   = min_len + (bin_num*bin_len) + bin_len
+			# The last bin always ends at the longest wire (rounding could otherwise
+			# leave it out)
+			bin_end   = (min_len + (bin_num*bin_len) + bin_len) if bin_num < num_bins - 1 else max_len
 			
 			out_frequencies.append((bin_start, bin_end,
 			                        sum(c for (l,c) in hist.iteritems()
@@ -434,75 +816,171 @@ def calculate_wire_length_stats(boards, wire_offsets={}, num_bins = 5):
 	
 	return wire_length_stats
 
+def calculate_routed_wire_length_histograms(phys_torus, cabinet_torus,
+                                            cabinet_system, cable_routing):
+	"""
+	Measure every wire as specified by wire_routing. Returns a dict {direction:
+	{length: count,...},...} for each axis.
+	"""
+	if wire_routing == "tray":
+		return metrics.routed_wire_length_histogram(cabinet_torus, cable_routing)
+	else:
+		return calculate_wire_length_histograms( phys_torus
+		                                       , cabinet_system.cabinet.rack.slot.wire_position
+		                                       )
+
 # Calculate the wire lengths for the current torus
-wire_length_stats = calculate_wire_length_stats(phys_torus,
-	cabinet_system.cabinet.rack.slot.wire_position,
-	wire_length_histogram_bins)
+build.add_section( "wire_length_stats"
+                 , (lambda phys_torus, cabinet_torus, cabinet_system, cable_routing:
+                     calculate_wire_length_stats(
+                       calculate_routed_wire_length_histograms( phys_torus, cabinet_torus
+                                                              , cabinet_system, cable_routing
+                                                              )
+                       , wire_length_histogram_bins
+                     ))
+                 , ["wire_length_histogram_bins", "wire_routing"]
+                 , ["phys_torus", "cabinet_torus", "cabinet_system", "cable_routing"]
+                 )
+
+# As above but measuring only one wire of each distinct length (see
+# model/symmetry.py). Only straight wires can be measured this way.
+build.add_section( "symmetric_wire_length_stats"
+                 , (lambda cabinet_system:
+                     calculate_wire_length_stats(
+                       symmetry.wire_length_histogram( width, height, (num_folds_x, num_folds_y)
+                                                     , cabinet_system
+                                                     , cabinet_system.cabinet.rack.slot.wire_position
+                                                     , compress_rows
+                                                     , [NORTH, EAST, SOUTH_WEST]
+                                                     , slot_allocation
+                                                     )
+                       , wire_length_histogram_bins
+                     ))
+                 , [ "width", "height", "num_folds_x", "num_folds_y", "compress_rows"
+                   , "wire_length_histogram_bins", "slot_allocation", "wire_routing"
+                   ]
+                 , ["cabinet_system"]
+                 )
+
 
 
 ################################################################################
-# Wiring Pattern Finding
+# Cable Tray Congestion
 ################################################################################
 
+def utilisation_colour(cables, capacity):
+	"""
+	Get the colour for a tray segment or cut-out carrying the given number of
+	cables: green when empty through to red when full.
+	"""
+	return "red!%d!green"%min(100, (100 * cables) / max(capacity, 1))
+
 
-def get_relative_wires(boards, direction):
+def calculate_tray_congestion_stats(segments, cutouts):
 	"""
-	Returns a list of (coord, wire_relative_target) tuples where coord is a
-	coordinate of a board and wire_relative_target is the coordinate relative to
-	coord of the wire going in direction from coord.
+	Tabulate the number of cables along each tray segment and through each
+	cut-out given the output of routing.tray_congestion(). Those over capacity
+	are shown in bold.
 	"""
+	rows = []
+	for name, cables, capacity in (
+		[("Tray %d--%d"%segment, cables, cable_tray_capacity)
+		 for (segment, cables) in sorted(segments.iteritems())] +
+		[("Cut-out %d"%cabinet_num, cables, cable_cutout_capacity)
+		 for (cabinet_num, cables) in enumerate(cutouts)]):
+		row = "%s & %d & %d & %d\\%%"%(name, cables, capacity, (100 * cables) / max(capacity, 1))
+		if cables > capacity:
+			row = " & ".join("\\textbf{%s}"%cell for cell in row.split(" & "))
+		rows.append(row + " \\\\")
 	
-	b2c = dict(boards)
-	
-	out = []
-	
-	for board, coord in boards:
-		out.append((coord, b2c[board.follow_wire(direction)] - coord))
-	
-	return out
+	return "\n".join(rows)
 
 
-def group_relative_wires(rel_wires, group_key, elem_key):
+def generate_tray_congestion_diagram(segments, cutouts, cabinet_system):
 	"""
-	Group together relative wire descriptions. Returns a dict {key:
-	frozenset([(elem,wire_direction,wire_relative_target),...]), ...} where key is
-	a value returned by group_key(coord) and where the elem is returned by
-	elem_key(coord).
-	
-	For example, to group together all relative wires for each rack in the system,
-	group_key = (lambda (c,r,s): (c,r))
-	elem_key  = (lambda (c,r,s): s)
+	Generate a plan view of the cabinets and the trays between them coloured by
+	how full each tray segment and cut-out is. Returns the TikZ.
 	"""
+	cab = cabinet_system.cabinet
+	
+	# The centre of each cabinet in the plan, rows running away from the viewer
+	centres = [(position.x + (cab.width / 2.0), -position.z - (cab.depth / 2.0))
+	           for position in cabinet_system.cabinet_positions]
 	
-	groups = defaultdict(set)
+	tikz = []
+	for cabinet_num, ((x, y), cables) in enumerate(zip(centres, cutouts)):
+		tikz.append(r"\draw [fill=%s] (%f,%f) rectangle (%f,%f) node [midway] {\tiny %d};"%(
+			utilisation_colour(cables, cable_cutout_capacity),
+			x - (cab.width / 2.0), y - (cab.depth / 2.0),
+			x + (cab.width / 2.0), y + (cab.depth / 2.0),
+			cabinet_num))
 	
-	for coord, wire_relative_target in rel_wires:
-		groups[group_key(coord)].add((elem_key(coord), wire_relative_target))
+	for (a, b), cables in sorted(segments.iteritems()):
+		tikz.append(r"\draw [line width=2pt, %s] (%f,%f) -- (%f,%f) node [midway, above] {\tiny %d};"%(
+			utilisation_colour(cables, cable_tray_capacity),
+			centres[a][0], centres[a][1], centres[b][0], centres[b][1],
+			cables))
 	
-	return dict((g, frozenset(s)) for (g,s) in groups.iteritems())
+	return "\n".join(tikz)
 
 
-def distinct_count(iterable):
+def calculate_tray_congestion(wire_matrices, cable_routing):
 	"""
-	Returns a dict {item: count,...} which contains the number of times
-	each unique item has appeared in the iterable
+	Tabulate and draw the congestion of the cable trays given the output of
+	metrics.wire_count_matrices(). Returns a tuple (tray_congestion_stats,
+	tray_congestion_diagram_tikz).
 	"""
+	num_cabinets = len(wire_matrices[NORTH][0])
 	
-	counts = defaultdict(lambda:0)
+	# Total cables from each cabinet to each other regardless of direction
+	matrix = [[sum(wire_matrices[direction][0][a][b] for direction in [NORTH, EAST, SOUTH_WEST])
+	           for b in range(num_cabinets)]
+	          for a in range(num_cabinets)]
 	
-	for item in iterable:
-		counts[item] += 1
+	segments, cutouts = routing.tray_congestion(cable_routing, matrix)
 	
-	return counts
+	return ( calculate_tray_congestion_stats(segments, cutouts)
+	       , generate_tray_congestion_diagram(segments, cutouts, cable_routing.system)
+	       )
+
+build.add_section( "tray_congestion"
+                 , (lambda cabinet_torus, cable_routing: calculate_tray_congestion(
+                     metrics.wire_count_matrices(cabinet_torus, [NORTH, EAST, SOUTH_WEST])
+                     , cable_routing))
+                 , ["cable_tray_capacity", "cable_cutout_capacity"]
+                 , ["cabinet_torus", "cable_routing"]
+                 )
+
+# As above but counted using the symmetry of the layout (see model/symmetry.py)
+build.add_section( "symmetric_tray_congestion"
+                 , (lambda cable_routing: calculate_tray_congestion(
+                     symmetry.wire_count_matrices(
+                       width, height, (num_folds_x, num_folds_y)
+                       , num_cabinets, num_racks_per_cabinet, compress_rows
+                       , [NORTH, EAST, SOUTH_WEST], slot_allocation)
+                     , cable_routing))
+                 , [ "width", "height", "num_folds_x", "num_folds_y"
+                   , "num_cabinets", "num_racks_per_cabinet", "compress_rows"
+                   , "slot_allocation", "cable_tray_capacity", "cable_cutout_capacity"
+                   ]
+                 , ["cable_routing"]
+                 )
+
+
+
+################################################################################
+# Wiring Pattern Finding
+################################################################################
 
 
-def generate_cabinet_colouring_diagram(colouring, num_colours, cabinet_system, cabinet_scale):
+def generate_cabinet_colouring_diagram(boards, colouring, num_colours, cabinet_system, cabinet_scale):
 	"""
-	Takes a dict {cabinet_coord: colour_index} and the maximum color_index. Returns
-	a diagram for a coloured set of racks.
+	Takes a list [(board, cabinet_coord),...], a dict {cabinet_coord:
+	colour_index} and the maximum color_index. Returns a diagram for a coloured
+	set of racks.
 	"""
 	d = diagram.Diagram()
-	d.set_cabinet_system(cabinet_system, cabinet_scale)
+	d.set_cabinet_system(cabinet_system, cabinet_scale, CABINET_BACKGROUND)
 	
 	
 	# Generate pallet
@@ -515,68 +993,91 @@ def generate_cabinet_colouring_diagram(colouring, num_colours, cabinet_system, c
 		colours.append("%s!%d!%s"%(start_colour, point, end_colour))
 	
 	# Add the boards
-	for coord, colour_index in colouring.iteritems():
-		d.add_board_cabinet(coord, coord, ["fill=%s"%colours[colour_index]])
+	for board, coord in boards:
+		if coord in colouring:
+			d.add_board_cabinet(board, coord, ["fill=%s"%colours[colouring[coord]]])
 	
 	return d
 
 
-# A dict {filter_name : {direction: tikz, ...}, ...}
-wiring_uniqueness_diagram_tikz = defaultdict(dict)
-
-#wc = 0
-for wire_filter, filter_name in [ ((lambda o: o[0]==0 and o[1]==0), "Change Slot")
-                                , ((lambda o: o[0]==0 and o[1]!=0), "Change Rack")
-                                , ((lambda o: o[0]!=0), "Change Cabinet")
-                                ]:
-	#print filter_name
-	for direction in [NORTH, EAST, SOUTH_WEST]:
-		#print DIRECTION_NAMES[direction]
-		# Get a list of wires going in this direction with their coordinates
-		# converteed to relative values. Filter out wires we're not interested in,
-		# e.g. ones which leave the rack
-		relative_wires = [ (c,o) for (c,o)
-		                   in get_relative_wires(cabinet_torus, direction)
-		                   if wire_filter(o)
-		                 ]
-		
-		# Collect together wires which have the same relative connection
-		grouped_relative_wires = group_relative_wires(relative_wires
-		                                             , (lambda (c,r,s): (c,r,s))
-		                                             , (lambda (c,r,s): None)
-		                                             )
-		
-		# Count the number of times each distinct pattern of wiring occurs
-		distinct_pattern_counts = distinct_count(grouped_relative_wires.itervalues())
-		
-		# Create a lookup from distinct pattern to a unique id
-		pattern2id = dict((p,i) for (i,p) in enumerate(distinct_pattern_counts.keys()))
+def generate_wiring_uniqueness_diagrams(boards, cabinet_system):
+	"""
+	Generate diagrams showing which slots have the same wiring pattern for wires
+	changing slot, rack or cabinet. Returns a dict {filter_name : {direction:
+	tikz, ...}, ...}.
+	"""
+	wiring_uniqueness_diagram_tikz = defaultdict(dict)
+	
+	for wire_filter, filter_name in [ ((lambda o: o[0]==0 and o[1]==0), "Change Slot")
+	                                , ((lambda o: o[0]==0 and o[1]!=0), "Change Rack")
+	                                , ((lambda o: o[0]!=0), "Change Cabinet")
+	                                ]:
+		# Find the distinct wiring patterns (i.e. relative connections) of each slot
+		# for each direction. Filter out wires we're not interested in, e.g. ones
+		# which leave the rack
+		wire_patterns = patterns.find_patterns( boards
+		                                      , (lambda (c,r,s): (c,r,s))
+		                                      , wire_filter = wire_filter
+		                                      , directions = [NORTH, EAST, SOUTH_WEST]
+		                                      )
 		
-		d = generate_cabinet_colouring_diagram(
-			dict( (coordinates.Cabinet(*coord), pattern2id[pattern])
-			      for (coord, pattern) in grouped_relative_wires.iteritems()
-			    ),
-			(max(pattern2id.itervalues()) + 1 if pattern2id else 1),
-			cabinet_system,
-			cabinet_diagram_scaling_factor,
+		for direction in [NORTH, EAST, SOUTH_WEST]:
+			slot_patterns, pattern_counts = wire_patterns[direction]
+			
+			d = generate_cabinet_colouring_diagram(
+				boards,
+				dict( (coordinates.Cabinet(*coord), pattern_id)
+				      for (coord, pattern_id) in slot_patterns.iteritems()
+				    ),
+				max(len(pattern_counts), 1),
+				cabinet_system,
+				cabinet_diagram_scaling_factor,
+			)
+			wiring_uniqueness_diagram_tikz[filter_name][direction] = d.get_tikz()
+	
+	return wiring_uniqueness_diagram_tikz
+
+build.add_section( "wiring_uniqueness_diagrams", generate_wiring_uniqueness_diagrams
+                 , ["cabinet_diagram_scaling_factor"]
+                 , ["cabinet_torus", "cabinet_system"]
+                 )
+
+
+def calculate_rack_pattern_stats(boards):
+	"""
+	Count the number of distinct wiring harnesses required for the wires within
+	each rack, both as-is and when racks whose wiring differs only by a shift or
+	mirror image along the slots are considered the same.
+	"""
+	directions = [NORTH, EAST, SOUTH_WEST]
+	in_rack = (lambda o: o[0]==0 and o[1]==0)
+	
+	rack_patterns = patterns.find_patterns( boards
+	                                      , (lambda (c,r,s): (c,r))
+	                                      , (lambda (c,r,s): s)
+	                                      , wire_filter = in_rack
+	                                      , directions = directions
+	                                      )
+	canonical_rack_patterns = patterns.find_patterns( boards
+	                                                , (lambda (c,r,s): (c,r))
+	                                                , (lambda (c,r,s): s)
+	                                                , wire_filter = in_rack
+	                                                , directions = directions
+	                                                , translate = True
+	                                                , mirror_field = 2
+	                                                )
+	
+	return "\n".join(
+		"%s & %d & %d \\\\"%(
+			DIRECTION_NAMES[direction],
+			len(rack_patterns[direction][1]),
+			len(canonical_rack_patterns[direction][1]),
 		)
-		wiring_uniqueness_diagram_tikz[filter_name][direction] = d.get_tikz()
-		
-		#out = ""
-		#for r in range(num_racks_per_cabinet):
-		#	for c in range(num_cabinets):
-		#		for s in range(num_slots_per_rack):
-		#			try:
-		#				out += "%X"%(distinct_relative_wire_indexes.index(grouped_relative_wires[(c,r,s)]))
-		#				wc += 1
-		#			except KeyError:
-		#				# No local wires in this area
-		#				out += "-"
-		#		out += "  "
-		#	out += "\n"
-		#
-		#print out
-#print wc
+		for direction in directions
+	)
+
+build.add_section("rack_pattern_stats", calculate_rack_pattern_stats, stages = ["cabinet_torus"])
+
 
 
 ################################################################################
@@ -599,7 +1100,9 @@ def generate_board_position_list(boards, b2c):
 	
 	return out
 
-board_position_list = generate_board_position_list(cabinet_torus, board2coord)
+build.add_section( "board_position_list", generate_board_position_list
+                 , stages = ["cabinet_torus", "board2coord"]
+                 )
 
 
 ################################################################################
@@ -633,7 +1136,7 @@ def generate_wiring_instructions(boards, socket_names):
 	b2c = dict(boards)
 	
 	wires = []
-	for board, source_coord in cabinet_torus:
+	for board, source_coord in boards:
 		for direction in [NORTH, EAST, SOUTH_WEST]:
 			target_coord = b2c[board.follow_wire(direction)]
 			
@@ -682,19 +1185,156 @@ def generate_wiring_instructions(boards, socket_names):
 	
 	return out
 
-wiring_instructions = generate_wiring_instructions(cabinet_torus, socket_names)
+build.add_section( "wiring_instructions"
+                 , (lambda cabinet_torus: generate_wiring_instructions(cabinet_torus, socket_names))
+                 , ["socket_names", "num_cabinets", "num_racks_per_cabinet"]
+                 , ["cabinet_torus"]
+                 )
 
 
- ##############################################################################
 ################################################################################
-# Generate Report
+# Report Generation
 ################################################################################
- ##############################################################################
 
-################################################################################
-# Preamble
-################################################################################
-print (r"""
+def describe_folds(folds):
+	r"""
+	Get LaTeX describing a (possibly hierarchical) fold specification, e.g. "2
+	$\times$ 2" for (2,2).
+	"""
+	return r" $\times$ ".join(map(str, topology.fold_levels(folds)))
+
+
+def generate_report():
+	"""
+	Compute the sections of the report which are out of date (see
+	incremental.py) and print the report to stdout.
+	"""
+	global figure_cache, cabinet_background_tikz
+	
+	# Figures are compiled separately and cached if a directory is given
+	if figure_cache_directory is not None:
+		figure_cache = figures.FigureCache(figure_cache_directory)
+	else:
+		figure_cache = None
+	
+	################################################################################
+	# Section Computation
+	################################################################################
+	
+	build.set_params(globals())
+	
+	# Only the sections which will be shown are computed. Sections whose parameters
+	# are unchanged since they were last computed are reused; the remainder are
+	# independent and are computed concurrently, sharing the models.
+	section_names = []
+	
+	# The wiring metrics may be computed from the symmetry of the layout rather
+	# than by visiting every wire (see model/symmetry.py). Partitioned slot
+	# allocations have no such symmetry so are always measured wire by wire.
+	if symmetric_metrics and slot_allocation != "partition":
+		wiring_metrics_sections = ["symmetric_wiring_stats", "symmetric_wire_length_stats"]
+		tray_congestion_section = "symmetric_tray_congestion"
+	else:
+		wiring_metrics_sections = ["wiring_stats", "wire_length_stats"]
+		tray_congestion_section = "tray_congestion"
+	
+	# Only straight wires can be measured from the symmetry: routed cables depend
+	# on the path they take through the trays.
+	if wire_routing != "straight":
+		wiring_metrics_sections[1] = "wire_length_stats"
+	
+	# Tray congestion is only meaningful when cables are routed through the trays
+	show_tray_congestion = show_wiring_metrics and wire_routing == "tray"
+	
+	if show_wiring_metrics:
+		section_names += wiring_metrics_sections
+	if show_tray_congestion:
+		section_names += [tray_congestion_section]
+	if show_topology_metrics:
+		section_names += ["topology_metrics"]
+	if show_development:
+		section_names += [ "torus_diagram"
+		                 , "rect_torus_diagram"
+		                 , "comp_torus_diagram"
+		                 , "fold_spaced_torus_diagram"
+		                 , "folded_torus_diagram_tiles"
+		                 , "cabinet_torus_diagram"
+		                 ]
+	if show_wiring_patterns:
+		section_names += ["wiring_uniqueness_diagrams", "rack_pattern_stats"]
+	if show_board_position_list:
+		section_names += ["board_position_list"]
+	if show_wiring_instructions:
+		section_names += ["wiring_instructions"]
+	if svg_diagram_directory is not None:
+		section_names += ["svg_diagrams"]
+	
+	sections = build.get_sections(section_names, report_processes)
+	
+	if show_wiring_metrics:
+		( wire_cabinet_stats, total_wire_cabinet_stats
+		, cabinet_wire_matrix, cabinet_crossing_stats, max_cabinet_crossing_stats
+		) = sections[wiring_metrics_sections[0]]
+		wire_length_stats = sections[wiring_metrics_sections[1]]
+	
+	if show_tray_congestion:
+		tray_congestion_stats, tray_congestion_diagram_tikz = sections[tray_congestion_section]
+	
+	if show_topology_metrics:
+		topology_metrics = sections["topology_metrics"]
+	
+	if show_development:
+		torus_diagram_tikz             = sections["torus_diagram"]
+		rect_torus_diagram_tikz        = sections["rect_torus_diagram"]
+		comp_torus_diagram_tikz        = sections["comp_torus_diagram"]
+		fold_spaced_torus_diagram_tikz = sections["fold_spaced_torus_diagram"]
+		cabinet_torus_diagram_tikz     = sections["cabinet_torus_diagram"]
+		folded_torus_figures = generate_folded_torus_figures(sections["folded_torus_diagram_tiles"])
+	
+	if show_wiring_patterns:
+		wiring_uniqueness_diagram_tikz = sections["wiring_uniqueness_diagrams"]
+		rack_pattern_stats             = sections["rack_pattern_stats"]
+	
+	if show_board_position_list:
+		board_position_list = sections["board_position_list"]
+	
+	if show_wiring_instructions:
+		wiring_instructions = sections["wiring_instructions"]
+	
+	# The cabinets shared by all cabinet diagrams. Individual slots are only shown
+	# when the cabinet diagram shows individual boards.
+	cabinet_background_tikz = diagram.Diagram.get_cabinet_background( build.get_stage("cabinet_system")
+	                                                                , cabinet_diagram_scaling_factor
+	                                                                , CABINET_BACKGROUND
+	                                                                , cabinet_diagram_level_of_detail == "board"
+	                                                                )
+	
+	# Write a machine-readable copy of the plan for looking up individual wires
+	if wiring_plan_filename is not None:
+		plan.write_plan(build.get_stage("cabinet_torus"), wiring_plan_filename, socket_names)
+	
+	# Write SVG copies of the development diagrams, viewable without LaTeX
+	if svg_diagram_directory is not None:
+		if not os.path.isdir(svg_diagram_directory):
+			os.makedirs(svg_diagram_directory)
+		for filename, svg in sections["svg_diagrams"].iteritems():
+			f = open(os.path.join(svg_diagram_directory, filename), "w")
+			try:
+				f.write(svg)
+			finally:
+				f.close()
+	
+	
+	 ##############################################################################
+	################################################################################
+	# Generate Report
+	################################################################################
+	 ##############################################################################
+	
+	################################################################################
+	# Preamble
+	################################################################################
+	print (r"""
 \documentclass[a4paper,11pt]{article}
 
 \usepackage{fullpage}
@@ -703,6 +1343,7 @@ print (r"""
 \usepackage{amsmath}
 \usepackage[pdftex]{lscape}
 \usepackage{tikz}
+\usepackage{graphicx}
 
 \title{%(title)s}
 \author{%(author)s}
@@ -710,21 +1351,24 @@ print (r"""
 
 \begin{document}
 
+%% Cabinets drawn once and shared by all cabinet diagrams
+%(cabinet_background)s
 \maketitle
 \setcounter{tocdepth}{2}
 \tableofcontents
 """%{
-	"title":title,
-	"author":"Generated By The `SpiNNer' Wiring Guide Generator",
-}).strip()
-
-
-
-################################################################################
-# Introduction
-################################################################################
-
-print (r"""
+		"title":title,
+		"author":"Generated By The `SpiNNer' Wiring Guide Generator",
+		"cabinet_background":cabinet_background_tikz,
+	}).strip()
+	
+	
+	
+	################################################################################
+	# Introduction
+	################################################################################
+	
+	print (r"""
 \section{Introduction}
 
 This is an automatically generated wiring guide for a SpiNNaker system. This
@@ -742,8 +1386,8 @@ document covers a system with the basic parameters listed in Table
 		\addlinespace
 			Compress Direction & %(compress_rows)s & \\
 		\addlinespace
-			Number of Folds & %(num_folds_x)d & X-Axis \\
-			Number of Folds & %(num_folds_y)d & Y-Axis \\
+			Number of Folds & %(num_folds_x)s & X-Axis \\
+			Number of Folds & %(num_folds_y)s & Y-Axis \\
 		\addlinespace
 			Cabinets          & %(num_cabinets)d & \\
 			Racks per Cabinet & %(num_racks_per_cabinet)d & \\
@@ -762,23 +1406,23 @@ Hexagons'} by Simon Davidson and through conversations and emails with, amongst
 others, Simon and Steve Furber.
 
 """%{
-	"width":width,
-	"height":height,
-	"num_folds_x":num_folds_x,
-	"num_folds_y":num_folds_y,
-	"num_cabinets":num_cabinets,
-	"num_racks_per_cabinet":num_racks_per_cabinet,
-	"num_slots_per_rack":num_slots_per_rack,
-	"compress_rows":"Rows" if compress_rows else "Columns",
-}).strip()
-
-
-
-################################################################################
-# Wring Metrics
-################################################################################
-
-if show_wiring_metrics: print (r"""
+		"width":width,
+		"height":height,
+		"num_folds_x":describe_folds(num_folds_x),
+		"num_folds_y":describe_folds(num_folds_y),
+		"num_cabinets":num_cabinets,
+		"num_racks_per_cabinet":num_racks_per_cabinet,
+		"num_slots_per_rack":num_slots_per_rack,
+		"compress_rows":"Rows" if compress_rows else "Columns",
+	}).strip()
+	
+	
+	
+	################################################################################
+	# Wring Metrics
+	################################################################################
+	
+	if show_wiring_metrics: print (r"""
 \newpage
 \section{Wiring Metrics}
 
@@ -798,6 +1442,35 @@ if show_wiring_metrics: print (r"""
 	\label{tab:wire-cabinet-stats}
 \end{table}
 
+\begin{table}[h]
+	\center
+	\begin{tabular}{r *{%(num_cabinets)d}{r}}
+		\toprule
+			Cabinet & %(cabinet_numbers)s \\
+		\midrule
+			%(cabinet_wire_matrix)s
+		\bottomrule
+	\end{tabular}
+	\caption{Number of wires between each pair of cabinets. Wires which stay
+	within a cabinet are counted on the diagonal.}
+	\label{tab:cabinet-wire-matrix}
+\end{table}
+
+\begin{table}[h]
+	\center
+	\begin{tabular}{l r r r r}
+		\toprule
+			Boundary & North & East & South West & Total \\
+		\midrule
+			%(cabinet_crossing_stats)s
+		\addlinespace
+			%(max_cabinet_crossing_stats)s
+		\bottomrule
+	\end{tabular}
+	\caption{Number of wires crossing each boundary between adjacent cabinets.}
+	\label{tab:cabinet-crossing-stats}
+\end{table}
+
 \begin{table}[h]
 	\center
 	\begin{tabular}{l r r r r}
@@ -813,19 +1486,56 @@ if show_wiring_metrics: print (r"""
 \end{table}
 
 """%{
-	"wire_cabinet_stats":wire_cabinet_stats,
-	"total_wire_cabinet_stats":total_wire_cabinet_stats,
-	"wire_length_stats":wire_length_stats,
-	"cabinet_unit":cabinet_unit,
-}).strip()
-
-
+		"wire_cabinet_stats":wire_cabinet_stats,
+		"total_wire_cabinet_stats":total_wire_cabinet_stats,
+		"num_cabinets":num_cabinets,
+		"cabinet_numbers":" & ".join(map(str, range(num_cabinets))),
+		"cabinet_wire_matrix":cabinet_wire_matrix,
+		"cabinet_crossing_stats":cabinet_crossing_stats,
+		"max_cabinet_crossing_stats":max_cabinet_crossing_stats,
+		"wire_length_stats":wire_length_stats,
+		"cabinet_unit":cabinet_unit,
+	}).strip()
+	
+	if show_tray_congestion: print (r"""
+\begin{table}[h]
+	\center
+	\begin{tabular}{l r r r}
+		\toprule
+			Route & Cables & Capacity & Utilisation \\
+		\midrule
+			%(tray_congestion_stats)s
+		\bottomrule
+	\end{tabular}
+	\caption{Number of cables along each segment of cable tray between a pair of
+	cabinets and through the cut-out in the top of each cabinet. Those over
+	capacity are shown in bold.}
+	\label{tab:tray-congestion-stats}
+\end{table}
 
-################################################################################
-# Topology Metrics
-################################################################################
+\begin{figure}[h]
+	\center
+	%(tray_congestion_diagram_tikz)s
+	\caption{Plan view of the cabinets and the cable trays between them. Green
+	through to red shows how full each cut-out and tray segment is. Trays are
+	labelled with the number of cables they carry.}
+	\label{fig:tray-congestion}
+\end{figure}
 
-if show_topology_metrics: print (r"""
+"""%{
+		"tray_congestion_stats":tray_congestion_stats,
+		"tray_congestion_diagram_tikz":picture( tray_congestion_diagram_tikz
+		                                      , "scale=%f"%cabinet_diagram_scaling_factor
+		                                      ),
+	}).strip()
+	
+	
+	
+	################################################################################
+	# Topology Metrics
+	################################################################################
+	
+	if show_topology_metrics: print (r"""
 \newpage
 \section{Topology Metrics}
 
@@ -853,6 +1563,14 @@ following the path of a packet within the system (see Figure
 			Packet Loop North Length      & %(packet_loop_north_length)d      & Chips \\
 			Packet Loop East Length       & %(packet_loop_east_length)d       & Chips \\
 			Packet Loop South West Length & %(packet_loop_south_west_length)d & Chips \\
+			\addlinespace
+			Wiring Loops North            & %(wiring_loop_north_count)d       & Loops \\
+			Wiring Loops East             & %(wiring_loop_east_count)d        & Loops \\
+			Wiring Loops South West       & %(wiring_loop_south_west_count)d  & Loops \\
+			\addlinespace
+			Packet Loops North            & %(packet_loop_north_count)d       & Loops \\
+			Packet Loops East             & %(packet_loop_east_count)d        & Loops \\
+			Packet Loops South West       & %(packet_loop_south_west_count)d  & Loops \\
 		\bottomrule
 	\end{tabular}
 	\caption{Overview of properties of the system.}
@@ -863,9 +1581,7 @@ following the path of a packet within the system (see Figure
 \begin{landscape}
 	\begin{figure}
 		\center
-		\begin{tikzpicture}[scale=%(scale)f]
-			%(wiring_loop_diagram_tikz)s
-		\end{tikzpicture}
+		%(wiring_loop_diagram_tikz)s
 		
 		\caption{Example wiring loops from (0,0). Solid lines are wires, dashed
 		lines are paths through a board. Colour key: %(colour_key)s.}
@@ -876,9 +1592,7 @@ following the path of a packet within the system (see Figure
 \begin{landscape}
 	\begin{figure}
 		\center
-		\begin{tikzpicture}[scale=%(scale)f]
-			%(packet_loop_diagram_tikz)s
-		\end{tikzpicture}
+		%(packet_loop_diagram_tikz)s
 		
 		\caption{Example packet loops from (0,2), (1,1) and (0,0) for
 		%(colour_key)s. Solid lines are wires, dashed lines are paths through a
@@ -888,28 +1602,34 @@ following the path of a packet within the system (see Figure
 \end{landscape}
 
 """%{
-	"width":width,
-	"height":height,
-	"width_boards":width_boards,
-	"height_boards":height_boards,
-	"wiring_loop_north_length":wiring_loop_north_length,
-	"wiring_loop_east_length":wiring_loop_east_length,
-	"wiring_loop_south_west_length":wiring_loop_south_west_length,
-	"packet_loop_north_length":packet_loop_north_length,
-	"packet_loop_east_length":packet_loop_east_length,
-	"packet_loop_south_west_length":packet_loop_south_west_length,
-	"wiring_loop_diagram_tikz":wiring_loop_diagram_tikz,
-	"packet_loop_diagram_tikz":packet_loop_diagram_tikz,
-	"colour_key":colour_key,
-	"scale":diagram_scaling,
-}).strip()
-
-
-################################################################################
-# Development of Placement
-################################################################################
-
-if show_development: print (r"""
+		"width":width,
+		"height":height,
+		"width_boards":topology_metrics["width_boards"],
+		"height_boards":topology_metrics["height_boards"],
+		"wiring_loop_north_length":topology_metrics["wiring_loop_north_length"],
+		"wiring_loop_east_length":topology_metrics["wiring_loop_east_length"],
+		"wiring_loop_south_west_length":topology_metrics["wiring_loop_south_west_length"],
+		"packet_loop_north_length":topology_metrics["packet_loop_north_length"],
+		"packet_loop_east_length":topology_metrics["packet_loop_east_length"],
+		"packet_loop_south_west_length":topology_metrics["packet_loop_south_west_length"],
+		"wiring_loop_north_count":topology_metrics["wiring_loop_north_count"],
+		"wiring_loop_east_count":topology_metrics["wiring_loop_east_count"],
+		"wiring_loop_south_west_count":topology_metrics["wiring_loop_south_west_count"],
+		"packet_loop_north_count":topology_metrics["packet_loop_north_count"],
+		"packet_loop_east_count":topology_metrics["packet_loop_east_count"],
+		"packet_loop_south_west_count":topology_metrics["packet_loop_south_west_count"],
+		"wiring_loop_diagram_tikz":picture(topology_metrics["wiring_loop_diagram_tikz"], "scale=%f"%diagram_scaling),
+		"packet_loop_diagram_tikz":picture(topology_metrics["packet_loop_diagram_tikz"], "scale=%f"%diagram_scaling),
+		"colour_key":colour_key,
+		"scale":diagram_scaling,
+	}).strip()
+	
+	
+	################################################################################
+	# Development of Placement
+	################################################################################
+	
+	if show_development: print (r"""
 \section{Development of Board Placement}
 
 Boards must be placed in the physical world such that the maximum wire-length is
@@ -925,8 +1645,8 @@ yielding a rectangle as shown in Figure \ref{fig:rect-torus}.
 
 Before continuing, the `wobble' between consecutive columns is removed to form a
 regular grid as shown in Figure \ref{fig:comp-torus}. This regular grid is then
-folded into %(num_folds_x)d sheet%(num_folds_x_plural)s horizontally and
-%(num_folds_y)d sheet%(num_folds_y_plural)s vertically along the lines shown in
+folded into %(num_folds_x)s sheet%(num_folds_x_plural)s horizontally and
+%(num_folds_y)s sheet%(num_folds_y_plural)s vertically along the lines shown in
 Figure \ref{fig:fold-spaced-torus}.
 
 After folding, the nodes from overlapping folds are interleaved to yield the
@@ -942,9 +1662,7 @@ scale-drawing of the system as assigned to cabinets is given in Figure
 \begin{landscape}
 	\begin{figure}
 		\center
-		\begin{tikzpicture}[scale=%(scale)f]
-			%(torus_diagram_tikz)s
-		\end{tikzpicture}
+		%(torus_diagram_tikz)s
 		
 		\caption{Schematic representation of a torus of boards. Nodes to the left of
 		the dashed line will be shifted right in the next step. Wire colour key:
@@ -956,9 +1674,7 @@ scale-drawing of the system as assigned to cabinets is given in Figure
 \begin{landscape}
 	\begin{figure}
 		\center
-		\begin{tikzpicture}[scale=%(scale)f]
-			%(rect_torus_diagram_tikz)s
-		\end{tikzpicture}
+		%(rect_torus_diagram_tikz)s
 		
 		\caption{Rectangular arrangement of nodes. Colour key: %(colour_key)s}
 		\label{fig:rect-torus}
@@ -968,9 +1684,7 @@ scale-drawing of the system as assigned to cabinets is given in Figure
 \begin{landscape}
 	\begin{figure}
 		\center
-		\begin{tikzpicture}[scale=%(scale)f]
-			%(comp_torus_diagram_tikz)s
-		\end{tikzpicture}
+		%(comp_torus_diagram_tikz)s
 		
 		\caption{Nodes forced into a regular, rectangular grid. Colour key: %(colour_key)s}
 		\label{fig:comp-torus}
@@ -980,9 +1694,7 @@ scale-drawing of the system as assigned to cabinets is given in Figure
 \begin{landscape}
 	\begin{figure}
 		\center
-		\begin{tikzpicture}[scale=%(scale)f]
-			%(fold_spaced_torus_diagram_tikz)s
-		\end{tikzpicture}
+		%(fold_spaced_torus_diagram_tikz)s
 		
 		\caption{Lines along which the grid will be folded (wires removed for
 		clarity).}
@@ -990,28 +1702,13 @@ scale-drawing of the system as assigned to cabinets is given in Figure
 	\end{figure}
 \end{landscape}
 
-\begin{landscape}
-	\enlargethispage{3cm}
-	\begin{figure}
-		\center
-		%% Scaled additionally on the y axis so it actually fits
-		\begin{tikzpicture}[scale=%(scale)f,yscale=0.8]
-			%(folded_torus_diagram_tikz)s
-		\end{tikzpicture}
-		
-		\caption{Arrangement after folding and interleaving shown divided into
-		cabinets/racks. Colour key: %(colour_key)s}
-		\label{fig:folded-torus}
-	\end{figure}
-\end{landscape}
+%(folded_torus_figures)s
 
 \begin{landscape}
 	\begin{figure}
 		\center
 		%% Scaled already.
-		\begin{tikzpicture}
-			%(cabinet_torus_diagram_tikz)s
-		\end{tikzpicture}
+		%(cabinet_torus_diagram_tikz)s
 		
 		\caption{Allocation of SpiNNaker boards to cabinets and racks and the wires
 		between them. Colour key: %(colour_key)s}
@@ -1020,44 +1717,44 @@ scale-drawing of the system as assigned to cabinets is given in Figure
 \end{landscape}
 
 """%{
-	"torus_diagram_tikz":torus_diagram_tikz,
-	"rect_torus_diagram_tikz":rect_torus_diagram_tikz,
-	"comp_torus_diagram_tikz":comp_torus_diagram_tikz,
-	"fold_spaced_torus_diagram_tikz":fold_spaced_torus_diagram_tikz,
-	"folded_torus_diagram_tikz":folded_torus_diagram_tikz,
-	"cabinet_torus_diagram_tikz":cabinet_torus_diagram_tikz,
-	"scale":diagram_scaling,
-	"colour_key":colour_key,
-	"num_folds_x":num_folds_x,
-	"num_folds_y":num_folds_y,
-	"num_folds_x_plural":"" if num_folds_x == 1 else "s",
-	"num_folds_y_plural":"" if num_folds_y == 1 else "s",
-	"num_cabinets":num_cabinets,
-	"num_racks_per_cabinet":num_racks_per_cabinet,
-	"num_cabinets_plural":"" if num_cabinets == 1 else "s",
-	"num_racks_per_cabinet_plural":"" if num_racks_per_cabinet == 1 else "s",
-}).strip()
-
-
-################################################################################
-# Wiring Patterns
-################################################################################
-
-
-#\wud{%(wiring_uniqeness_slot_north)s}{wires within a rack going North}{wud-slot-north}
-#\wud{%(wiring_uniqeness_slot_east)s}{wires within a rack going East}{wud-slot-east}
-#\wud{%(wiring_uniqeness_slot_south_west)s}{wires within a rack going South-West}{wud-slot-south-west}
-
-#\wud{%(wiring_uniqeness_rack_north)s}{wires between racks going North}{wud-rack-north}
-#\wud{%(wiring_uniqeness_rack_east)s}{wires between racks going East}{wud-rack-east}
-#\wud{%(wiring_uniqeness_rack_south_west)s}{wires between racks going South-West}{wud-rack-south-west}
-
-#\wud{%(wiring_uniqeness_cabinet_north)s}{wires between cabinets going North}{wud-cabinet-north}
-#\wud{%(wiring_uniqeness_cabinet_east)s}{wires between cabinets going East}{wud-cabinet-east}
-#\wud{%(wiring_uniqeness_cabinet_south_west)s}{wires between cabinets going South-West}{wud-cabinet-south-west}
-
-
-if show_wiring_patterns: print (r"""
+		"torus_diagram_tikz":picture(torus_diagram_tikz, "scale=%f"%diagram_scaling),
+		"rect_torus_diagram_tikz":picture(rect_torus_diagram_tikz, "scale=%f"%diagram_scaling),
+		"comp_torus_diagram_tikz":picture(comp_torus_diagram_tikz, "scale=%f"%diagram_scaling),
+		"fold_spaced_torus_diagram_tikz":picture(fold_spaced_torus_diagram_tikz, "scale=%f"%diagram_scaling),
+		"folded_torus_figures":folded_torus_figures,
+		"cabinet_torus_diagram_tikz":picture(cabinet_torus_diagram_tikz, cabinet = True),
+		"scale":diagram_scaling,
+		"colour_key":colour_key,
+		"num_folds_x":describe_folds(num_folds_x),
+		"num_folds_y":describe_folds(num_folds_y),
+		"num_folds_x_plural":"" if topology.fold_count(num_folds_x) == 1 else "s",
+		"num_folds_y_plural":"" if topology.fold_count(num_folds_y) == 1 else "s",
+		"num_cabinets":num_cabinets,
+		"num_racks_per_cabinet":num_racks_per_cabinet,
+		"num_cabinets_plural":"" if num_cabinets == 1 else "s",
+		"num_racks_per_cabinet_plural":"" if num_racks_per_cabinet == 1 else "s",
+	}).strip()
+	
+	
+	################################################################################
+	# Wiring Patterns
+	################################################################################
+	
+	
+	#\wud{%(wiring_uniqeness_slot_north)s}{wires within a rack going North}{wud-slot-north}
+	#\wud{%(wiring_uniqeness_slot_east)s}{wires within a rack going East}{wud-slot-east}
+	#\wud{%(wiring_uniqeness_slot_south_west)s}{wires within a rack going South-West}{wud-slot-south-west}
+	
+	#\wud{%(wiring_uniqeness_rack_north)s}{wires between racks going North}{wud-rack-north}
+	#\wud{%(wiring_uniqeness_rack_east)s}{wires between racks going East}{wud-rack-east}
+	#\wud{%(wiring_uniqeness_rack_south_west)s}{wires between racks going South-West}{wud-rack-south-west}
+	
+	#\wud{%(wiring_uniqeness_cabinet_north)s}{wires between cabinets going North}{wud-cabinet-north}
+	#\wud{%(wiring_uniqeness_cabinet_east)s}{wires between cabinets going East}{wud-cabinet-east}
+	#\wud{%(wiring_uniqeness_cabinet_south_west)s}{wires between cabinets going South-West}{wud-cabinet-south-west}
+	
+	
+	if show_wiring_patterns: print (r"""
 \section{Wiring Patterns}
 
 \newcommand{\wud}[3]{
@@ -1065,9 +1762,7 @@ if show_wiring_patterns: print (r"""
 	\begin{figure}
 		\center
 		%% Scaled already.
-		\begin{tikzpicture}
-			#1
-		\end{tikzpicture}
+		#1
 		
 		\caption{Wiring pattern diagram for #2. Slots which have the same colour
 		have a wire going to the same relative location.}
@@ -1076,29 +1771,46 @@ if show_wiring_patterns: print (r"""
 \end{landscape}
 }
 
+\begin{table}[h]
+	\center
+	\begin{tabular}{l r r}
+		\toprule
+			Axis & Distinct Patterns & Up To Symmetry \\
+		\midrule
+			%(rack_pattern_stats)s
+		\bottomrule
+	\end{tabular}
+	\caption{Number of distinct patterns of wires within racks. Racks whose wiring
+	differs only by a shift along the slots or by being mirrored (e.g. due to
+	being on a reverse-facing fold) are the same up to symmetry and can share a
+	wiring harness.}
+	\label{tab:rack-pattern-stats}
+\end{table}
 
 \wud{%(wiring_uniqeness_cabinet_south_west)s}{wires between cabinets going South-West}{wud-cabinet-south-west}
 
-"""%{
-	"wiring_uniqeness_slot_north":wiring_uniqueness_diagram_tikz["Change Slot"][NORTH],
-	"wiring_uniqeness_slot_east":wiring_uniqueness_diagram_tikz["Change Slot"][EAST],
-	"wiring_uniqeness_slot_south_west":wiring_uniqueness_diagram_tikz["Change Slot"][SOUTH_WEST],
+"""%TemplateValues({
+		"rack_pattern_stats":rack_pattern_stats,
+		
+		"wiring_uniqeness_slot_north":partial(picture, wiring_uniqueness_diagram_tikz["Change Slot"][NORTH], cabinet = True),
+		"wiring_uniqeness_slot_east":partial(picture, wiring_uniqueness_diagram_tikz["Change Slot"][EAST], cabinet = True),
+		"wiring_uniqeness_slot_south_west":partial(picture, wiring_uniqueness_diagram_tikz["Change Slot"][SOUTH_WEST], cabinet = True),
+		
+		"wiring_uniqeness_rack_north":partial(picture, wiring_uniqueness_diagram_tikz["Change Rack"][NORTH], cabinet = True),
+		"wiring_uniqeness_rack_east":partial(picture, wiring_uniqueness_diagram_tikz["Change Rack"][EAST], cabinet = True),
+		"wiring_uniqeness_rack_south_west":partial(picture, wiring_uniqueness_diagram_tikz["Change Rack"][SOUTH_WEST], cabinet = True),
+		
+		"wiring_uniqeness_cabinet_north":partial(picture, wiring_uniqueness_diagram_tikz["Change Cabinet"][NORTH], cabinet = True),
+		"wiring_uniqeness_cabinet_east":partial(picture, wiring_uniqueness_diagram_tikz["Change Cabinet"][EAST], cabinet = True),
+		"wiring_uniqeness_cabinet_south_west":partial(picture, wiring_uniqueness_diagram_tikz["Change Cabinet"][SOUTH_WEST], cabinet = True),
+	})).strip()
 	
-	"wiring_uniqeness_rack_north":wiring_uniqueness_diagram_tikz["Change Rack"][NORTH],
-	"wiring_uniqeness_rack_east":wiring_uniqueness_diagram_tikz["Change Rack"][EAST],
-	"wiring_uniqeness_rack_south_west":wiring_uniqueness_diagram_tikz["Change Rack"][SOUTH_WEST],
 	
-	"wiring_uniqeness_cabinet_north":wiring_uniqueness_diagram_tikz["Change Cabinet"][NORTH],
-	"wiring_uniqeness_cabinet_east":wiring_uniqueness_diagram_tikz["Change Cabinet"][EAST],
-	"wiring_uniqeness_cabinet_south_west":wiring_uniqueness_diagram_tikz["Change Cabinet"][SOUTH_WEST],
-}).strip()
-
-
-################################################################################
-# Board Position List
-################################################################################
-
-if show_board_position_list: print (r"""
+	################################################################################
+	# Board Position List
+	################################################################################
+	
+	if show_board_position_list: print (r"""
 \section{Board Position List}
 
 The following table lists the location of each logical (hexagonal) board address
@@ -1118,15 +1830,15 @@ in the cabinet system.
 \end{longtable}
 
 """%{
-	"board_position_list":board_position_list,
-}).strip()
-
-
-################################################################################
-# Wiring Instructions
-################################################################################
-
-if show_wiring_instructions: print (r"""
+		"board_position_list":board_position_list,
+	}).strip()
+	
+	
+	################################################################################
+	# Wiring Instructions
+	################################################################################
+	
+	if show_wiring_instructions: print (r"""
 
 \section{Wiring Instructions}
 
@@ -1158,16 +1870,98 @@ between cabinets.
 
 
 """%{
-	"wiring_instructions":wiring_instructions,
-}).strip()
-
-
-################################################################################
-# End Matter
-################################################################################
-print (r"""
+		"wiring_instructions":wiring_instructions,
+	}).strip()
+	
+	
+	################################################################################
+	# End Matter
+	################################################################################
+	print (r"""
 \end{document}
 """).strip()
 
 
+	# Compile any figures not already in the cache
+	if figure_cache is not None:
+		for name in figure_cache.compile():
+			sys.stderr.write("Failed to compile figure %s\n"%name)
+	
+	# Report which parts of the report were recomputed
+	sys.stderr.write(build.get_summary())
+
 
+def write_report(filename):
+	"""
+	Generate the report, writing it to the named file. The file is replaced only
+	once the report is complete.
+	"""
+	f = open(filename + ".tmp", "w")
+	stdout = sys.stdout
+	sys.stdout = f
+	try:
+		generate_report()
+	finally:
+		sys.stdout = stdout
+		f.close()
+	os.rename(filename + ".tmp", filename)
+
+
+def watch(filenames, output_filename, params, defaults, interval = 0.25):
+	"""
+	Regenerate the report whenever any of the given parameter files are saved.
+	The models and sections built so far are kept in memory so that only those
+	affected by the changed parameters are recomputed. params is the dict of
+	parameters most recently loaded from the files and defaults gives the values
+	they replaced.
+	
+	Only parameters whose values have changed are updated so that any overrides
+	made after loading the parameters (above) remain in effect. Parameters
+	removed from the files return to their default values (or are removed if
+	they have none).
+	"""
+	mtimes = None
+	while True:
+		try:
+			new_mtimes = map(os.path.getmtime, filenames)
+		except OSError:
+			# Editors which save by writing a new file and renaming it over the old
+			# one leave the file briefly missing: look again on the next tick.
+			new_mtimes = mtimes
+		
+		if new_mtimes != mtimes:
+			try:
+				if mtimes is not None:
+					new_params = load_params(filenames)
+					globals().update( (name, value)
+					                  for (name, value) in new_params.iteritems()
+					                  if name not in params or params[name] != value
+					                )
+					for name in params:
+						if name not in new_params:
+							if name in defaults:
+								globals()[name] = defaults[name]
+							else:
+								globals().pop(name, None)
+					params = new_params
+				
+				start = time.time()
+				write_report(output_filename)
+				sys.stderr.write("Wrote %s in %.2fs\n"%(output_filename, time.time() - start))
+			except Exception:
+				# Keep watching so that the mistake can be corrected
+				traceback.print_exc()
+			mtimes = new_mtimes
+		
+		time.sleep(interval)
+
+
+if options.watch:
+	try:
+		watch(params_filenames, options.output, loaded_params, default_params)
+	except KeyboardInterrupt:
+		pass
+elif options.output is not None:
+	write_report(options.output)
+else:
+	generate_report()